@@ -0,0 +1,127 @@
+# -*- coding: utf8 -*-
+
+###########################################################################
+#   This is the package latexparser
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+###########################################################################
+
+# copyright (c) Laurent Claessens, 2017
+# email: laurent@claessens-donadello.eu
+
+r"""
+The content of a .aux file : the \newlabel, the \bibcite and the \@writefile.
+
+The file is read once and the uses of these macros are recorded in dictionaries,
+so that looking for a label does not search the whole file. The occurrences only
+keep their positions in the text (see Occurrence.from_spans), and the five parts of
+the value of a \newlabel are separated only when they are asked.
+
+    aux = FileToAuxFile("MyFile.aux")
+    print(aux.newlabel_value("MyLabel"))
+"""
+
+import re
+
+from latexparser import newlabelNotFound
+from latexparser.Occurrence import Occurrence
+from latexparser.MacroUse import SearchArgumentsPosition
+
+# The macros read in a .aux file. LaTeX writes them followed by their arguments.
+aux_macro_pattern = re.compile(r"\\(newlabel|bibcite|@writefile)\{")
+
+def IterAuxMacros(code):
+    r"""
+    Iterate over the occurrences of \newlabel, \bibcite and \@writefile (with two
+    arguments) in the LatexCode 'code', in the order of the text.
+
+    Only these macros are searched : the text is not cut in tokens as for
+    LatexCode.iter_use_of_macro. The comments being removed from code.text_brut,
+    all the matches are uses of the macros.
+    """
+    if code.keep_comments :
+        for name in ["\\newlabel","\\bibcite","\\@writefile"] :
+            for occurrence in code.iter_use_of_macro(name,2):
+                yield occurrence
+        return
+    text = code.text_brut
+    table = code.brace_table()
+    for match in aux_macro_pattern.finditer(text):
+        spans,stop = SearchArgumentsPosition(text,match.end()-1,2,table=table)
+        if len(spans) == 2 :
+            yield Occurrence.from_spans("\\"+match.group(1),text,match.start(),stop,spans)
+
+class AuxFile(object):
+    r"""
+    Read the LatexCode 'code' of a .aux file.
+
+    - self.newlabels : dictionary label -> Occurrence of its \newlabel (the last one
+                       if the label is defined more than once),
+    - self.duplicates : dictionary label -> number of \newlabel, for the labels defined more than once,
+    - self.bibcites : dictionary key -> Occurrence of its \bibcite,
+    - self.writefiles : dictionary extension -> list of the Occurrence of \@writefile{extension}
+                        in the order of the file (the lines written in the .toc, .lof, ...).
+    """
+    def __init__(self,code):
+        self.text = code.text_brut
+        self.newlabels = {}
+        self.duplicates = {}
+        self.bibcites = {}
+        self.writefiles = {}
+        for occurrence in IterAuxMacros(code):
+            key = occurrence[0]
+            if occurrence.name == "\\newlabel" :
+                if key in self.newlabels :
+                    self.duplicates[key] = self.duplicates.get(key,1)+1
+                self.newlabels[key] = occurrence
+            elif occurrence.name == "\\bibcite" :
+                self.bibcites[key] = occurrence
+            else :
+                self.writefiles.setdefault(key,[]).append(occurrence)
+    def newlabel(self,label_name):
+        r"""
+        Return the Occurrence_newlabel of the label 'label_name'.
+
+        If it is defined many times, return the last one and prints a warning.
+        If not found, raise newlabelNotFound.
+        """
+        try :
+            occurrence = self.newlabels[label_name]
+        except KeyError :
+            raise newlabelNotFound(label_name)
+        if label_name in self.duplicates :
+            print("Warning : label %s has %s different values"%(label_name,str(self.duplicates[label_name])))
+        return occurrence.analyse()
+    def newlabel_value(self,label_name):
+        r"""
+        Return the value (the first of the five parts) of the \newlabel of 'label_name'.
+        """
+        return self.newlabel(label_name).value
+    def bibcite(self,key):
+        r"""
+        Return the value given by \bibcite to the citation 'key' (KeyError if there are none).
+        """
+        return self.bibcites[key][1]
+    def writefile(self,extension):
+        r"""
+        Return the list of the contents written by \@writefile in the file of the given
+        extension ("toc", "lof", ...).
+        """
+        return [occurrence[1] for occurrence in self.writefiles.get(extension,[])]
+    def labels(self):
+        return self.newlabels.keys()
+    def __contains__(self,label_name):
+        return label_name in self.newlabels
+    def __len__(self):
+        return len(self.newlabels)
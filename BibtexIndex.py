@@ -0,0 +1,262 @@
+# -*- coding: utf8 -*-
+
+###########################################################################
+#   This is the package latexparser
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+###########################################################################
+
+# copyright (c) Laurent Claessens, 2017
+# email: laurent@claessens-donadello.eu
+
+r"""
+An index of a (large) bibtex file.
+
+The file is read once, without being decoded : only the positions of the
+entries (label -> byte span) are recorded. An entry is decoded and its comments
+removed when it is asked, and its fields are separated only if they are asked.
+Thus extracting k entries from a file of many thousands costs k entries.
+
+    with FileToBibtexIndex("big.bib") as index :
+        small = index.extract_list(["Foo2010","Bar2012"])      # a CodeBibtex
+        print(index["Foo2010"].fields["title"])
+
+As CodeBibtex, the character @ at the beginning of a line is always the
+beginning of an entry, and the entry lasts up to the next one (without the ends
+of lines before it).
+"""
+
+import os
+import re
+import mmap
+
+from latexparser.FileLoader import DecodeBytes
+from latexparser.FileLoader import count_bytes_read
+from latexparser.BraceTable import BraceTable
+from latexparser.MacroUse import FitBracePosition
+
+entry_start_pattern = re.compile(rb"^@",re.MULTILINE)
+
+# The beginning of a field : 'author = '. RemoveComments leaves the % of the comments.
+field_name_pattern = re.compile(r"[\s%]*([A-Za-z][\w\-:.+]*)\s*=\s*")
+# A value which is neither in braces nor in quotes : a number or a @string macro.
+bare_value_pattern = re.compile(r"[^\s,#{}\"]+")
+quote_or_brace = re.compile(r'\\.|[{}"]',re.DOTALL)
+
+def ClosingQuotePosition(text,position):
+    """
+    Return the position of the quote closing the one at 'position' : the
+    next quote which is not in braces. Return -1 if there are none.
+    """
+    depth = 0
+    for match in quote_or_brace.finditer(text,position+1):
+        character = match.group()
+        if character == "{" :
+            depth = depth+1
+        elif character == "}" :
+            depth = depth-1
+        elif character == '"' and depth == 0 :
+            return match.start()
+    return -1
+
+def ParseBibtexFields(text):
+    r"""
+    Return the dictionary field -> value of the bibtex entry 'text' (the field names in lowercase).
+
+    The braces are paired (the escaped ones \{ and \} are ignored), so that a value
+    can contain commas, braces and quotes. The value is given without its outer
+    braces or quotes. A value made of pieces concatenated by # is given as the
+    pieces concatenated; the @string macros are not expanded.
+    """
+    fields = {}
+    open_position = text.find("{")
+    if open_position == -1 :
+        return fields
+    position = text.find(",",open_position)
+    if position == -1 :
+        return fields
+    table = None
+    while True :
+        match = field_name_pattern.match(text,position+1)
+        if not match :
+            break
+        name = match.group(1).lower()
+        position = match.end()
+        pieces = []
+        while position < len(text) :
+            if text[position] == "{" :
+                if table is None :
+                    table = BraceTable(text)
+                fit = FitBracePosition(text,position,"{",table=table)
+                if fit is None :
+                    return fields
+                pieces.append(text[fit[0]+1:fit[1]])
+                position = fit[1]+1
+            elif text[position] == '"' :
+                close = ClosingQuotePosition(text,position)
+                if close == -1 :
+                    return fields
+                pieces.append(text[position+1:close])
+                position = close+1
+            else :
+                bare = bare_value_pattern.match(text,position)
+                if not bare :
+                    break
+                pieces.append(bare.group())
+                position = bare.end()
+            while position < len(text) and (text[position].isspace() or text[position] == "%") :
+                position = position+1
+            if position < len(text) and text[position] == "#" :
+                position = position+1
+                while position < len(text) and text[position].isspace() :
+                    position = position+1
+            else :
+                break
+        fields[name] = "".join(pieces)
+        if position >= len(text) or text[position] != "," :
+            break
+    return fields
+
+class BibtexRecord(object):
+    """
+    An entry of a BibtexIndex. It has the same 'type', 'label' and 'given_text'
+    as a BibtexEntry; the text is decoded only when it is asked.
+
+    self.fields is the dictionary field -> value (see ParseBibtexFields).
+    """
+    __slots__ = ("index","label","start","end","_given_text","_fields")
+    def __init__(self,index,label,start,end):
+        self.index = index
+        self.label = label
+        self.start = start
+        self.end = end
+        self._given_text = None
+        self._fields = None
+    @property
+    def given_text(self):
+        if self._given_text is None :
+            from latexparser.Utilities import RemoveComments
+            text = DecodeBytes(self.index.data[self.start:self.end],"utf8","iso8859-1",self.index.filename)
+            self._given_text = RemoveComments(text)
+        return self._given_text
+    @property
+    def type(self):
+        text = self.given_text
+        return text[1:text.find("{")].lower()
+    @property
+    def fields(self):
+        if self._fields is None :
+            self._fields = ParseBibtexFields(self.given_text)
+        return self._fields
+    def __getitem__(self,field):
+        return self.fields[field.lower()]
+
+class BibtexIndex(object):
+    """
+    The positions of the entries of the bibtex code 'data' (bytes, or a memory
+    mapped file).
+
+    self.spans is the dictionary label -> (start,end) where data[start:end] is the
+    code of the entry (the last one if a label is defined more than once, as in
+    CodeBibtex).
+    """
+    def __init__(self,data,filename=None):
+        self.data = data
+        self.filename = filename
+        self.spans = {}
+        self.records = {}
+        starts = [match.start() for match in entry_start_pattern.finditer(data)]
+        for i,start in enumerate(starts) :
+            end = starts[i+1] if i+1 < len(starts) else len(data)
+            # The ends of lines (and the "\r" of a file written on Windows) are not part of the entry.
+            while end > start and data[end-1:end] in (b"\n",b"\r") :
+                end = end-1
+            self.spans[self.read_label(start,end)] = (start,end)
+    def read_label(self,start,end):
+        """
+        Return the label of the entry data[start:end] : what is between the
+        first brace and the first comma (see BibtexEntry).
+        """
+        data = self.data
+        open_position = data.find(b"{",start,end)
+        if open_position == -1 :
+            open_position = start-1
+        comma_position = data.find(b",",open_position+1,end)
+        if comma_position == -1 :
+            comma_position = end-1
+        label = data[open_position+1:comma_position]
+        try :
+            label = str(label,"utf8")
+        except UnicodeDecodeError :
+            label = str(label,"iso8859-1")
+        return label.replace(" ","")
+    def __getitem__(self,label):
+        try :
+            return self.records[label]
+        except KeyError :
+            pass
+        start,end = self.spans[label]
+        record = BibtexRecord(self,label,start,end)
+        self.records[label] = record
+        return record
+    def __contains__(self,label):
+        return label in self.spans
+    def __len__(self):
+        return len(self.spans)
+    def labels(self):
+        return self.spans.keys()
+    def extract_list(self,label_list):
+        """
+        Same as CodeBibtex.extract_list : return the CodeBibtex containing only the
+        entries of the given labels. Only these entries are decoded.
+        """
+        from latexparser import CodeBibtex
+        a = []
+        for label in label_list :
+            try :
+                a.append(self[label].given_text)
+            except KeyError :
+                print("I have no entry labelled %s"%label)
+                raise
+        return CodeBibtex("\n".join(a))
+    def close(self):
+        """
+        Release the memory mapped file (if any). The entries which were not yet
+        read cannot be read anymore.
+        """
+        if isinstance(self.data,mmap.mmap) :
+            self.data.close()
+    def __enter__(self):
+        return self
+    def __exit__(self,*args):
+        self.close()
+
+def FileToBibtexIndex(name,use_mmap=None):
+    """
+    Return the BibtexIndex of the file 'name'.
+
+    If 'use_mmap' is None, the file is memory mapped when it is larger than
+    FileLoader.mmap_threshold; the other ones are read in one time.
+    """
+    from latexparser import FileLoader
+    with open(name,"rb") as f :
+        size = os.fstat(f.fileno()).st_size
+        if use_mmap is None :
+            use_mmap = size >= FileLoader.mmap_threshold
+        if use_mmap and size > 0 :
+            data = mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ)
+        else :
+            data = f.read()
+    count_bytes_read(size)
+    return BibtexIndex(data,filename=name)
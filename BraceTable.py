@@ -0,0 +1,139 @@
+# -*- coding: utf8 -*-
+
+###########################################################################
+#   This is the package latexparser
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+###########################################################################
+
+# copyright (c) Laurent Claessens, 2017
+# email: laurent@claessens-donadello.eu
+
+"""
+The pairing of the braces { and } of a text, computed once.
+
+The escaped braces \{ and \} are not taken into account.
+If NumPy is installed, the pairing is computed from the brace depth, which
+is a cumulative sum over the text. Otherwise we do the usual stack pass.
+"""
+
+import re
+from bisect import bisect_left
+
+try :
+    import numpy
+except ImportError :
+    numpy = None
+
+# The backslash is matched with the following character, so that "\{" is
+# not a brace while "\\{" is one.
+brace_or_escape = re.compile(r"\\.|[{}]",re.DOTALL)
+
+BACKSLASH = ord("\\")
+OPEN = ord("{")
+CLOSE = ord("}")
+
+class BraceTable(object):
+    """
+    Pairing of the braces of 'text'.
+
+    self.opens is the sorted list of the positions of the (non escaped) opening braces
+    self.closing is the dictionary opening position -> closing position.
+    The opening braces that are never closed are not in self.closing.
+    """
+    def __init__(self,text,use_numpy=True):
+        self.text = text
+        if use_numpy and numpy is not None and text :
+            self.opens,self.closing = NumpyBracePairing(text)
+        else :
+            self.opens,self.closing = StackBracePairing(text)
+    def close_of(self,position):
+        """
+        Return the position of the brace closing the one which opens at 'position'.
+        Return -1 if there is no opening brace at 'position' or if it is not closed.
+        """
+        return self.closing.get(position,-1)
+    def next_open(self,position,end=None):
+        """
+        Return the position of the first opening brace in text[position:end], or -1.
+        """
+        k = bisect_left(self.opens,position)
+        if k == len(self.opens):
+            return -1
+        found = self.opens[k]
+        if end is not None and found >= end :
+            return -1
+        return found
+
+def StackBracePairing(text):
+    """
+    Return the tuple (opens,closing) described in BraceTable, with a stack.
+    """
+    opens = []
+    closing = {}
+    stack = []
+    for match in brace_or_escape.finditer(text):
+        brace = match.group()
+        if brace == "{" :
+            position = match.start()
+            opens.append(position)
+            stack.append(position)
+        elif brace == "}" :
+            if stack :
+                closing[stack.pop()] = match.start()
+    return opens,closing
+
+def NumpyBracePairing(text):
+    """
+    Return the tuple (opens,closing) described in BraceTable, using NumPy.
+
+    Each character is seen as one byte : the characters which are not latin-1
+    are replaced by "?", so that the positions in the array are the positions
+    in the string.
+
+    Let 'level' be the depth after an opening brace and before a closing one.
+    Among the braces with the same level, sorted by position, each opening brace
+    is immediately followed by its closing brace.
+    """
+    if not text :
+        return [],{}
+    chars = numpy.frombuffer(text.encode("latin-1","replace"),dtype=numpy.uint8)
+    indices = numpy.arange(len(chars))
+
+    # A brace is escaped when it is preceded by an odd number of backslashes.
+    is_backslash = chars == BACKSLASH
+    last_not_backslash = numpy.maximum.accumulate(numpy.where(is_backslash,-1,indices))
+    preceding_backslashes = numpy.empty(len(chars),dtype=indices.dtype)
+    preceding_backslashes[0] = 0
+    preceding_backslashes[1:] = indices[:-1]-last_not_backslash[:-1]
+    not_escaped = preceding_backslashes % 2 == 0
+
+    is_open = (chars == OPEN) & not_escaped
+    is_close = (chars == CLOSE) & not_escaped
+    positions = numpy.flatnonzero(is_open | is_close)
+    opening = is_open[positions]
+    depth = numpy.cumsum(numpy.where(opening,1,-1))
+    level = numpy.where(opening,depth,depth+1)
+
+    order = numpy.lexsort((positions,level))
+    sorted_positions = positions[order]
+    sorted_opening = opening[order]
+    sorted_level = level[order]
+    paired = sorted_opening[:-1] & ~sorted_opening[1:] & (sorted_level[:-1] == sorted_level[1:])
+    pair_opens = sorted_positions[:-1][paired]
+    pair_closes = sorted_positions[1:][paired]
+
+    opens = positions[opening].tolist()
+    closing = dict(zip(pair_opens.tolist(),pair_closes.tolist()))
+    return opens,closing
@@ -0,0 +1,162 @@
+# -*- coding: utf8 -*-
+
+###########################################################################
+#   This is the package latexparser
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+###########################################################################
+
+# copyright (c) Laurent Claessens, 2017
+# email: laurent@claessens-donadello.eu
+
+"""
+The external programs launched by PytexTools.Compilation.
+
+The programs are launched without shell (the arguments are given as a list,
+so that nothing has to be quoted) and the independent ones are launched
+at the same time :
+
+    steps = [CompilationStep("bibtex",["bibtex","MyFile"]),
+             CompilationStep("makeindex",["makeindex","MyFile"],timeout=60)]
+    results = RunSteps(steps)
+
+The output of each program is captured and printed when it finishes.
+"""
+
+import os
+import shlex
+import signal
+import asyncio
+
+class CompilationStep(object):
+    """
+    The program to be launched with the list 'arguments' (the first one is the
+    program). If it runs for more than 'timeout' seconds, it is killed.
+    """
+    def __init__(self,name,arguments,timeout=None):
+        self.name = name
+        self.arguments = arguments
+        self.timeout = timeout
+    def command_line(self):
+        return " ".join(shlex.quote(argument) for argument in self.arguments)
+
+class StepResult(object):
+    """
+    - self.returncode : the exit status of the program (None if it was not executed),
+    - self.output : what it wrote (standard output and error),
+    - self.timed_out : True if it was killed because of its timeout.
+    """
+    def __init__(self,step,returncode=None,output="",timed_out=False):
+        self.step = step
+        self.returncode = returncode
+        self.output = output
+        self.timed_out = timed_out
+    def success(self):
+        return self.returncode == 0
+
+def KillProcess(process):
+    if os.name == "posix" :
+        try :
+            os.killpg(process.pid,signal.SIGKILL)
+        except ProcessLookupError :
+            pass
+    else :
+        process.kill()
+
+class RunningStep(object):
+    """
+    A step launched by RunStepFollowing, as seen from the thread which follows it :
+    it has the methods poll and terminate of a subprocess.Popen.
+    """
+    def __init__(self,loop):
+        self.loop = loop
+        self.process = None
+        self.done = False
+    def poll(self):
+        if self.done :
+            return 0 if self.process is None else self.process.returncode
+        return None
+    def terminate(self):
+        if self.process is not None and not self.done :
+            self.loop.call_soon_threadsafe(KillProcess,self.process)
+
+async def RunStep(step,nocompilation=False,running=None):
+    """
+    Launch the program of the step and return its StepResult.
+    If 'nocompilation' is True, the command line is only printed.
+    'running' is the RunningStep which receives the process (see RunStepFollowing).
+    """
+    if nocompilation :
+        print("*** external :",step.command_line())
+        print("not executed")
+        return StepResult(step)
+    try :
+        # In its own session, so that the programs it launches (with -shell-escape for
+        # example) are killed with it.
+        # Nobody sees its output : its standard input is empty, so that it never waits for an answer.
+        process = await asyncio.create_subprocess_exec(*step.arguments,stdin=asyncio.subprocess.DEVNULL,stdout=asyncio.subprocess.PIPE,stderr=asyncio.subprocess.STDOUT,start_new_session=(os.name == "posix"))
+    except OSError as error :
+        print("*** external :",step.command_line())
+        print("Cannot launch %s : %s"%(step.arguments[0],error))
+        return StepResult(step,returncode=127)
+    if running is not None :
+        running.process = process
+    timed_out = False
+    try :
+        output,_ = await asyncio.wait_for(process.communicate(),step.timeout)
+    except asyncio.TimeoutError :
+        timed_out = True
+        KillProcess(process)
+        output,_ = await process.communicate()
+    except asyncio.CancelledError :
+        # Interrupted (Ctrl-C) : the program is not in our session, it has to be killed here.
+        KillProcess(process)
+        raise
+    result = StepResult(step,process.returncode,output.decode("utf8","replace"),timed_out)
+    # The outputs are printed at once, so that the ones of the steps launched together are not mixed.
+    print("*** external :",step.command_line())
+    if result.output :
+        print(result.output,end="" if result.output.endswith("\n") else "\n")
+    if timed_out :
+        print("%s was stopped after %s seconds."%(step.name,step.timeout))
+    return result
+
+async def RunStepsAsync(steps,nocompilation=False):
+    """
+    Launch the steps at the same time. Return the list of their StepResult.
+    """
+    return list(await asyncio.gather(*[RunStep(step,nocompilation) for step in steps]))
+
+def RunSteps(steps,nocompilation=False):
+    """
+    Launch the steps at the same time and wait for them. Return the list of their StepResult.
+    """
+    return asyncio.run(RunStepsAsync(steps,nocompilation))
+
+async def RunStepFollowingAsync(step,follow,nocompilation=False):
+    running = RunningStep(asyncio.get_running_loop())
+    following = asyncio.get_running_loop().run_in_executor(None,follow,running)
+    try :
+        return await RunStep(step,nocompilation,running)
+    finally :
+        running.done = True
+        await following
+
+def RunStepFollowing(step,follow,nocompilation=False):
+    """
+    Launch the step as RunSteps does and, during its execution, call follow(running)
+    in an other thread : 'running' is a RunningStep, to be given to LogCode.FollowLog
+    for example. Return the StepResult of the step.
+    """
+    return asyncio.run(RunStepFollowingAsync(step,follow,nocompilation))
@@ -0,0 +1,156 @@
+# -*- coding: utf8 -*-
+
+###########################################################################
+#   This is the package latexparser
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+###########################################################################
+
+# copyright (c) Laurent Claessens, 2017
+# email: laurent@claessens-donadello.eu
+
+"""
+Reading of the files.
+
+A file is read in one piece (memory mapped if it is large) and decoded once.
+As with codecs.open, the end of lines are not changed.
+"""
+
+import os
+import mmap
+import codecs
+import threading
+
+# The files larger than that are memory mapped instead of read.
+mmap_threshold = 16*1024*1024
+
+# The number of bytes read since the beginning (or since the last reset_bytes_read).
+bytes_read = 0
+_bytes_read_lock = threading.Lock()
+
+def count_bytes_read(number):
+    global bytes_read
+    with _bytes_read_lock :
+        bytes_read = bytes_read+number
+
+def number_of_bytes_read():
+    """
+    Return the number of bytes read by this module since the beginning (or since the last reset_bytes_read).
+    """
+    return bytes_read
+
+def reset_bytes_read():
+    global bytes_read
+    with _bytes_read_lock :
+        bytes_read = 0
+
+def DecodeBytes(data,encoding="utf8",fallback=None,name=None):
+    """
+    Decode 'data' (bytes or any buffer). If it is not valid for 'encoding' and a
+    'fallback' encoding is given, decode with the fallback.
+    """
+    try :
+        return str(data,encoding)
+    except UnicodeDecodeError :
+        if fallback is None :
+            raise
+        # I've noticed that the log file was ISO-8859 English text
+        print("Problem with",name)
+        return str(data,fallback)
+
+def LoadText(name,encoding="utf8",fallback=None):
+    """
+    Return the content of the file 'name' as a string.
+
+    The file is read in one time, or memory mapped if it is larger than 'mmap_threshold'.
+    If it is not valid for 'encoding' and 'fallback' is given, it is decoded with
+    'fallback' (the file is not read again).
+    """
+    with open(name,"rb") as f :
+        size = os.fstat(f.fileno()).st_size
+        if size >= mmap_threshold :
+            mapped = mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ)
+            try :
+                text = DecodeBytes(mapped,encoding,fallback,name)
+            finally :
+                mapped.close()
+        else :
+            data = f.read()
+            size = len(data)
+            text = DecodeBytes(data,encoding,fallback,name)
+    count_bytes_read(size)
+    return text
+
+def LoadTextChunks(name,chunk_size=65536,encoding="utf8"):
+    """
+    Iterate over the decoded pieces of the file, read by chunks of 'chunk_size' bytes.
+    A character is never cut between two pieces.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    with open(name,"rb") as f :
+        while True :
+            data = f.read(chunk_size)
+            count_bytes_read(len(data))
+            if not data :
+                break
+            text = decoder.decode(data)
+            if text :
+                yield text
+    text = decoder.decode(b"",final=True)
+    if text :
+        yield text
+
+# The umask of the process, read once (reading it means changing it for a moment).
+_umask = None
+_umask_lock = threading.Lock()
+
+def DefaultFileMode():
+    """
+    Return the permissions that open() gives to a new file : 0666 without the umask.
+    """
+    global _umask
+    with _umask_lock :
+        if _umask is None :
+            _umask = os.umask(0o022)
+            os.umask(_umask)
+    return 0o666 & ~_umask
+
+def WriteFileAtomically(name,text,encoding="utf8"):
+    """
+    Write 'text' in the file 'name'. The text is written in a temporary file of the
+    same directory which then replaces 'name', so that nobody reads a half written file.
+
+    The file keeps its permissions, and a new file gets the ones of open() (the
+    temporary file is created with 0600). If the writing fails, the temporary
+    file is removed and 'name' is not changed.
+    """
+    import stat
+    import tempfile
+    directory = os.path.dirname(os.path.abspath(name))
+    try :
+        mode = stat.S_IMODE(os.stat(name).st_mode)
+    except OSError :
+        mode = DefaultFileMode()
+    fd,temporary = tempfile.mkstemp(dir=directory,suffix=".tmp")
+    try :
+        with os.fdopen(fd,"w",encoding=encoding) as f :
+            f.write(text)
+        os.chmod(temporary,mode)
+        os.replace(temporary,name)
+    except BaseException :
+        try :
+            os.remove(temporary)
+        except OSError :
+            pass
+        raise
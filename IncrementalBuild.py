@@ -0,0 +1,238 @@
+# -*- coding: utf8 -*-
+
+###########################################################################
+#   This is the package latexparser
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+###########################################################################
+
+# copyright (c) Laurent Claessens, 2017
+# email: laurent@claessens-donadello.eu
+
+r"""
+CodeFactory.apply_all file by file, keeping the results from one run to the next.
+
+Each file of the tree of \input is cut at its \input. The stages of
+CodeFactory.apply_all (plugins, code boxes, PytexNotIn, PytexOnlyIn) are applied to
+each piece, and the document is the pieces with the results of the included files
+between them. This is the same as applying the stages to the whole document when
+- all the plugins are local (see PytexTools.Plugin),
+- no \input is inside braces (an \input in the argument of a macro).
+In the second case, the whole document is built as usual.
+
+The pieces are recorded in the file 'pytextools_build.json', with the sha1sum
+of their file. On the next run, only the changed files are read and transformed again.
+Everything is transformed again when
+- the tag, the plugins (their hook_name or their version, see PluginIdentity) or
+  the code boxes (their contents) changed,
+- a changed file contains (or contained) macro definitions or \addInputPath,
+  since the other files could depend on them.
+"""
+
+import os
+import json
+import hashlib
+
+from latexparser import ParseCache
+from latexparser.LatexCode import LatexCode
+from latexparser.InputPaths import InputPaths
+from latexparser.BraceTable import BraceTable
+from latexparser.Occurrence import ReadInputFile
+from latexparser.Occurrence import InputFilename
+from latexparser.PytexTools import FileTracking
+from latexparser.FileLoader import WriteFileAtomically
+
+state_filename = "pytextools_build.json"
+state_format = "2"
+
+class GlobalChange(Exception):
+    """
+    A change which can affect the other files : everything has to be transformed again.
+    """
+    pass
+
+class NotSplittable(Exception):
+    r"""
+    An \input is inside braces : the file cannot be cut at its \input.
+    """
+    pass
+
+def PluginIdentity(plugin):
+    """
+    Return the hook_name and the version of the plugin (see PytexTools.Plugin), or
+    None if the plugin has no version : then its changes cannot be followed.
+    """
+    version = getattr(plugin,"version",None)
+    if version is None :
+        return None
+    return "%s:%s"%(getattr(plugin,"hook_name",""),version)
+
+def BoxIdentity(box):
+    """
+    Return the name of the CodeBox and the sha1sum of its contents.
+    """
+    digest = hashlib.sha1()
+    for label in sorted(box.keys()) :
+        for part in [label,box[label].text_brut] :
+            digest.update(part.encode("utf8","surrogatepass"))
+            digest.update(b"\0")
+    return "%s:%s"%(box.name,digest.hexdigest())
+
+def InputsAtTopLevel(text,inputs):
+    r"""
+    Say if all the given \input (tuples (start,end,filename)) are outside the braces of 'text'.
+    """
+    table = BraceTable(text)
+    events = []
+    for position in table.opens :
+        events.append((position,1))
+        close = table.close_of(position)
+        if close != -1 :
+            events.append((close,-1))
+    events.sort()
+    depth = 0
+    k = 0
+    for start,end,filename in inputs :
+        while k < len(events) and events[k][0] < start :
+            depth = depth+events[k][1]
+            k = k+1
+        if depth != 0 :
+            return False
+    return True
+
+class IncrementalBuild(object):
+    r"""
+    One run of CodeFactory.apply_all in incremental mode.
+
+    self.files[path] is the record of a file : a dictionary with keys
+    - "sha1" : the sha1sum of the file,
+    - "directories" : its \addInputPath,
+    - "defines" : if it contains macro definitions,
+    - "children" : the list of the tuples (filename,path) of its \input,
+    - "pieces" : the transformed pieces between the \input (one more than the children).
+    The main code (which is not a file) is recorded with the path "".
+    """
+    def __init__(self,factory,tag,filename=state_filename):
+        self.factory = factory
+        self.tag = tag
+        self.filename = filename
+        self.signature = {  "format":state_format,
+                            "tag":tag,
+                            "plugins":[PluginIdentity(plugin) for plugin in factory.plugin_list],
+                            "boxes":[BoxIdentity(box) for box in factory.code_box_list] }
+        self.old = self.load()
+        self.files = {}
+        self.recomputed = 0
+    def load(self):
+        try :
+            with open(self.filename,"r") as f :
+                state = json.load(f)
+        except (IOError,OSError,ValueError) :
+            return {}
+        if state.get("signature") != self.signature :
+            return {}
+        return state["files"]
+    def save(self):
+        WriteFileAtomically(self.filename,json.dumps({"signature":self.signature,"files":self.files}))
+    def build(self,code):
+        r"""
+        Return the LatexCode of the whole document, transformed.
+        'code' is the main code, before substitution of the \input.
+        """
+        try :
+            try :
+                input_paths = self.process(code)
+            except GlobalChange as change :
+                print("Incremental build : %s; everything is transformed again."%str(change))
+                self.old = {}
+                self.files = {}
+                self.recomputed = 0
+                input_paths = self.process(code)
+        except NotSplittable as error :
+            print("Incremental build : %s; the document is built as usual."%str(error))
+            if os.path.exists(self.filename):
+                os.remove(self.filename)
+            return self.factory.apply_stages(code.substitute_all_inputs(),self.tag)
+        self.save()
+        print("Incremental build : %s of %s files transformed again."%(self.recomputed,len(self.files)-1))
+        new_code = LatexCode(self.expand(""))
+        new_code.included_file_list = [filename for filename,path in self.files[""]["children"]]
+        new_code.input_paths = input_paths
+        return new_code
+    def process(self,code):
+        input_paths = InputPaths()
+        text = code.text_brut
+        digest = hashlib.sha1(text.encode("utf8","surrogatepass")).hexdigest()
+        self.process_node("",digest,lambda:text,input_paths,())
+        return input_paths
+    def process_file(self,path,input_paths,ancestors):
+        if path in ancestors :
+            raise ValueError("The file %s includes itself (through %s)"%(path," -> ".join(ancestors[1:])))
+        # The file is followed by FileTracking too; it is not read if it did not change.
+        digest = FileTracking().current_sha([path])[0]
+        self.process_node(path,digest,lambda:ReadInputFile(path),input_paths,ancestors)
+    def process_node(self,path,digest,read,input_paths,ancestors):
+        old = self.old.get(path)
+        if old is not None and old["sha1"] == digest :
+            node = old
+            for directory in node["directories"] :
+                input_paths.append(directory)
+            for filename,child_path in node["children"] :
+                self.process_file(child_path,input_paths,ancestors+(path,))
+            self.files[path] = node
+            return
+        content = read()
+        if ParseCache.default_cache is not None :
+            entry = ParseCache.default_cache.scan(content)
+        else :
+            entry = ParseCache.ScanContent(content)
+        from latexparser import definition_commands
+        defines = any(definer in entry["macros"] for definer in definition_commands)
+        if self.old :
+            if old is None :
+                if defines or entry["directories"] :
+                    raise GlobalChange("the new file %s contains definitions or \\addInputPath"%path)
+            elif defines or old["defines"] or entry["directories"] != old["directories"] :
+                raise GlobalChange("the file %s contains definitions or \\addInputPath"%path)
+        stripped = entry["text"]
+        inputs = entry["inputs"]
+        if not InputsAtTopLevel(stripped,inputs):
+            raise NotSplittable("an \\input is inside braces in %s"%(path or "the main file"))
+        for directory in entry["directories"] :
+            input_paths.append(directory)
+        children = []
+        pieces = []
+        turtle = 0
+        for start,end,filename in inputs :
+            child_path = input_paths.get_file(InputFilename(filename))
+            self.process_file(child_path,input_paths,ancestors+(path,))
+            children.append((filename,child_path))
+            pieces.append(self.transform(stripped[turtle:start]))
+            turtle = end
+        pieces.append(self.transform(stripped[turtle:]))
+        if path != "" :
+            self.recomputed = self.recomputed+1
+        self.files[path] = {"sha1":digest,"directories":entry["directories"],"defines":defines,"children":children,"pieces":pieces}
+    def transform(self,piece):
+        if piece == "" :
+            return ""
+        return self.factory.apply_stages(LatexCode(piece,stripped=True),self.tag).text_brut
+    def expand(self,path):
+        node = self.files[path]
+        parts = [node["pieces"][0]]
+        for (filename,child_path),piece in zip(node["children"],node["pieces"][1:]) :
+            parts.append(self.expand(child_path))
+            print("Adding file",filename)
+            parts.append(piece)
+        return "".join(parts)
@@ -0,0 +1,187 @@
+# -*- coding: utf8 -*-
+
+###########################################################################
+#   This is the package latexparser
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+###########################################################################
+
+# copyright (c) Laurent Claessens, 2017
+# email: laurent@claessens-donadello.eu
+
+r"""
+The graph of the \input of a document, without building the document.
+
+Each file is read and scanned once. The files are searched as
+LatexCode.substitute_all_inputs does : in the directories given by the
+\addInputPath met before, in the order of the document.
+"""
+
+import os.path
+
+from latexparser import ParseCache
+from latexparser.InputPaths import InputPaths
+from latexparser.Occurrence import ReadInputFile
+from latexparser.Occurrence import InputFilename
+from latexparser.SourceMap import SourceMap
+from latexparser.SourceMap import SourceFile
+
+class InputEdge(object):
+    r"""
+    An \input{filename} in the file 'parent' which includes the file 'child'.
+
+    'position' and 'end' are the positions of the \input in the text of the parent
+    without comments. 'line' is its line in the parent file.
+    """
+    def __init__(self,parent,child,filename,position,end,line):
+        self.parent = parent
+        self.child = child
+        self.filename = filename
+        self.position = position
+        self.end = end
+        self.line = line
+    def __str__(self):
+        return "%s:%s -> %s"%(self.parent,self.line,self.child)
+
+class InputGraph(object):
+    r"""
+    The graph of the \input from a LatexCode.
+
+    The nodes are the paths of the files (normalized by os.path.normpath); the main
+    code is the node self.root (its filename, or "" if it has none).
+
+    - self.nodes : the list of the nodes, in the order in which they are met.
+    - self.edges[node] : the list of the InputEdge from 'node', in the order of the text.
+    - self.cycles : the list of the cycles found; a cycle is the list of the nodes
+                    from a file to itself. The edge closing a cycle is recorded but not followed.
+    - self.duplicates : dictionary node -> list of the InputEdge towards 'node', for the files which
+                        are included more than once.
+    - self.missing : the list of the tuples (node,filename) of the \input whose file is not found.
+    """
+    def __init__(self,code,input_paths=None):
+        if input_paths is None :
+            input_paths = InputPaths()
+        self.input_paths = input_paths
+        self.root = os.path.normpath(code.filename) if code.filename else ""
+        self.nodes = []
+        self.edges = {}
+        self.cycles = []
+        self.duplicates = {}
+        self.missing = []
+        self._parents = {}
+        entry = {}
+        entry["directories"] = [occurrence.analyse().directory for occurrence in code.search_use_of_macro(r"\addInputPath",1)]
+        entry["inputs"] = [(occurrence.position,occurrence.end,occurrence[0]) for occurrence in code.search_use_of_macro(r"\input",1)]
+        self.add_node(self.root,entry,code.source_map,[])
+    def scan(self,path):
+        """
+        Return the tuple (entry,source_map) of the file (see ParseCache).
+        """
+        content = ReadInputFile(path)
+        if ParseCache.default_cache is not None :
+            entry = ParseCache.default_cache.scan(content)
+        else :
+            entry = ParseCache.ScanContent(content)
+        source_map = SourceMap(len(content),SourceFile(path,content)).compose(entry["segments"],len(entry["text"]))
+        return entry,source_map
+    def add_node(self,node,entry,source_map,stack):
+        self.nodes.append(node)
+        self.edges[node] = []
+        for directory in entry["directories"] :
+            self.input_paths.append(directory)
+        stack = stack+[node]
+        for start,end,filename in entry["inputs"] :
+            try :
+                path = self.input_paths.get_file(InputFilename(filename))
+            except NameError :
+                self.missing.append((node,filename))
+                continue
+            child = os.path.normpath(path)
+            line = source_map.locate(start)[1]
+            edge = InputEdge(node,child,filename,start,end,line)
+            self.edges[node].append(edge)
+            self._parents.setdefault(child,[]).append(edge)
+            if child in stack :
+                self.cycles.append(stack[stack.index(child):]+[child])
+                continue
+            if child in self.edges :
+                self.duplicates.setdefault(child,[self._parents[child][0]]).append(edge)
+                continue
+            child_entry,child_map = self.scan(path)
+            self.add_node(child,child_entry,child_map,stack)
+    def children(self,node):
+        return [edge.child for edge in self.edges[node]]
+    def parents(self,node):
+        """
+        Return the list of the InputEdge towards 'node'.
+        """
+        return self._parents.get(node,[])
+    def descendants(self,node):
+        """
+        Return the set of the nodes included (recursively) by 'node'.
+        """
+        found = set()
+        stack = [node]
+        while stack :
+            for child in self.children(stack.pop()):
+                if child not in found :
+                    found.add(child)
+                    stack.append(child)
+        return found
+    def dependents(self,node):
+        """
+        Return the set of the nodes which include (recursively) 'node' : the ones
+        whose expansion changes when 'node' changes.
+        """
+        found = set()
+        stack = [node]
+        while stack :
+            for edge in self.parents(stack.pop()):
+                if edge.parent not in found :
+                    found.add(edge.parent)
+                    stack.append(edge.parent)
+        return found
+    def topological_order(self):
+        """
+        Return the list of the nodes, each one after all the nodes it includes.
+        The edges closing a cycle are ignored.
+        """
+        order = []
+        done = set()
+        for node in self.nodes :
+            if node in done :
+                continue
+            done.add(node)
+            stack = [(node,iter(self.children(node)))]
+            while stack :
+                current,children = stack[-1]
+                for child in children :
+                    if child not in done :
+                        done.add(child)
+                        stack.append((child,iter(self.children(child))))
+                        break
+                else :
+                    stack.pop()
+                    order.append(current)
+        return order
+    def __iter__(self):
+        return iter(self.nodes)
+    def __len__(self):
+        return len(self.nodes)
+    def __str__(self):
+        lines = []
+        for node in self.nodes :
+            for edge in self.edges[node] :
+                lines.append(str(edge))
+        return "\n".join(lines)
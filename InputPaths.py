@@ -20,16 +20,79 @@
 # copyright (c) Laurent Claessens, 2016
 # email: laurent@claessens-donadello.eu
 
+import os
 import os.path
+import time
 
 from latexparser.Utilities import dprint
 
+class DirectoryListing(object):
+    """
+    The names of the entries of a directory, read once with os.scandir.
+
+    A name found in the listing is trusted during 'lifetime' seconds; then the
+    modification time of the directory is looked at and the directory is read
+    again only if it changed. A name which is not in the listing is looked for in
+    the same way, but the listing is trusted only during 'miss_lifetime' seconds, so
+    that a file created during the build is found.
+    """
+    lifetime = 1.0
+    miss_lifetime = 0.1
+    def __init__(self,directory):
+        self.directory = directory
+        self.mtime = None
+        self.names = None
+        self.refresh()
+    def refresh(self):
+        try :
+            mtime = os.stat(self.directory).st_mtime_ns
+        except OSError :
+            mtime = -1          # The directory does not exist.
+        if mtime != self.mtime :
+            self.mtime = mtime
+            if mtime == -1 :
+                self.names = frozenset()
+            else :
+                try :
+                    self.names = frozenset(entry.name for entry in os.scandir(self.directory))
+                except OSError :
+                    self.names = None   # Not readable : we ask for each file.
+        self.checked = time.monotonic()
+    def contains(self,name,now=None):
+        if self.names is None :
+            return os.path.exists(os.path.join(self.directory,name))
+        if now is None :
+            now = time.monotonic()
+        found = name in self.names
+        if now-self.checked > (self.lifetime if found else self.miss_lifetime) :
+            # At most one stat; the directory is read again only if it changed.
+            self.refresh()
+            if self.names is None :
+                return os.path.exists(os.path.join(self.directory,name))
+            found = name in self.names
+        return found
+    def __contains__(self,name):
+        return self.contains(name)
+
+# The listings are shared by all the InputPaths (in particular through the
+# recursive calls of LatexCode.substitute_all_inputs). The keys are absolute paths.
+directory_listings = {}
+
+def DirectoryListingOf(directory):
+    key = os.path.abspath(directory)
+    listing = directory_listings.get(key)
+    if listing is None :
+        listing = DirectoryListing(key)
+        directory_listings[key] = listing
+    return listing
+
 class InputPaths(object):
     """
     This object recall the list of paths in which \input will search for its files.
     """
     def __init__(self):
         self.directory_list=["."]
+        self._listings={}
     def append(self,dirname):
         self.directory_list.append(dirname)
     def get_file(self,filename):
@@ -37,12 +100,28 @@ class InputPaths(object):
         - `filename` : a file name like "foo.tex"
 
         Search in the subdirectories for a `foo.tex` and return the first found.
+
+        The directories are not asked for each file : their listings are kept (see DirectoryListing).
         """
+        subdirectory,name=os.path.split(filename)
+        now=time.monotonic()
+        # The current directory may change between two calls.
+        cwd=os.getcwd()
         for directory in self.directory_list :
-            fn=os.path.join(directory,filename)
-            if os.path.exists(fn):
-                return fn
+            if subdirectory :
+                directory=os.path.join(directory,subdirectory)
+            if self.listing(directory,cwd).contains(name,now):
+                return os.path.join(directory,name)
         raise NameError("No file found with name ",filename)
+    def listing(self,directory,cwd=None):
+        if cwd is None :
+            cwd=os.getcwd()
+        try :
+            return self._listings[(cwd,directory)]
+        except KeyError :
+            listing=DirectoryListingOf(os.path.join(cwd,directory))
+            self._listings[(cwd,directory)]=listing
+            return listing
     def __str__(self):
         return str(self.directory_list)
     def __iter__(self):
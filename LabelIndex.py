@@ -0,0 +1,138 @@
+# -*- coding: utf8 -*-
+
+###########################################################################
+#   This is the package latexparser
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+###########################################################################
+
+# copyright (c) Laurent Claessens, 2017
+# email: laurent@claessens-donadello.eu
+
+r"""
+Where are the \label, \ref and \cite in the source files.
+
+The files are read once and all the locations are recorded, so that the
+warnings of a log file (see latexparser.Warnings) can show where their label
+is used without searching the files again for each warning.
+
+The lines are shown as 'grep --color=always -n' does.
+"""
+
+import re
+import glob
+
+from latexparser.FileLoader import LoadText
+
+# A macro with its optional arguments and its argument : \ref{foo}, \cite[p. 3]{foo,bar}
+located_macro_pattern = re.compile(r"\\([A-Za-z]+)\*?((?:\[[^\]\n]*\])*)\{([^{}\n]*)\}")
+
+# The colors of grep.
+color_filename = "\033[35m\033[K{0}\033[m\033[K"
+color_line_number = "\033[32m\033[K{0}\033[m\033[K"
+color_separator = "\033[36m\033[K:\033[m\033[K"
+color_match = "\033[01;31m\033[K{0}\033[m\033[K"
+
+def LocatedKind(name):
+    r"""
+    Return the kind of location ("label", "ref" or "cite") of the macro 'name'
+    (without backslash), or None.
+
+    As the search of "ref{foo}" by grep, all the macros whose name ends by "ref"
+    (\eqref, \pageref, ...) are references.
+    """
+    if name == "label" :
+        return "label"
+    if name.endswith("ref"):
+        return "ref"
+    if "cite" in name :
+        return "cite"
+    return None
+
+class LabelIndex(object):
+    r"""
+    The locations of the \label, \ref (and \eqref, ...) and \cite (and \citep, ...)
+    in the given files (by default, the *.tex of the current directory).
+
+    The files are read when the first location is asked.
+
+    self.locations[(kind,key)] is the list of the tuples (filename,line_number,line,start,end)
+    where line[start:end] is the part to be highlighted.
+    """
+    def __init__(self,filenames=None):
+        self.filenames = filenames
+        self.locations = None
+    def build(self):
+        if self.filenames is None :
+            self.filenames = sorted(glob.glob("*.tex"))
+        self.locations = {}
+        for filename in self.filenames :
+            try :
+                text = LoadText(filename,fallback="iso8859-1")
+            except IOError :
+                continue
+            for line_number,line in enumerate(text.splitlines(),1) :
+                if "{" not in line :
+                    continue
+                for match in located_macro_pattern.finditer(line):
+                    name = match.group(1)
+                    kind = LocatedKind(name)
+                    if kind is None :
+                        continue
+                    if kind == "cite" :
+                        turtle = match.start(3)
+                        for key in match.group(3).split(","):
+                            stripped = key.strip()
+                            start = turtle+key.find(stripped)
+                            self.add(kind,stripped,filename,line_number,line,start,start+len(stripped))
+                            turtle = turtle+len(key)+1
+                    else :
+                        # The part found by grep : "ref{foo}" or "label{foo}"
+                        start = match.start(1)+len(name)-len(kind)
+                        self.add(kind,match.group(3),filename,line_number,line,start,match.end())
+    def add(self,kind,key,filename,line_number,line,start,end):
+        self.locations.setdefault((kind,key),[]).append((filename,line_number,line,start,end))
+    def locate(self,kind,key):
+        """
+        Return the list of the tuples (filename,line_number) where 'key' is used as 'kind'.
+        """
+        if self.locations is None :
+            self.build()
+        return [(filename,line_number) for filename,line_number,line,start,end in self.locations.get((kind,key),[])]
+    def grep(self,kind,key):
+        """
+        Return the lines where 'key' is used as 'kind', as grep would show them (with colors).
+        """
+        if self.locations is None :
+            self.build()
+        lines = []
+        highlights = {}
+        for filename,line_number,line,start,end in self.locations.get((kind,key),[]) :
+            if (filename,line_number) not in highlights :
+                highlights[(filename,line_number)] = []
+                lines.append((filename,line_number,line))
+            highlights[(filename,line_number)].append((start,end))
+        result = []
+        for filename,line_number,line in lines :
+            parts = []
+            if len(self.filenames) > 1 :
+                parts.append(color_filename.format(filename)+color_separator)
+            parts.append(color_line_number.format(line_number)+color_separator)
+            turtle = 0
+            for start,end in highlights[(filename,line_number)] :
+                parts.append(line[turtle:start]+color_match.format(line[start:end]))
+                turtle = end
+            parts.append(line[turtle:])
+            result.append("".join(parts))
+        return "\n".join(result)
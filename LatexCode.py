@@ -24,7 +24,12 @@ import codecs
 
 from latexparser.Utilities import ensure_unicode
 from latexparser.Utilities import RemoveComments
+from latexparser.Utilities import IsWithoutComments
 from latexparser.InputPaths import InputPaths
+from latexparser.Occurrence import Occurrence_newcommand
+from latexparser.Rope import Rope
+from latexparser.SourceMap import SourceMap
+from latexparser.SourceMap import SourceFile
 
 def inherit_properties(f):
     """
@@ -39,9 +44,89 @@ def inherit_properties(f):
         new_code.input_paths=code.input_paths
         new_code.filename=code.filename
         new_code.included_file_list=code.included_file_list
+        new_code.use_rope=code.use_rope
         return new_code
     return g
 
+def EditsKeepStripped(text,edits):
+    r"""
+    Say if the text obtained by applying 'edits' (sorted, see LatexCode.apply_edits)
+    to 'text' is still without comments, assuming that 'text' is.
+
+    Only the lines on which the edits are made have to be checked : a new comment
+    can come from the replacement or from the junction of the replacement with
+    its neighbourhood (removing a "\n" after a "%" for example).
+
+    'text' can be a string or a Rope. A replacement which is a Rope comes from
+    an other LatexCode, so that only its first and last lines have to be checked.
+    """
+    # Since 'text' is stripped, \end{document} can only be at its end.
+    end_document=None
+    if text.endswith("\\end{document}"):
+        end_document=len(text)-len("\\end{document}")
+    for start,end,replacement in edits:
+        if end_document is not None and end > end_document :
+            return False
+        line_start=text.rfind("\n",0,start)+1
+        line_end=text.find("\n",end)
+        if line_end == -1:
+            line_end=len(text)
+        if isinstance(replacement,Rope):
+            first_line_end=replacement.find("\n")
+            if first_line_end != -1 :
+                if replacement.endswith("\\end{document}"):
+                    return False
+                last_line_start=replacement.rfind("\n",0,len(replacement))+1
+                before=text[line_start:start]+replacement[0:first_line_end]
+                after=replacement[last_line_start:len(replacement)]+text[end:line_end]
+                if not IsWithoutComments(before) or not IsWithoutComments(after):
+                    return False
+                continue
+            replacement=str(replacement)
+        if "\\end{document}" in replacement :
+            return False
+        if not IsWithoutComments(text[line_start:start]+replacement+text[end:line_end]):
+            return False
+    return True
+
+def EditsKeepDefinitions(code,edits):
+    r"""
+    Say if the definitions of macros of 'code' are still valid (with the same
+    positions) after the given edits.
+
+    This is the case when the definitions were already computed, all the edits are 
+    made after the last definition and no replacement contains a definition command.
+    """
+    from latexparser import definition_commands
+    definitions=code._dict_of_definition_macros
+    if definitions is None :
+        return False
+    last_definition=max([newcommand.end for newcommand in definitions.values()]+[0])
+    for start,end,replacement in edits:
+        if start < last_definition :
+            return False
+        for definer in definition_commands :
+            if definer in replacement :
+                return False
+    return True
+
+def DefinitionMacros(code):
+    r"""
+    Return the dictionary name -> Occurrence_newcommand of the macros defined in
+    'code' (see LatexCode.dict_of_definition_macros).
+    """
+    from latexparser import definition_commands
+    dico = {}
+    for definer in definition_commands :
+        for occurrence in code.search_use_of_macro(definer,1):
+            newcommand = Occurrence_newcommand(occurrence,code=code)
+            name = newcommand.name
+            if name in dico.keys() :
+                print("%s was already defined !!"%name)
+            else :
+                dico[name]=newcommand
+    return dico
+
 class LatexCode(object):
     """
     Contains the informations about a LaTeX code.
@@ -58,20 +143,58 @@ class LatexCode(object):
     # If you have any idea how to keep track of the comments without slow down the process, please send a patch :)
 
     # However it is possible to keep the comments using 'keep_comments=True'.
-    def __init__(self,given_text,filename=None,oldLaTeX=None,keep_comments=False):
+    def __init__(self,given_text,filename=None,oldLaTeX=None,keep_comments=False,stripped=False,use_rope=False,source_map=None):
         """
         self.text_brut          contains the tex code as given, with or without the comments, depending on 'keep_comments'
 
         If one create a codeLaTeX from an other, use derive_from by passing oldLaTeX to __init__
+
+        If 'stripped' is True, the given text is trusted to be already without
+        comments (typically the text_brut of an other LatexCode) and
+        RemoveComments is not called again.
+
+        If 'use_rope' is True, the text is kept as a Rope (see latexparser.Rope) :
+        the edits (apply_edits, replace, substitute_all_inputs, ...) are splices in the
+        rope and return objects which also use a rope. The flat string
+        self.text_brut is only built when somebody reads it (the searches of macros do),
+        and save() writes the pieces without building it.
+        In that case, 'given_text' can be a Rope.
+
+        self.source_map relates the positions of self.text_brut to the files
+        they come from (see latexparser.SourceMap and the method 'locate').
+        'source_map' is the map of 'given_text'; by default 'given_text' is
+        considered as the content of the file 'filename'.
         """
         # If you change something here, it has to be changed in append_file.
-        self.given_text = given_text
-        if keep_comments :
-            self.text_brut = ensure_unicode(self.given_text)
-        else :
-            self.text_brut = ensure_unicode(RemoveComments(self.given_text))
-        self._dict_of_definition_macros = {}
+        self.use_rope = use_rope
+        self.keep_comments = keep_comments
+        self._rope = None
+        if isinstance(given_text,Rope):
+            if keep_comments or stripped :
+                self._given_text = None
+                self._text = None
+                self._rope = given_text
+            else :
+                given_text = str(given_text)
+        if source_map is None :
+            source_map = SourceMap(len(given_text),SourceFile(filename,given_text))
+        if self._rope is None :
+            self.given_text = given_text
+            if keep_comments or stripped :
+                self.text_brut = ensure_unicode(self.given_text)
+            else :
+                segments = []
+                self.text_brut = ensure_unicode(RemoveComments(self.given_text,segments))
+                source_map = source_map.compose(segments,len(self.text_brut))
+        self.source_map = source_map
+        self._dict_of_definition_macros = None      # Not computed yet.
         self._list_of_input_files = []
+        self._token_stream = None
+        self._macro_index = None
+        self._comment_positions = None
+        self._indexed_text = None      # The text on which _macro_index and _comment_positions were computed.
+        self._brace_table = None
+        self._aux_file = None
         self.filename = filename
         self.included_file_list=[]  # When the code is created from files, the filename is recorded here.
         if oldLaTeX :
@@ -79,6 +202,30 @@ class LatexCode(object):
         self.input_paths=InputPaths()
     def derive_from(self,oldLaTeX):
         self.included_file_list=oldLaTeX.included_file_list
+    @property
+    def text_brut(self):
+        if self._text is None :
+            self._text = str(self._rope)
+        return self._text
+    @text_brut.setter
+    def text_brut(self,text):
+        self._text = text
+        self._rope = None
+    @property
+    def given_text(self):
+        if self._given_text is None :
+            return self.text_brut
+        return self._given_text
+    @given_text.setter
+    def given_text(self,text):
+        self._given_text = text
+    def rope(self):
+        """
+        Return the text as a Rope (see latexparser.Rope).
+        """
+        if self._rope is None :
+            self._rope = Rope(self.text_brut)
+        return self._rope
     def copy(self):
         """
         Return a copy of self in a new object
@@ -90,9 +237,27 @@ class LatexCode(object):
         RoughSources.LatexCodeToRoughSource
         Although 'new_code' is at the beginning a 'copy', we still have to update
         by hand the input_list.
+
+        The text is the same, so that the comments are not stripped again and
+        the token stream, the indexes and the definitions are shared with self.
         """
-        A = LatexCode(self.text_brut)
+        if self.use_rope :
+            A = LatexCode(self.rope(),stripped=True,use_rope=True)
+            A._text = self._text
+        else :
+            A = LatexCode(self.text_brut,stripped=True)
+        A.keep_comments=self.keep_comments
         A.input_paths=self.input_paths
+        A.filename=self.filename
+        A.included_file_list=list(self.included_file_list)
+        A._token_stream=self._token_stream
+        A._macro_index=self._macro_index
+        A._comment_positions=self._comment_positions
+        A._indexed_text=self._indexed_text
+        A._brace_table=self._brace_table
+        A._dict_of_definition_macros=self._dict_of_definition_macros
+        A._list_of_input_files=self._list_of_input_files
+        A.source_map=self.source_map
         return A
     def save(self,filename=None,preamble=True):
         """
@@ -110,15 +275,19 @@ class LatexCode(object):
 %Please contact the author at moky.math@gmail.com for asking original source file and scripts.
 %
         """
-        written_text=self.text_brut
-        if preamble :
-            written_text=preamble+written_text
         if filename:
             self.filename=filename
         else :
             filename = self.filename
         f = codecs.open(filename,"w","utf_8")
-        f.write(written_text)
+        if preamble :
+            f.write(preamble)
+        if self._text is None :
+            # The text is a rope which was never flattened : we write the pieces.
+            for chunk in self._rope.chunks():
+                f.write(chunk)
+        else :
+            f.write(self.text_brut)
         f.close()
     def get_newlabel_value(self,label_name):
         r"""
@@ -127,14 +296,85 @@ class LatexCode(object):
         It it appears many times, return the last time, and prints a warning.
 
         If not found, raise an newlabelNotFound exception 
+
+        The lookup is made in self.aux_file() : the file is read once for all the labels.
+        """
+        return self.aux_file().newlabel_value(label_name)
+    def aux_file(self):
+        r"""
+        Assumes that self is a .aux file. Return its AuxFile (see latexparser.AuxFile) :
+        the \newlabel, \bibcite and \@writefile, read once.
+        It is kept as long as self.text_brut does not change.
         """
-        list_newlabel = self.analyse_use_of_macro("\\newlabel",2)
-        if label_name not in [x.name for x in list_newlabel] :
-            raise newlabelNotFound(label_name)
-        list_interesting  = [x for x in list_newlabel if x.name==label_name]
-        if len(list_interseting) > 1 :
-            print("Warning : label %s has %s different values"%(label_name,str(len(list_interesting))))
-        return list_interesting[-1].value
+        if self._aux_file is None or self._aux_file.text is not self.text_brut :
+            from latexparser.AuxFile import AuxFile
+            self._aux_file = AuxFile(self)
+        return self._aux_file
+    def token_stream(self):
+        """
+        Return the stream of tokens of self.text_brut (see latexparser.Tokenizer).
+
+        The text is cut only once; the searches of macros are made on the stream.
+        If self.text_brut was changed in the meantime, the stream is rebuilt.
+        """
+        if self._token_stream is None or self._token_stream.text is not self.text_brut :
+            from latexparser.Tokenizer import TokenStream
+            self._token_stream = TokenStream(self.text_brut)
+        return self._token_stream
+    def macro_index(self):
+        r"""
+        Return a dictionary whose keys are the names of the control sequences
+        that appear in self.text_brut, including the backslash, and whose values are
+        the sorted lists of the positions where they appear.
+
+        Example : for the code "\ref{a} and \ref{b}", 
+        macro_index()["\ref"] is [0,12].
+
+        The index is built in one pass on the token stream and kept. The derived 
+        objects (replace, substitute_all_inputs, change_macro_argument, ...) are
+        new objects and build their own index.
+        """
+        if self._macro_index is None or self._indexed_text is not self.text_brut :
+            stream = self.token_stream()
+            index = {}
+            for name,position in stream.macro_names():
+                try :
+                    index[name].append(position)
+                except KeyError :
+                    index[name] = [position]
+            self._macro_index = index
+            self._comment_positions = stream.comments
+            self._indexed_text = stream.text
+        return self._macro_index
+    def comment_positions(self):
+        """
+        Return the sorted list of the positions of the comment signs of self.text_brut.
+        It is computed with the macro index.
+        """
+        self.macro_index()
+        return self._comment_positions
+    def brace_table(self):
+        """
+        Return the pairing of the braces of self.text_brut (see latexparser.BraceTable).
+
+        It is computed once and gives in constant time the closing brace of an
+        opening one.
+        """
+        if self._brace_table is None or self._brace_table.text is not self.text_brut :
+            from latexparser.BraceTable import BraceTable
+            self._brace_table = BraceTable(self.text_brut)
+        return self._brace_table
+    def locate(self,position):
+        r"""
+        Return the tuple (filename,line,column) from which comes the given position of self.text_brut.
+        The lines and the columns are counted from 1.
+
+        The positions are followed through the substitution of the \input, the removing
+        of the comments and the replacements. A text inserted by a replacement
+        is located at the place of the text it replaced.
+        If the origin is not known, return (None,None,None).
+        """
+        return self.source_map.locate(position)
     def search_use_of_macro(self,name,number_of_arguments=None,give_configuration=False,fast=False):
         r"""
         Return a list of Occurrence of a given macro. You have to include the "\" in the name, for example
@@ -154,6 +394,34 @@ class LatexCode(object):
         # I don't remember, but it was an issue.
         from latexparser.MacroUse import SearchUseOfMacro
         return SearchUseOfMacro(self,name,number_of_arguments,give_configuration,fast=fast)
+    def iter_use_of_macro(self,name,number_of_arguments=None,start=0,end=None,reverse=False):
+        r"""
+        Iterate over the occurrences of a given macro, as they are found. See search_use_of_macro.
+
+        - `start`,`end` : only the occurrences beginning in self.text_brut[start:end] are given.
+        - `reverse` : give the occurrences from the last one.
+
+        Example : the last use of \MyMacro is
+        next(codeLaTeX.iter_use_of_macro("\MyMacro",2,reverse=True),None)
+        and only that one is fitted.
+        """
+        from latexparser.MacroUse import IterUseOfMacro
+        return IterUseOfMacro(self,name,number_of_arguments,start,end,reverse)
+    def has_macro(self,name,number_of_arguments=None):
+        r"""
+        Say if the macro is used in self.text_brut (outside the comments). 
+        
+        If 'number_of_arguments' is given, the use \newcommand{\MyMacro} is not counted 
+        (as in search_use_of_macro); the search stops on the first use.
+        """
+        if number_of_arguments is None :
+            comments = self.comment_positions()
+            from latexparser.Tokenizer import IsInComment
+            for position in self.macro_index().get(name,[]) :
+                if not IsInComment(self.text_brut,comments,position):
+                    return True
+            return False
+        return next(self.iter_use_of_macro(name,number_of_arguments),None) is not None
     def analyse_use_of_macro(self,name,number_of_arguments=None):
         """
         Provide a list of analyse of the occurrences of a macro.
@@ -178,18 +446,9 @@ class LatexCode(object):
         or
         \\renewcommand{\Foo}{bar}
         """
-        if self._dict_of_definition_macros == {} :
+        if self._dict_of_definition_macros is None :
             print("Je réinvente la roue")
-            dico = {}
-            for definer in definition_commands :            
-                for occurrence in self.search_use_of_macro(definer,3):
-                    newcommand = Occurrence_newcommand(occurrence)
-                    name = newcommand.name
-                    if name in dico.keys() :
-                        print("%s was already defined !!"%name)
-                    else :
-                        dico[name]=newcommand
-            self._dict_of_definition_macros = dico
+            self._dict_of_definition_macros = DefinitionMacros(self)
         return self._dict_of_definition_macros
     def list_of_input_files(self):
         if self._list_of_input_files == []:
@@ -199,6 +458,14 @@ class LatexCode(object):
             self._list_of_input_files = list
         return self._list_of_input_files
 
+    def input_graph(self,input_paths=None):
+        r"""
+        Return the graph of the \input of self, recursively (see latexparser.InputGraph).
+
+        The files are read and scanned once, but the document is not built.
+        """
+        from latexparser.InputGraph import InputGraph
+        return InputGraph(self,input_paths)
     def substitute_occurrence_input(self,occurrence,substitution_text):
         """
         - `occurrence` is the occurrence of an \input{<filename>}. 
@@ -211,19 +478,31 @@ class LatexCode(object):
         the recursion is already done.
         """
         print("Adding file",occurrence.filename)
-        A = LatexCode(self.text_brut)
+        A = LatexCode(self.text_brut,stripped=True,use_rope=self.use_rope,source_map=self.source_map)
         A.included_file_list=self.included_file_list
         A.included_file_list.append(occurrence.filename)
-        A=A.replace(occurrence.as_written,substitution_text)
+        end=occurrence.end
+        if isinstance(substitution_text,LatexCode):
+            A=A.apply_edits([(occurrence.position,end,substitution_text.text_brut,substitution_text.source_map)])
+        else :
+            A=A.apply_edits([(occurrence.position,end,substitution_text)])
         return A
-    def substitute_all_inputs(self,fast=False,input_paths=None):
+    def substitute_all_inputs(self,fast=False,input_paths=None,workers=None,process_workers=None):
         r"""
         Recursively change all the \input{...} by the content of the corresponding file. 
         Return a new object latexparser.LatexCode
+
+        If 'workers' is given, the tree of the \input is first discovered and the files
+        are read by that number of threads; if 'process_workers' is given, the comments are
+        stripped by that number of processes. See latexparser.ParallelInputs for the
+        difference in the handling of \addInputPath.
         """
-        A = LatexCode(self.text_brut)
         if input_paths is None :
             input_paths=InputPaths()
+        if workers or process_workers :
+            from latexparser.ParallelInputs import SubstituteAllInputsParallel
+            return SubstituteAllInputsParallel(self,input_paths,workers,process_workers,fast=fast)
+        A = LatexCode(self.text_brut,stripped=True,use_rope=self.use_rope,source_map=self.source_map)
 
         # The \input macro search for the files in the directories
         # listed in \input@path. In mazhe I define the macro
@@ -243,13 +522,19 @@ class LatexCode(object):
             list_input.append(y)
         if list_input==[]:
             return self
-        new_code=LatexCode(self.text_brut)
+        # All the \input are substituted in one pass. The positions
+        # of the occurrences are the ones in A, which has the same text as self.
+        edits=[]
         for occurrence in list_input:
-            file_content=occurrence.file_content(input_paths)
-            A=LatexCode(file_content)
-            B=A.substitute_all_inputs(input_paths=input_paths)
-            new_code=new_code.substitute_occurrence_input(\
-                    occurrence,B.text_brut)
+            B=occurrence.latex_code(input_paths,use_rope=self.use_rope).substitute_all_inputs(input_paths=input_paths)
+            print("Adding file",occurrence.filename)
+            A.included_file_list.append(occurrence.filename)
+            end=occurrence.end
+            if self.use_rope :
+                edits.append((occurrence.position,end,B.rope(),B.source_map))
+            else :
+                edits.append((occurrence.position,end,B.text_brut,B.source_map))
+        new_code=A.apply_edits(edits)
         new_code.input_paths=input_paths
         return new_code
     def change_macro_argument(self,macro_name,n,func,n_args):
@@ -258,13 +543,18 @@ class LatexCode(object):
         of each use of <macro_name>.
 
         return a new_object LatexCode
+
+        An occurrence which is inside the arguments of an other one is
+        left as it is.
         """
-        list_occurrences,configuration=self.search_use_of_macro(macro_name,n_args,give_configuration=True)
-        a=""
-        for i in range(len(list_occurrences)):
-            a=a+configuration[i]+list_occurrences[i].change_argument(n,func).as_written
-        a=a+configuration[-1]
-        return LatexCode(a)
+        edits=[]
+        stop=0
+        for occurrence in self.search_use_of_macro(macro_name,n_args):
+            if occurrence.position < stop :
+                continue
+            stop=occurrence.end
+            edits.append((occurrence.position,stop,occurrence.change_argument(n,func).as_written))
+        return self.apply_edits(edits)
     def change_labels_refs(self,func):
         r"""
         Change \ref{MyLabel}, \eqref{MyLabel} and \label{MyLabel} applying func to the argument.
@@ -272,7 +562,42 @@ class LatexCode(object):
         x=self.change_macro_argument(r"\ref",1,func,1)
         y=x.change_macro_argument(r"\eqref",1,func,1)
         z=y.change_macro_argument(r"\label",1,func,1)
-        self.__init__(z.text_brut)
+        if self.use_rope :
+            self.__init__(z.rope(),stripped=True,use_rope=True,source_map=z.source_map)
+        else :
+            self.__init__(z.text_brut,stripped=True,source_map=z.source_map)
+    def substitute_macro_occurrences(self,macro_name,number_of_arguments,func):
+        r"""
+        Replace each occurrence of <macro_name> by func(occurrence).
+
+        - `func` is a function which takes an Occurrence and returns a string.
+
+        All the occurrences are replaced in one pass (see apply_edits). An occurrence
+        which is inside the arguments of an other one is not replaced in that pass;
+        if the result of `func` still contains it, it is replaced in a next pass.
+
+        Return a new latexparser.LatexCode object.
+        """
+        A = self.copy()
+        liste_occurrences = A.search_use_of_macro(macro_name,number_of_arguments)
+        while liste_occurrences :
+            edits = []
+            nested = 0
+            stop = 0
+            for occurrence in liste_occurrences :
+                if occurrence.position < stop :
+                    nested = nested+1
+                    continue
+                stop = occurrence.end
+                edits.append((occurrence.position,stop,func(occurrence)))
+            A = A.apply_edits(edits)
+            if nested == 0 :
+                break
+            new_occurrences = A.search_use_of_macro(macro_name,number_of_arguments)
+            if len(new_occurrences) >= len(liste_occurrences) :
+                break
+            liste_occurrences = new_occurrences
+        return A
     def remove_macro_content(self,macro_name,number_of_arguments):
         r"""
         Remove the presence of a macro (not its definition). 
@@ -285,11 +610,7 @@ class LatexCode(object):
 
         Return a new latexparser.LatexCode object.
         """
-        A = self.copy()
-        liste_occurrences = A.search_use_of_macro(macro_name,number_of_arguments)
-        for occurrence in liste_occurrences :
-            A=A.replace(occurrence.as_written,"")
-        return A
+        return self.substitute_macro_occurrences(macro_name,number_of_arguments,lambda occurrence:"")
     def remove_macro_name(self,macro_name,number_of_arguments):
         r"""
         Remove the macro name, but leaves the argument.
@@ -302,11 +623,7 @@ class LatexCode(object):
 
         This function only works with a macro which has only one argument.
         """
-        A = self.copy()
-        liste_occurrences = A.search_use_of_macro(macro_name,number_of_arguments)
-        for occurrence in liste_occurrences :
-            A=A.replace(occurrence.as_written,occurrence.arguments[0])
-        return A
+        return self.substitute_macro_occurrences(macro_name,number_of_arguments,lambda occurrence:occurrence.arguments[0])
     def position_to_line(self,position):
         """
         return the line (as string) which contains the given position.
@@ -323,8 +640,66 @@ class LatexCode(object):
         """
         textA=ensure_unicode(textA)
         textB=ensure_unicode(textB)
-        new_text = self.text_brut.replace(textA,textB)
-        A = LatexCode(new_text,oldLaTeX=self)
+        if textA == "" :
+            return LatexCode(self.text_brut.replace(textA,textB),oldLaTeX=self)
+        # Same as str.replace : non overlapping, from left to right.
+        text=self.text_brut
+        edits=[]
+        position=text.find(textA)
+        while position != -1 :
+            edits.append((position,position+len(textA),textB))
+            position=text.find(textA,position+len(textA))
+        return self.apply_edits(edits)
+    @inherit_properties
+    def apply_edits(self,edits):
+        """
+        Replace some spans of self.text_brut. Return a new object.
+
+        - `edits` is a list of tuples (start,end,replacement) : the text 
+           self.text_brut[start:end] is replaced by `replacement`.
+           A fourth element can give the SourceMap of the replacement (when it
+           comes from an other LatexCode); otherwise the replacement is located
+           at the place of the replaced text.
+
+        The spans are positions in self.text_brut. They do not have to be sorted,
+        but they cannot overlap. Only the given spans are changed : an other
+        place in the text with the same content is not touched.
+
+        The new text is built by one join, so that k edits cost one pass
+        on the text instead of k. If self.use_rope is True, the new text is
+        a rope and the edits cost O(k log n).
+
+        The comments are stripped again only if an edit creates some (see
+        EditsKeepStripped). The definitions of macros are kept when no edit
+        can change them.
+        """
+        mapped_edits=sorted(edits,key=lambda edit:edit[0])
+        edits=[edit[:3] for edit in mapped_edits]
+        turtle=0
+        for start,end,replacement in edits:
+            if start < turtle :
+                raise ValueError("The edits on the spans ending at %s and beginning at %s are overlapping"%(str(turtle),str(start)))
+            turtle=end
+        if self.use_rope :
+            text=self.rope()
+        else :
+            text=self.text_brut
+        stripped=not self.keep_comments and EditsKeepStripped(text,edits)
+        new_length=len(text)+sum(len(replacement)-(end-start) for start,end,replacement in edits)
+        source_map=self.source_map.apply_edits(mapped_edits,new_length)
+        if self.use_rope :
+            A=LatexCode(text.apply_edits(edits),oldLaTeX=self,stripped=stripped,use_rope=True,source_map=source_map)
+        else :
+            pieces=[]
+            turtle=0
+            for start,end,replacement in edits:
+                pieces.append(text[turtle:start])
+                pieces.append(ensure_unicode(str(replacement)))
+                turtle=end
+            pieces.append(text[turtle:])
+            A=LatexCode("".join(pieces),oldLaTeX=self,stripped=stripped,source_map=source_map)
+        if stripped and EditsKeepDefinitions(self,edits):
+            A._dict_of_definition_macros=self._dict_of_definition_macros
         return A
     def splitlines(self):
         textA=self.text_brut
@@ -342,7 +717,7 @@ class LatexCode(object):
             if ".tex" not in filename :
                 filename = filename+".tex"
             new = self+FileToLatexCode(filename)
-            self.__init__(new.text_brut)
+            self.__init__(new.text_brut,stripped=True)
         if filenames :
             for i in range(len(filenames)):
                 if ".tex" not in filenames[i] :
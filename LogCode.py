@@ -21,10 +21,188 @@
 # email: laurent@claessens-donadello.eu
 
 
+import os
+import time
+import codecs
+
+from latexparser.LabelIndex import LabelIndex
+from latexparser.Warnings import LaTeXWarning
 from latexparser.Warnings import ReferenceWarning
 from latexparser.Warnings import MultiplyLabelWarning
 from latexparser.Warnings import CitationWarning
 from latexparser.Warnings import LabelWarning
+from latexparser.Warnings import TeXCapacityExceededWarning
+
+rerun_message = "LaTeX Warning: Label(s) may have changed. Rerun to get cross-references right."
+tex_capacity_exceeded = "TeX capacity exceeded"
+# The messages by which LaTeX or the packages (rerunfilecheck, hyperref, biblatex, ...)
+# ask for one more compilation.
+rerun_messages = ["Rerun to get","Rerun LaTeX","Please rerun LaTeX","Please (re)run"]
+# The messages after which TeX does not produce anything useful.
+fatal_messages = [tex_capacity_exceeded,"Emergency stop","Fatal error occurred"]
+
+warning_classes = { "Reference":ReferenceWarning,"Label":MultiplyLabelWarning,"Citation":CitationWarning }
+
+def ParseWarning(warn):
+    r"""
+    Return the tuple (genre,label,page) of a warning, or None.
+    'warn' is what follows "Warning: " in the log, up to the next "Warning: ".
+    """
+    try :
+        text = warn[0:warn.find(".")]
+        mots=text.split(" ")
+        genre = mots[0]
+        label = mots[1][1:-1]
+        try :
+            page = mots[mots.index("page")+1]
+        except ValueError :
+            page = -1
+    except (ValueError,IndexError) :
+        return None
+    return genre,label,page
+
+class LogParser(object):
+    """
+    Read a log file by pieces, for example while pdflatex is still writing it.
+
+    'feed' returns the new warnings, as soon as they are complete. A warning is given
+    once for each label (and each kind of warning).
+
+    - self.undefined_references, self.undefined_citations, self.multiply_labels : the warnings found.
+    - self.rerun : True if LaTeX asks to rerun to get cross-references right.
+    - self.rerun_requested : True if LaTeX or a package asks for one more compilation
+                             (for any reason, see rerun_messages).
+    - self.fatal : the first fatal message found (see fatal_messages), or None. When
+                   it is not None, the compilation can be stopped.
+    - self.tex_capacity_exceeded : True if the TeX capacity was exceeded.
+    """
+    def __init__(self):
+        self.undefined_references=[]
+        self.undefined_citations=[]
+        self.multiply_labels=[]
+        self.rerun = False
+        self.rerun_requested = False
+        self.fatal = None
+        self.tex_capacity_exceeded = False
+        self._lists = { "Reference":self.undefined_references,"Label":self.multiply_labels,"Citation":self.undefined_citations }
+        self._seen = set()      # the pairs (genre,label) already given
+        self._buffer = ""       # what is not yet analysed
+        self._overlap = max(len(message) for message in fatal_messages+rerun_messages+[rerun_message])-1
+        self._tail = ""         # the end of the previous piece, for the messages cut between two pieces.
+    def search_messages(self,text):
+        window = self._tail+text
+        if not self.rerun and rerun_message in window :
+            self.rerun = True
+        if not self.rerun_requested :
+            self.rerun_requested = any(message in window for message in rerun_messages)
+        for message in fatal_messages :
+            if message in window :
+                if message == tex_capacity_exceeded :
+                    self.tex_capacity_exceeded = True
+                if self.fatal is None :
+                    self.fatal = message
+        self._tail = window[-self._overlap:]
+    def add(self,warn,new):
+        parsed = ParseWarning(warn)
+        if parsed is None :
+            return
+        genre,label,page = parsed
+        if genre not in warning_classes or (genre,label) in self._seen :
+            return
+        self._seen.add((genre,label))
+        warning = warning_classes[genre](label,page)
+        self._lists[genre].append(warning)
+        new.append(warning)
+    def feed(self,text):
+        """
+        Read the next piece of the log. Return the list of the new warnings.
+        """
+        self.search_messages(text)
+        new = []
+        buffer = self._buffer+text
+        turtle = 0
+        while True :
+            start = buffer.find("Warning: ",turtle)
+            if start == -1 :
+                # Keep what could be the beginning of a "Warning: " cut by the end of the piece.
+                turtle = max(turtle,len(buffer)-len("Warning: ")+1)
+                break
+            begin = start+len("Warning: ")
+            following = buffer.find("Warning: ",begin)
+            dot = buffer.find(".",begin,len(buffer) if following == -1 else following)
+            if dot != -1 :
+                self.add(buffer[begin:dot+1],new)
+                turtle = dot+1
+            elif following != -1 :
+                self.add(buffer[begin:following],new)
+                turtle = following
+            else :
+                # This warning is not complete yet.
+                turtle = start
+                break
+        self._buffer = buffer[turtle:]
+        return new
+    def finish(self):
+        """
+        The log is complete. Return the list of the last warnings.
+        """
+        new = []
+        start = self._buffer.find("Warning: ")
+        if start != -1 :
+            self.add(self._buffer[start+len("Warning: "):],new)
+        self._buffer = ""
+        return new
+    def warnings(self):
+        """
+        Return the list of the warnings, in the order of LogCode.warnings.
+        """
+        warnings = []
+        warnings.extend(self.undefined_references)
+        warnings.extend(self.undefined_citations)
+        warnings.extend(self.multiply_labels)
+        if self.rerun :
+            warnings.append(LabelWarning(rerun_message))
+        if self.tex_capacity_exceeded :
+            warnings.append(TeXCapacityExceededWarning(tex_capacity_exceeded))
+        return warnings
+
+def FollowLog(filename,process=None,parser=None,interval=0.2):
+    """
+    Iterate over the warnings of the log file 'filename' as they are written.
+
+    'process' is the running compilation (a subprocess.Popen). The file is followed
+    until the process ends; it is terminated as soon as a fatal message
+    (see LogParser) is found. Without 'process', the file is read up to its end.
+
+    The LogParser used (given in 'parser' or created) contains the results.
+    """
+    if parser is None :
+        parser = LogParser()
+    def running():
+        return process is not None and process.poll() is None
+    while not os.path.exists(filename):
+        if not running():
+            return
+        time.sleep(interval)
+    decoder = codecs.getincrementaldecoder("utf8")(errors="replace")
+    with open(filename,"rb") as f :
+        while True :
+            alive = running()
+            data = f.read()
+            if data :
+                for warning in parser.feed(decoder.decode(data)):
+                    yield warning
+                if parser.fatal is not None :
+                    if running():
+                        print("Fatal error in the log file (%s) : the compilation is stopped."%parser.fatal)
+                        process.terminate()
+                    break
+            elif not alive :
+                break
+            else :
+                time.sleep(interval)
+    for warning in parser.feed(decoder.decode(b"",final=True))+parser.finish():
+        yield warning
 
 class LogCode(object):
     """
@@ -32,6 +210,9 @@ class LogCode(object):
 
     If your code is in a file, please use the function FileToLatexCode :
     FileToLogCode("MyFile.log")
+
+    The log is analysed by a LogParser (see also FollowLog to read the log during
+    the compilation).
     """
     def __init__(self,text_brut,filename=None,stop_on_first=False):
         """
@@ -51,7 +232,7 @@ class LogCode(object):
             self.search_for_errors(stop_on_first=stop_on_first)
         return self._rerun_to_get_cross_references
     def search_for_still_cross_references(self):
-        self.maybeMore ="LaTeX Warning: Label(s) may have changed. Rerun to get cross-references right."
+        self.maybeMore = rerun_message
         return self.maybeMore in self.text_brut
     def search_for_errors(self,stop_on_first=False):
         still_cross_references=self.search_for_still_cross_references()
@@ -61,50 +242,27 @@ class LogCode(object):
                 self._rerun_to_get_cross_references = True
         if not self._rerun_to_get_cross_references :
             print("Analysing log file",self.filename)
-            Warns = self.text_brut.split("Warning: ")
-            for warn in Warns[1:]:
-                try :
-                    text = warn[0:warn.find(".")]
-                    mots=text.split(" ")
-                    genre = mots[0]
-                    label = mots[1][1:-1]
-                    try :
-                        page = mots[mots.index("page")+1]
-                    except ValueError :
-                        page = -1
-                    if genre == "Reference" :
-                        if label not in [w.label for w in self.undefined_references]:
-                            self.undefined_references.append(ReferenceWarning(label,page))
-                    if genre == "Label" :
-                        if label not in [w.label for w in self.undefined_labels]:
-                            self.multiply_labels.append(MultiplyLabelWarning(label,page))
-                    if genre == "Citation" :
-                        if label not in [w.label for w in self.undefined_citations]:
-                            self.undefined_citations.append(CitationWarning(label,page))
-                except ValueError :
-                    pass
-            self.warnings = []
-            self.warnings.extend(self.undefined_references)
-            self.warnings.extend(self.undefined_citations)
-            self.warnings.extend(self.multiply_labels)
-
-            if still_cross_references:
-                self.warnings.append(LabelWarning(self.maybeMore))
-                self._rerun_to_get_cross_references=True
-            else :
-                self._rerun_to_get_cross_references=False
-
-            self.TeXcapacityexeeded="TeX capacity exceeded"
-            if self.TeXcapacityexeeded in self.text_brut:
-                self.warnings.append(TeXCapacityExceededWarning(self.TeXcapacityexeeded))
-
+            parser = LogParser()
+            parser.feed(self.text_brut)
+            parser.finish()
+            self.undefined_references = parser.undefined_references
+            self.undefined_citations = parser.undefined_citations
+            self.multiply_labels = parser.multiply_labels
+            self.warnings = parser.warnings()
+            self._rerun_to_get_cross_references = parser.rerun
+            self.TeXcapacityexeeded = tex_capacity_exceeded
             self.probs_number=len(self.warnings)
     def tex_capacity_exeeded(self):
-        return self.TeXcapacityexeeded in self.text_brut
+        return tex_capacity_exceeded in self.text_brut
     def __str__(self):
+        # The source files are read once for all the warnings.
+        index = LabelIndex()
         a=[]
         for warn in self.warnings :
-            a.append(warn.__str__())
+            if isinstance(warn,LaTeXWarning):
+                a.append(warn.report(index))
+            else :
+                a.append(warn.__str__())
         if self.probs_number > 1:
             a.append("Il reste encore %s problèmes à régler. Bon travail."%str(self.probs_number))
         if self.probs_number == 1:
@@ -118,6 +276,7 @@ def ListOfCitation(filelist):
     r"""
     From a list of files, return the list of arguments in \cite{...}.
     """
+    from latexparser.all import FileToLatexCode
     l=[]
     new_filelist=[a+".tex" for a in filelist]
     for f in new_filelist :
@@ -21,7 +21,10 @@
 # email: laurent@claessens-donadello.eu
 
 import re
+from bisect import bisect_left
+
 from latexparser.Occurrence import Occurrence
+from latexparser.Tokenizer import IsInComment
 
 
 paires = { "{":"}","[":"]","`":"'"}
@@ -33,6 +36,48 @@ def compactization(text,accepted_between_arguments):
     return text
 
 
+# For each type of opening brace, the compiled pattern that matches the braces
+# of that type, and the one that matches what can be found between two arguments
+# before the next opening brace.
+brace_patterns = { op:re.compile("["+re.escape(op+cl)+"]") for op,cl in paires.items() }
+continue_patterns = { op:re.compile(r"(?:[ \n]|%[^\n]*\n)*"+re.escape(op)) for op in paires.keys() }
+not_between_arguments = re.compile("[^"+re.escape("".join(accepted_between_arguments))+"]")
+
+def FitBracePosition(text,position,opening,end=None,table=None):
+    """
+    Return the tuple (start,close) where 'start' is the position of the next
+    opening brace in text[position:end] and 'close' the position of the 
+    corresponding closing brace.
+
+    Return None if there is no opening brace or if it is not closed before 'end'.
+
+    Nothing is copied : we jump from brace to brace in 'text' itself.
+    If 'table' is a BraceTable of 'text', the answer is read in the table
+    (only for the opening "{"); in that case the escaped braces are ignored.
+    """
+    if end is None :
+        end = len(text)
+    if table is not None and opening == "{" :
+        start = table.next_open(position,end)
+        if start == -1 :
+            return None
+        close = table.close_of(start)
+        if close == -1 or close >= end :
+            return None
+        return start,close
+    start = text.find(opening,position,end)
+    if start == -1 :
+        return None
+    level = 0
+    for brace in brace_patterns[opening].finditer(text,start,end):
+        if brace.group() == opening :
+            level = level+1
+        else :
+            level = level-1
+        if level == 0:
+            return start,brace.start()
+    return None
+
 def SearchFitBrace(text,position,opening):
     """
     return a tuple containing the text withing the next pair of open/close brace and the position where the pair closes in text
@@ -42,18 +87,26 @@ def SearchFitBrace(text,position,opening):
     SearchFitBrace(s,4,["(",")"])
     returns ('Louis', 6, 12)
     because the next brace begins at position 6, finishes at position 12 and the text within in "Louis"
+
+    See FitBracePosition if you only need the positions.
     """
-    close = paires[opening]
-    level = 0
-    giventext = text[position:]
-    startPosition = position+giventext.find(opening)
-    for i in range(startPosition,len(text)):
-        if text[i] == opening :
-            level = level+1
-        if text[i] == close :
-            level = level-1
-        if level == 0:
-            return text[startPosition+1:i],startPosition,i
+    positions = FitBracePosition(text,position,opening)
+    if positions is None :
+        return None
+    start,close = positions
+    return text[start+1:close],start,close
+
+def ContinueSearchPosition(s,start,opening,end=None):
+    """
+    Return the position of the next opening bracket in s[start:end] if it is
+    a «good» candidate (see ContinueSearch), and -1 if not.
+    """
+    if end is None :
+        end = len(s)
+    result = continue_patterns[opening].match(s,start,end)
+    if result :
+        return result.end()-1
+    return -1
 
 def ContinueSearch(s,opening):
     r"""
@@ -68,24 +121,50 @@ def ContinueSearch(s,opening):
     ContinueSearch(s,"{")
     return True and the offset of the last opening bracket
     """
-    close = paires[opening]
-    turtle = 0
-    while turtle < len(s):
-        if s[turtle]=="%":
-            a=s[turtle:]
-            pos = a.find("\n")
-            if pos == -1:
-                return False,-1
-            turtle = turtle+pos
-        if s[turtle] == opening :
-            return True,turtle
-        if s[turtle] not in accepted_between_arguments :
-            return False,-1
-        else :
-            turtle=turtle+1
-    return False,-1
+    position = ContinueSearchPosition(s,0,opening)
+    return position != -1,position
 
-def SearchArguments(s,number_of_arguments):
+def SearchArgumentsPosition(s,start,number_of_arguments,end=None,table=None):
+    r"""
+    Same as SearchArguments, but works with positions in s instead of copies of
+    the text. The optional 'table' is a BraceTable of s (see FitBracePosition).
+
+    The arguments are searched in s[start:end]. Return a tuple (spans,stop) where
+    'spans' is the list of tuples (open,close) giving the positions of the braces of
+    each argument, and 'stop' is the position at which the fitted code ends, so that
+    the "as written" code is s[start:stop].
+    """
+    if end is None :
+        end = len(s)
+    turtle = start
+    spans = []
+    while len(spans) < number_of_arguments :
+        positions = FitBracePosition(s,turtle,"{",end,table=table)
+        if positions is None :
+            if table is None :
+                next_open = s.find("{",turtle,end)
+            else :
+                next_open = table.next_open(turtle,end)
+            if next_open == -1 :
+                return spans,turtle
+            print("latexparser Error : fitting brace not found")
+            print("We were at position %s in the string"%str(turtle))
+            print(s[start:end])
+            print("------------------------------")
+            raise ValueError("Fitting brace not found at position %s"%str(turtle))
+        spans.append(positions)
+        turtle = positions[1]+1
+        if turtle >= end:
+            return spans,end
+        if s[turtle] != "{":
+            offset = ContinueSearchPosition(s,turtle,"{",end)
+            if offset != -1:
+                turtle = offset-1
+            if offset == -1 or len(spans) == number_of_arguments:
+                return spans,turtle
+    return spans,turtle
+
+def SearchArguments(s,number_of_arguments,table=None):
     r"""
     From a string of the form {A}...{B}...{C}, returns the list ["A","B","C"] where the dots are elements of the list accepted_between_arguments.
     Inside A,B and C you can have anything including the elements of the list accepted_between_arguments.
@@ -100,35 +179,15 @@ def SearchArguments(s,number_of_arguments):
     #   is not in the accepted_between_arguments. In other terms, we study the content of what is represented by dots in (1)
     # We put the whole in a loop.
     # at the end, as_written is then set as the string s[0:end] where end is the last closing bracket.
-    # The string s itself is never changed and all the positions of characters are computed as offset inside s.
-    turtle = 0
-    arguments = []
-    while len(arguments) < number_of_arguments :
-        try :
-            arg,start,end=SearchFitBrace(s,turtle,"{")
-        except :
-            print("latexparser Error : fitting brace not found")
-            print("We were at position %s in the string"%str(turtle))
-            print(s)
-            print("------------------------------")
-            raise
-        arguments.append(arg)
-        turtle=end+1
-        if turtle >= len(s):
-            as_written = s
-            return arguments,as_written
-        if s[turtle] != "{":
-            boo,offset = ContinueSearch(s[turtle:],"{")
-            if boo:
-                turtle=turtle+offset-1
-            if (not boo) or (len(arguments)==number_of_arguments):
-                as_written = s[0:turtle]
-                return arguments,as_written
-
-def NextMacroCandidate(s,macro_name,search_macro_name=None):
+    # The work is done on positions by SearchArgumentsPosition; here we only create the strings.
+    spans,stop = SearchArgumentsPosition(s,0,number_of_arguments,table=table)
+    arguments = [s[op+1:cl] for op,cl in spans]
+    return arguments,s[0:stop]
+
+def NextMacroCandidate(s,macro_name,search_macro_name=None,pos=0):
     """
     return the a tuple (boolean,integer,boolena) saying 
-    1. if macro_name is present in string s
+    1. if macro_name is present in string s (after position 'pos')
     2. where is it
     3. if this is in a comment  (False if there are no matching macro)
 
@@ -136,7 +195,7 @@ def NextMacroCandidate(s,macro_name,search_macro_name=None):
     """
     if search_macro_name==None:
         search_macro_name=re.compile(re.escape(macro_name)+"[^A-Za-z]").search
-    result=search_macro_name(s)
+    result=search_macro_name(s,pos)
     if not result :
         return False,-1,False
     k=result.start()
@@ -144,16 +203,16 @@ def NextMacroCandidate(s,macro_name,search_macro_name=None):
     # init_line is the position at which the line begins;
     # we are going to check if there is "[^\]%" between the begining
     # of the line and my macro.
-    init_line=s[0:k].rfind("\n")
+    init_line=s.rfind("\n",0,k)
     if init_line==-1:
         init_line=0
-    candidate=s[init_line:k]
-    search_comment_pc=re.compile("[^\\\]%").search
-    result=search_comment_pc(candidate)
+    result=search_comment_pc(s,init_line,k)
     if result :
         return True,k,True
     return True,k,False
 
+search_comment_pc=re.compile("[^\\\]%").search
+
 def SearchUseOfMacro(code,macro_name,number_of_arguments=None,give_configuration=False,fast=False):
     r"""
     <macro_name> has to contain the initial \ of the macro. I you want to search for \MyMacro, ask for "\MyMacro"; not only "MyMacro"
@@ -184,7 +243,7 @@ def SearchUseOfMacro(code,macro_name,number_of_arguments=None,give_configuration
     use=[]
     s = code.text_brut
     if fast :       
-        results=re.finditer(macro_name+"{",s)
+        results=re.compile(re.escape(macro_name)+"{").finditer(s)
         for res in results :
             start = res.start()
             # Only works with exactly one argument up to now :
@@ -195,45 +254,71 @@ def SearchUseOfMacro(code,macro_name,number_of_arguments=None,give_configuration
             use.append(occurrence)
         return use
 
-    search_macro_name=re.compile(re.escape(macro_name)+"[^A-Za-z@]").search
-    if not macro_name in s :
-        return []
-    turtle = 0
-    config_turtle=0
-    remaining = s
     use = []
     configuration=[]
-    boo=True
-    while boo:
-        remaining=s[turtle:]
-        boo,offset,in_comment = NextMacroCandidate(remaining,macro_name,search_macro_name=search_macro_name)
-        if boo :
-            turtle = turtle+offset+len(macro_name)
-            remaining=s[turtle:]
-            if not in_comment :
-                try :
-                    arguments,as_written=SearchArguments(remaining,number_of_arguments)
-                except TypeError:
-                    print(number_of_arguments)
-                    print(remaining[0:30])
-                    raise
-                position=turtle-len(macro_name)
-                occurrence=Occurrence(macro_name,arguments,macro_name+as_written,position=turtle-len(macro_name))
-
-                # The following test excludes the cases when we fit the \newcommand{\MyMacro}
-                test=compactization(occurrence.as_written,accepted_between_arguments)
-                if test[len(macro_name)] != "}":
-                    configuration.append(code.text_brut[config_turtle:occurrence.position])
-                    use.append(occurrence)
-                config_turtle=position+len(occurrence.as_written)
-        else :      # if not boo
-            if give_configuration:
-                configuration.append(code.text_brut[config_turtle:])
-                return use,configuration
-            else :
-                return use
+    config_turtle=0
+    for candidate,stop,occurrence in ScanUseOfMacro(code,macro_name,number_of_arguments):
+        if occurrence is not None :
+            configuration.append(s[config_turtle:candidate])
+            use.append(occurrence)
+        config_turtle=stop
     if give_configuration:
-        configuration.append(code.text_brut[config_turtle:])
+        configuration.append(s[config_turtle:])
         return use,configuration
     else :
         return use
+
+def ScanUseOfMacro(code,macro_name,number_of_arguments,start=0,end=None,reverse=False):
+    r"""
+    Iterate over the tuples (candidate,stop,occurrence) of the uses of 'macro_name' in code.text_brut
+    which begin in text_brut[start:end], in the order of the text (or backward if 'reverse' is True).
+
+    'candidate' is the position of the macro name and 'stop' the end of what is fitted.
+    'occurrence' is None when the candidate is the name of a macro being defined (as
+    in \newcommand{\MyMacro}); it is not a use of the macro.
+
+    The macros in the comments are skipped.
+    """
+    # The candidates are read in the macro index of the code, so that the
+    # text is not lexed again for each searched macro.
+    # Everything is then done by positions in s : the text is never copied.
+    # The occurrences keep the positions; their strings are created when asked.
+    s = code.text_brut
+    candidates = code.macro_index().get(macro_name,[])
+    if start > 0 or end is not None :
+        first = bisect_left(candidates,start)
+        last = len(candidates) if end is None else bisect_left(candidates,end)
+        candidates = candidates[first:last]
+    if reverse :
+        candidates = reversed(candidates)
+    comments = code.comment_positions()
+    table = code.brace_table()
+    for candidate in candidates:
+        turtle = candidate+len(macro_name)
+        if turtle >= len(s):
+            continue
+        if IsInComment(s,comments,candidate):
+            continue
+        spans,stop = SearchArgumentsPosition(s,turtle,number_of_arguments,table=table)
+
+        # The following test excludes the cases when we fit the \newcommand{\MyMacro}
+        test=not_between_arguments.search(s,turtle,stop)
+        if test and test.group() == "}":
+            yield candidate,stop,None
+            continue
+        yield candidate,stop,Occurrence.from_spans(macro_name,s,candidate,stop,spans)
+
+def IterUseOfMacro(code,macro_name,number_of_arguments,start=0,end=None,reverse=False):
+    r"""
+    Iterate over the occurrences of 'macro_name' in code.text_brut, as they are found.
+
+    Same occurrences as SearchUseOfMacro, but nothing is done for the occurrences
+    which are not asked : the search of the first (or the last, with reverse=True)
+    occurrence only fits the arguments of that one.
+
+    - `start`,`end` : only the occurrences beginning in text_brut[start:end] are given.
+    - `reverse` : begin with the last occurrence.
+    """
+    for candidate,stop,occurrence in ScanUseOfMacro(code,macro_name,number_of_arguments,start,end,reverse):
+        if occurrence is not None :
+            yield occurrence
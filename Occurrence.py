@@ -20,7 +20,8 @@
 # copyright (c) Laurent Claessens, 2010,2012-2016
 # email: laurent@claessens-donadello.eu
 
-import codecs
+import re
+from latexparser.FileLoader import LoadText
 from latexparser.InputPaths import InputPaths
 
 class Occurrence(object):
@@ -33,14 +34,78 @@ class Occurrence(object):
         and then \MyMacro{second}
 
         the first occurrence of \MyMacro has position=12
+
+    An occurrence found in a text (see Occurrence.from_spans) only keeps a reference
+    to that text and the positions of its arguments : the strings as_written and
+    arguments are created when they are asked.
+
+    The attributes are slots, so that an occurrence has no dictionary. The attributes
+    of the former occurrences (name, position, as_written, arguments, arguments_list
+    and number_of_arguments) can still be set.
     """
+    __slots__ = ("name","position","_text","_end","_spans","_arguments","_as_written","_number_of_arguments")
     def __init__(self,name,arguments,as_written="",position=0):
-        self.arguments = arguments
-        self.number_of_arguments = len(arguments)
         self.name = name
-        self.as_written = as_written
-        self.arguments_list = arguments
         self.position = position
+        self._text = None
+        self._end = position+len(as_written)
+        self._spans = None
+        self._arguments = arguments
+        self._as_written = as_written
+        self._number_of_arguments = None
+    @classmethod
+    def from_spans(cls,name,text,position,end,spans):
+        """
+        The occurrence written in text[position:end], whose arguments are
+        text[op+1:cl] for the tuples (op,cl) in 'spans'.
+        """
+        occurrence = cls.__new__(cls)
+        occurrence.name = name
+        occurrence.position = position
+        occurrence._text = text
+        occurrence._end = end
+        occurrence._spans = tuple(k for span in spans for k in span)
+        occurrence._arguments = None
+        occurrence._as_written = None
+        occurrence._number_of_arguments = None
+        return occurrence
+    @property
+    def arguments(self):
+        # The list is created once : change_argument modifies it.
+        if self._arguments is None :
+            text = self._text
+            spans = self._spans
+            self._arguments = [text[spans[k]+1:spans[k+1]] for k in range(0,len(spans),2)]
+        return self._arguments
+    @arguments.setter
+    def arguments(self,arguments):
+        self._arguments = arguments
+    arguments_list = arguments
+    @property
+    def number_of_arguments(self):
+        if self._number_of_arguments is not None :
+            return self._number_of_arguments
+        if self._arguments is None :
+            return len(self._spans)//2
+        return len(self._arguments)
+    @number_of_arguments.setter
+    def number_of_arguments(self,number):
+        self._number_of_arguments = number
+    @property
+    def as_written(self):
+        if self._as_written is None :
+            return self._text[self.position:self._end]
+        return self._as_written
+    @as_written.setter
+    def as_written(self,as_written):
+        self._as_written = as_written
+        self._end = self.position+len(as_written)
+    @property
+    def end(self):
+        """
+        The position just after the occurrence : self.position+len(self.as_written).
+        """
+        return self._end
     def configuration(self):
         r"""
         Return the way the arguments are separated in as_written.
@@ -84,6 +149,12 @@ class Occurrence(object):
     def analyse(self):
         return globals()["Occurrence_"+self.name[1:]](self)     # We have to remove the initial "\" in the name of the macro.
     def __getitem__(self,a):
+        # One argument is read without creating the list of all of them.
+        if self._arguments is None and isinstance(a,int):
+            number = len(self._spans)//2
+            if -number <= a < number :
+                k = 2*(a%number)
+                return self._text[self._spans[k]+1:self._spans[k+1]]
         return self.arguments[a]
     def __str__(self):
         return self.as_written
@@ -93,61 +164,164 @@ class Occurrence_newlabel(object):
     takes an occurrence of \newlabel and creates an object which contains the information.
 
     In the self.section_name we remove "\relax" from the string.
+
+    The value of the \newlabel is separated in its five parts (self.listoche) only
+    when one of them is asked.
     """
+    __slots__ = ("occurrence","arguments","name","_listoche")
     def __init__(self,occurrence):
         self.occurrence = occurrence
         self.arguments = self.occurrence.arguments
+        self._listoche = None
         if len(self.arguments) == 0 :
             self.name = "Non interesting; probably the definition"
-            self.listoche = [None,None,None,None,None]
-            self.value,self.page,self.section_name,self.fourth,self.fifth=(None,None,None,None,None)
+            self._listoche = [None,None,None,None,None]
         else :
-            self.name = self.arguments[0][0]
-            self.listoche = [a[0] for a in SearchArguments(self.arguments[1][0],5)[0]]
-            self.value = self.listoche[0]
-            self.page = self.listoche[1]
-            self.section_name = self.listoche[2].replace(r"\relax","")
-            self.fourth = self.listoche[3]      # I don't know the role of the fourth argument of \newlabel
-            self.fifth = self.listoche[4]       # I don't know the role of the fifth argument of \newlabel
+            self.name = self.arguments[0]
+    @property
+    def listoche(self):
+        if self._listoche is None :
+            from latexparser.MacroUse import SearchArguments
+            from latexparser.BraceTable import BraceTable
+            value = self.arguments[1]
+            listoche = SearchArguments(value,5,table=BraceTable(value))[0]
+            listoche.extend([""]*(5-len(listoche)))
+            self._listoche = listoche
+        return self._listoche
+    @property
+    def value(self):
+        return self.listoche[0]
+    @property
+    def page(self):
+        return self.listoche[1]
+    @property
+    def section_name(self):
+        if self.listoche[2] is None :
+            return None
+        return self.listoche[2].replace(r"\relax","")
+    @property
+    def fourth(self):
+        return self.listoche[3]      # I don't know the role of the fourth argument of \newlabel
+    @property
+    def fifth(self):
+        return self.listoche[4]       # I don't know the role of the fifth argument of \newlabel
 
 class Occurrence_addInputPath(object):
+    __slots__ = ("directory",)
     def __init__(self,Occurrence):
         self.directory=Occurrence[0]
 
 class Occurrence_cite(object):
+    __slots__ = ("label",)
     def __init__(self,occurrence):
         self.label = occurrence[0]
     def entry(self,codeBibtex):
         return codeBibtex[self.label]
 
+# The optional number of arguments in \newcommand{\Foo}[2]{...}
+number_of_arguments_pattern = re.compile(r"[ \n]*\[ *([0-9]+) *\]")
+
 class Occurrence_newcommand(object):
-    def __init__(self,occurrence):
+    r"""
+    takes an occurrence of \newcommand (or \renewcommand) and creates an object which contains the information.
+
+    We understand the two forms
+    \newcommand{\Foo}[n]{definition}
+    \newcommand{\Foo}{definition}
+
+    If 'code' (the LatexCode in which the occurrence was found) is given, the
+    optional number of arguments and the definition are read in code.text_brut
+    after the occurrence, using the brace table of the code. Otherwise the occurrence
+    has to be searched with its arguments : the name and the definition.
+    """
+    __slots__ = ("occurrence","number_of_arguments","name","end","definition")
+    def __init__(self,occurrence,code=None):
         self.occurrence = occurrence
         self.number_of_arguments = 0
-        if self.occurrence[1][1] == "[]":
-            self.number_of_arguments = self.occurrence[1][0]
-        self.name = self.occurrence[0][0]#[0]
-        self.definition = self.occurrence[-1][0]
+        self.name = self.occurrence[0]
+        self.end = occurrence.end      # where the definition ends in the code
+        if code is None :
+            self.definition = self.occurrence[-1]
+            return
+        from latexparser.MacroUse import FitBracePosition
+        text = code.text_brut
+        turtle = occurrence.end
+        optional = number_of_arguments_pattern.match(text,turtle)
+        if optional :
+            self.number_of_arguments = int(optional.group(1))
+            turtle = optional.end()
+        positions = FitBracePosition(text,turtle,"{",table=code.brace_table())
+        if positions is None :
+            self.definition = ""
+        else :
+            self.definition = text[positions[0]+1:positions[1]]
+            self.end = positions[1]+1
+    def parts(self):
+        """
+        Return the list from which 'from_parts' creates the same definition (see ParseCache).
+        """
+        occurrence = self.occurrence
+        return [occurrence.name,occurrence.position,occurrence.end,list(occurrence._spans),self.number_of_arguments,self.definition,self.end]
+    @classmethod
+    def from_parts(cls,text,parts):
+        """
+        The definition given by 'parts' (see 'parts'), whose occurrence is in 'text'.
+        """
+        name,position,occurrence_end,spans,number_of_arguments,definition,end = parts
+        newcommand = cls.__new__(cls)
+        newcommand.occurrence = Occurrence.from_spans(name,text,position,occurrence_end,zip(spans[0::2],spans[1::2]))
+        newcommand.name = newcommand.occurrence[0]
+        newcommand.number_of_arguments = number_of_arguments
+        newcommand.definition = definition
+        newcommand.end = end
+        return newcommand
 
 class Occurrence_label(object):
+    __slots__ = ("occurrence","label")
     def __init__(self,occurrence):
         self.occurrence=occurrence
         self.label=self.occurrence.arguments[0]
 class Occurrence_ref(object):
+    __slots__ = ("occurrence","label")
     def __init__(self,occurrence):
         self.occurrence=occurrence
         self.label=self.occurrence.arguments[0]
 class Occurrence_eqref(object):
+    __slots__ = ("occurrence","label")
     def __init__(self,occurrence):
         self.occurrence=occurrence
         self.label=self.occurrence.arguments[0]
 
+def ReadInputFile(fn):
+    r"""
+    Return the content of the file 'fn' as \input reads it.
+    """
+    try:
+        # Without [:-1] I got an artificial empty line at the end. 
+        return LoadText(fn)[:-1]
+    except IOError :
+        print("Warning : file %s not found."%fn)
+        raise
+
+def InputFilename(filename):
+    r"""
+    Return the name of the file read by \input{filename} : the extension .tex is added
+    when there are none.
+    """
+    if "." not in filename:
+        return filename+".tex"
+    return filename
+
 class Occurrence_input(Occurrence):
+    __slots__ = ("occurrence","filename","input_paths","path","_file_content")
     def __init__(self,occurrence):
-        Occurrence.__init__(self,occurrence.name,occurrence.arguments,as_written=occurrence.as_written,position=occurrence.position)
+        # The same text and arguments as 'occurrence', without creating the strings.
+        for attribute in Occurrence.__slots__ :
+            setattr(self,attribute,getattr(occurrence,attribute))
         self.occurrence = occurrence
         self.filename = self.occurrence[0]
         self.input_paths=InputPaths()
+        self.path=None                 # The file really read, once file_content is called.
         self._file_content=None        # Make file_content "lazy"
     def file_content(self,input_paths=None):
         r"""
@@ -171,18 +345,20 @@ class Occurrence_input(Occurrence):
             raise # Just to know who should do something like that
 
         # Creating the filename
-        filename=self.filename
-        strict_filename = filename
-        if "." not in filename:
-            strict_filename=filename+".tex"
-    
+        strict_filename = InputFilename(self.filename)
+
         # Searching for the correct file in the subdirectories
         fn=input_paths.get_file(strict_filename)
-        try:
-            # Without [:-1] I got an artificial empty line at the end. 
-            text = "".join( codecs.open(fn,"r",encoding="utf8") )[:-1]   
-        except IOError :
-            print("Warning : file %s not found."%strict_filename)
-            raise
+        text = ReadInputFile(fn)
+        self.path=fn
         self._file_content=text
         return self._file_content
+    def latex_code(self,input_paths=None,use_rope=False):
+        """
+        Return the LatexCode of the file corresponding to this occurrence (not recursive).
+
+        The parse cache is used if it is enabled (see latexparser.ParseCache).
+        """
+        from latexparser.ParseCache import ContentToLatexCode
+        text = self.file_content(input_paths)
+        return ContentToLatexCode(text,filename=self.path,use_rope=use_rope)
@@ -0,0 +1,169 @@
+# -*- coding: utf8 -*-
+
+###########################################################################
+#   This is the package latexparser
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+###########################################################################
+
+# copyright (c) Laurent Claessens, 2017
+# email: laurent@claessens-donadello.eu
+
+r"""
+Substitution of the \input with concurrent reading of the files.
+
+The tree of the \input is discovered level by level. The files of a level
+are read by a pool of threads and their comments are stripped (and their
+\input searched) by the same threads or by a pool of processes. When the whole
+tree is known, the files are spliced in the same order as
+LatexCode.substitute_all_inputs does.
+
+The difference with LatexCode.substitute_all_inputs is the order in which the
+directories of \addInputPath are known. There, a file is searched in the
+directories given by all the files which are before it in the document
+(in the order of the substitution). Here, the files of a level are searched in
+the directories given by all the files of the previous levels. This is the
+same as long as the \addInputPath are in the main file.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor
+
+from latexparser import ParseCache
+from latexparser.LatexCode import LatexCode
+from latexparser.Occurrence import ReadInputFile
+from latexparser.Occurrence import InputFilename
+from latexparser.SourceMap import SourceMap
+from latexparser.SourceMap import SourceFile
+
+def ScanInputText(text):
+    r"""
+    The CPU part of the work on an included file.
+
+    Return the tuple (stripped,segments,inputs,directories) where 'stripped' is the
+    text without comments, 'segments' are the pieces of 'text' which are kept
+    (see RemoveComments), 'inputs' is the list of the tuples (start,end,filename) of
+    the \input in 'stripped' and 'directories' is the list of the arguments of the \addInputPath.
+
+    This is a function of the module (and not a method) in order to be sent
+    to an other process. The parse cache is used if it is enabled (see latexparser.ParseCache).
+    """
+    if ParseCache.default_cache is not None :
+        entry = ParseCache.default_cache.scan(text)
+    else :
+        entry = ParseCache.ScanContent(text)
+    return entry["text"],entry["segments"],entry["inputs"],entry["directories"]
+
+class InputTree(object):
+    r"""
+    The files of the tree of \input, read and stripped.
+
+    self.nodes[path] is the tuple (content,stripped,segments,children) where
+    'children' is the list of the tuples (start,end,filename,path) of the \input of the file.
+    """
+    def __init__(self,workers=None,process_workers=None):
+        self.workers = workers
+        self.process_workers = process_workers
+        self.nodes = {}
+    def discover(self,inputs,input_paths):
+        r"""
+        Read all the files of the tree whose first level is given.
+
+        - `inputs` : the list of the tuples (start,end,filename) of the \input of the main file
+        - `input_paths` : the InputPaths object; the \addInputPath of the files are appended to it.
+
+        Return the list of the tuples (start,end,filename,path) of the \input of the main file.
+        """
+        threads = ThreadPoolExecutor(max_workers=self.workers)
+        processes = None
+        if self.process_workers :
+            processes = ProcessPoolExecutor(max_workers=self.process_workers)
+        try :
+            root_children = self.resolve(inputs,input_paths)
+            level = root_children
+            while level :
+                to_read = []
+                for start,end,filename,path in level :
+                    if path not in self.nodes and path not in to_read :
+                        to_read.append(path)
+                contents = list(threads.map(ReadInputFile,to_read))
+                if processes is not None :
+                    scans = list(processes.map(ScanInputText,contents))
+                else :
+                    scans = list(threads.map(ScanInputText,contents))
+                # The \addInputPath of the whole level are known before the next level is resolved.
+                for stripped,segments,children,directories in scans :
+                    for directory in directories :
+                        input_paths.append(directory)
+                level = []
+                for path,content,scan in zip(to_read,contents,scans) :
+                    stripped,segments,children,directories = scan
+                    children = self.resolve(children,input_paths)
+                    self.nodes[path] = (content,stripped,segments,children)
+                    level.extend(children)
+        finally :
+            threads.shutdown()
+            if processes is not None :
+                processes.shutdown()
+        return root_children
+    def resolve(self,inputs,input_paths):
+        return [(start,end,filename,input_paths.get_file(InputFilename(filename))) for start,end,filename in inputs]
+    def expand(self,path,use_rope=False,ancestors=()):
+        r"""
+        Return the LatexCode of the file 'path' in which the \input are (recursively) substituted.
+        """
+        if path in ancestors :
+            raise ValueError("The file %s includes itself (through %s)"%(path," -> ".join(ancestors)))
+        content,stripped,segments,children = self.nodes[path]
+        source_map = SourceMap(len(content),SourceFile(path,content)).compose(segments,len(stripped))
+        code = LatexCode(stripped,filename=path,stripped=True,use_rope=use_rope,source_map=source_map)
+        return self.splice(code,children,ancestors+(path,))
+    def splice(self,code,children,ancestors=()):
+        r"""
+        Substitute the given \input (tuples (start,end,filename,path)) in 'code'.
+        """
+        if children == [] :
+            return code
+        edits = []
+        for start,end,filename,path in children :
+            B = self.expand(path,code.use_rope,ancestors)
+            print("Adding file",filename)
+            code.included_file_list.append(filename)
+            if code.use_rope :
+                edits.append((start,end,B.rope(),B.source_map))
+            else :
+                edits.append((start,end,B.text_brut,B.source_map))
+        return code.apply_edits(edits)
+
+def SubstituteAllInputsParallel(code,input_paths,workers=None,process_workers=None,fast=False):
+    r"""
+    Same as LatexCode.substitute_all_inputs, reading the files concurrently.
+
+    - `workers` : the number of threads which read the files (default : the one of concurrent.futures)
+    - `process_workers` : if given, the stripping of the comments and the search for the \input are made
+                          by that number of processes. Otherwise they are made by the threads.
+    """
+    A = LatexCode(code.text_brut,stripped=True,use_rope=code.use_rope,source_map=code.source_map)
+    for occurrence in A.search_use_of_macro(r"\addInputPath",1,fast=fast):
+        input_paths.append(occurrence.analyse().directory)
+    inputs = []
+    for occurrence in A.search_use_of_macro(r"\input",1,fast=fast):
+        inputs.append((occurrence.position,occurrence.end,occurrence[0]))
+    if inputs == [] :
+        return code
+    tree = InputTree(workers,process_workers)
+    children = tree.discover(inputs,input_paths)
+    new_code = tree.splice(A,children)
+    new_code.input_paths = input_paths
+    return new_code
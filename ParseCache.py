@@ -0,0 +1,233 @@
+# -*- coding: utf8 -*-
+
+###########################################################################
+#   This is the package latexparser
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+###########################################################################
+
+# copyright (c) Laurent Claessens, 2017
+# email: laurent@claessens-donadello.eu
+
+r"""
+A cache on the disk of the work made on the files : removing the comments
+and indexing the macros.
+
+The comments of a file are removed at each reading (this is one pass on the text).
+The entries are named by the hash of the text without the comments, so that an
+unchanged file (even renamed or moved, or with only its comments changed) is
+never parsed again, and a changed file simply gets a new entry. The cache is bounded in size : the least recently used
+entries (the ones whose file on the disk has the oldest modification time) are removed.
+
+The cache is not used unless you ask for it :
+
+    from latexparser.ParseCache import EnableParseCache
+    cache = EnableParseCache()
+    code = FileToLatexCode("MyFile.tex").substitute_all_inputs()
+    print(cache.report())
+"""
+
+import os
+import json
+import hashlib
+
+from latexparser.Utilities import RemoveComments
+from latexparser.FileLoader import WriteFileAtomically
+from latexparser.SourceMap import SourceMap
+from latexparser.SourceMap import SourceFile
+from latexparser.Occurrence import Occurrence_newcommand
+
+# Change it when the content of the entries changes.
+cache_format = "3"
+
+# The cache used by FileToLatexCode and Occurrence_input.latex_code. See EnableParseCache.
+default_cache = None
+
+class ParseCache(object):
+    r"""
+    The entries are JSON files in 'directory'. An entry contains, for a text without comments :
+    - "macros" : the macro index (see LatexCode.macro_index),
+    - "comments" : the positions of the comment signs,
+    - "inputs" : the tuples (start,end,filename) of the \input,
+    - "directories" : the arguments of the \addInputPath,
+    - "definitions" : the definitions of macros (see Occurrence_newcommand.parts).
+    The entries given by 'scan' contain moreover
+    - "text" : the text without comments,
+    - "segments" : the pieces of the content which are kept (see RemoveComments).
+    """
+    def __init__(self,directory=None,max_size=64*1024*1024):
+        if directory is None :
+            directory = os.path.join(os.path.expanduser("~"),".cache","latexparser")
+        self.directory = directory
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._size = None
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+    def path(self,text):
+        digest = hashlib.sha1((cache_format+text).encode("utf8","surrogatepass")).hexdigest()
+        return os.path.join(self.directory,digest+".json")
+    def get(self,text):
+        """
+        Return the entry of 'text' (without comments), or None if it is not in the cache.
+        """
+        path = self.path(text)
+        try :
+            with open(path,"r") as f :
+                entry = json.load(f)
+        except (IOError,OSError,ValueError) :
+            self.misses = self.misses+1
+            return None
+        self.hits = self.hits+1
+        try :
+            os.utime(path,None)     # The entry is "recently used".
+        except OSError :
+            pass
+        return entry
+    def put(self,text,entry):
+        """
+        Record the entry of 'text' (without comments) and remove the oldest entries if the cache is too large.
+        """
+        path = self.path(text)
+        try :
+            old_size = os.path.getsize(path)
+        except OSError :
+            old_size = 0
+        WriteFileAtomically(path,json.dumps(entry))
+        if self._size is None :
+            self._size = sum(size for mtime,size,name in self.entries())
+        else :
+            self._size = self._size+os.path.getsize(path)-old_size
+        if self._size > self.max_size :
+            self.evict()
+    def entries(self):
+        """
+        Return the list of the tuples (mtime,size,path) of the entries.
+        """
+        entries = []
+        for dir_entry in os.scandir(self.directory):
+            if dir_entry.name.endswith(".json"):
+                stat = dir_entry.stat()
+                entries.append((stat.st_mtime,stat.st_size,dir_entry.path))
+        return entries
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache is smaller than
+        three quarters of its maximal size.
+        """
+        entries = sorted(self.entries())
+        size = sum(entry[1] for entry in entries)
+        for mtime,entry_size,path in entries :
+            if size <= 3*self.max_size//4 :
+                break
+            try :
+                os.remove(path)
+            except OSError :
+                continue
+            size = size-entry_size
+            self.evictions = self.evictions+1
+        self._size = size
+    def scan(self,content):
+        """
+        Return the entry of 'content', from the cache or computed (and recorded).
+        """
+        segments = []
+        stripped = RemoveComments(content,segments)
+        entry = self.get(stripped)
+        if entry is None :
+            entry = ScanText(stripped)
+            self.put(stripped,entry)
+        entry["text"] = stripped
+        entry["segments"] = segments
+        return entry
+    def latex_code(self,content,filename=None,use_rope=False):
+        """
+        Return the same as LatexCode(content,filename=filename,use_rope=use_rope), using
+        the cache for the removing of the comments and the macro index.
+        """
+        return EntryToLatexCode(self.scan(content),content,filename,use_rope)
+    def report(self):
+        total = self.hits+self.misses
+        ratio = 100*self.hits//total if total else 0
+        return "Parse cache : %s hits, %s misses (%s%% hits), %s evictions"%(self.hits,self.misses,ratio,self.evictions)
+    def __str__(self):
+        return self.report()
+
+def ScanText(stripped):
+    """
+    Compute the entry of the text without comments 'stripped' (see ParseCache).
+    """
+    from latexparser.LatexCode import LatexCode
+    from latexparser.LatexCode import DefinitionMacros
+    code = LatexCode(stripped,stripped=True)
+    entry = {}
+    entry["macros"] = code.macro_index()
+    entry["comments"] = list(code.comment_positions())
+    entry["directories"] = [occurrence.analyse().directory for occurrence in code.search_use_of_macro(r"\addInputPath",1)]
+    entry["inputs"] = [(occurrence.position,occurrence.end,occurrence[0]) for occurrence in code.search_use_of_macro(r"\input",1)]
+    entry["definitions"] = [newcommand.parts() for newcommand in DefinitionMacros(code).values()]
+    return entry
+
+def ScanContent(content):
+    """
+    Compute the entry of 'content', as ParseCache.scan does, without cache.
+    """
+    segments = []
+    stripped = RemoveComments(content,segments)
+    entry = ScanText(stripped)
+    entry["text"] = stripped
+    entry["segments"] = segments
+    return entry
+
+def EntryToLatexCode(entry,content,filename=None,use_rope=False):
+    """
+    Build the LatexCode of 'content' from its entry, without parsing it again.
+    """
+    from latexparser.LatexCode import LatexCode
+    stripped = entry["text"]
+    source_map = SourceMap(len(content),SourceFile(filename,content)).compose(entry["segments"],len(stripped))
+    code = LatexCode(stripped,filename=filename,stripped=True,use_rope=use_rope,source_map=source_map)
+    code._macro_index = entry["macros"]
+    code._comment_positions = entry["comments"]
+    code._indexed_text = code.text_brut
+    definitions = {}
+    for parts in entry["definitions"] :
+        newcommand = Occurrence_newcommand.from_parts(stripped,parts)
+        definitions[newcommand.name] = newcommand
+    code._dict_of_definition_macros = definitions
+    return code
+
+def EnableParseCache(directory=None,max_size=64*1024*1024):
+    r"""
+    Use a ParseCache in FileToLatexCode and in the substitution of the \input. Return it.
+    """
+    global default_cache
+    default_cache = ParseCache(directory,max_size)
+    return default_cache
+
+def DisableParseCache():
+    global default_cache
+    default_cache = None
+
+def ContentToLatexCode(content,filename=None,use_rope=False):
+    """
+    Return LatexCode(content,filename=filename,use_rope=use_rope), through the
+    default cache if it is enabled.
+    """
+    if default_cache is None :
+        from latexparser.LatexCode import LatexCode
+        return LatexCode(content,filename=filename,use_rope=use_rope)
+    return default_cache.latex_code(content,filename,use_rope)
@@ -26,13 +26,16 @@ Contains tools (using latexparser) intended to create good plugins for pytex.
 pytex is a non-yet published pre-compilation system. Don't try to understand what this module serves to.
 """
 
+# The modules which are not always needed (hashlib, xml.dom.minidom, json, subprocess)
+# are imported in the functions which use them : see import_time.py.
 import os
-import hashlib
-from xml.dom import minidom
+import time
 import latexparser
+from latexparser.LatexCode import LatexCode
+
+# The auxiliary files which change until the compilation is stable (see Compilation.compile_until_stable).
+stable_extensions = [".aux",".toc",".idx",".bbl"]
 
-# TODO : there should be a possibility to compile "up to all references are correct" from here. 
-#       I mean : the checking algorithm should be here.
 class Compilation(object):
     """
     Launch the compilation of a document in various ways.
@@ -40,12 +43,20 @@ class Compilation(object):
 
     Optional boolean argument <nocompilation>. If set to True, the compilations are not actually done, but the command line is printed.
 
+    The programs are launched by latexparser.CompilationSteps : bibtex, makeindex and
+    the nomenclature, which read different files, are launched at the same time by 'special_stuffs'.
+    - 'commands' : a dictionary which changes the programs used, for example
+                   {"pdflatex":"/usr/local/bin/pdflatex","bibtex":"biber"}.
+                   The keys are "pdflatex", "bibtex" and "makeindex".
+    - 'timeouts' : a dictionary which gives the maximal duration (in seconds) of the
+                   steps "latex", "bibtex", "makeindex" and "nomenclature".
+
     Usage examples
     X=latexparser.Compilation("MyLaTeXFile.tex")    # Creates the Compilation object
     X.bibtex()                  # Apply bibtex
     X.chain_dvi_ps_pdf()                # Produce the pdf file
     """
-    def __init__(self,filename,nocompilation=False,pdflatex=True,dvi=False):
+    def __init__(self,filename,nocompilation=False,pdflatex=True,dvi=False,commands=None,timeouts=None):
         import os
         self.filename=filename
         self.nocompilation=nocompilation
@@ -55,36 +66,159 @@ class Compilation(object):
         self.generic_filename = os.path.join(self.dirname,self.generic_basename)
         #self.generic_filename = self.filename[:self.filename.rindex(".")]
         #self.generic_basename=os.path.split(self.generic_filename)[1]
-    def do_it(self,commande_e):
-        commande_e=commande_e.encode("utf8")
-        print("*** external :",commande_e)
-        if self.nocompilation :
-            print("not executed")
-        else :
-            os.system(commande_e)
-    def bibtex(self):
+        self.commands = {"pdflatex":"pdflatex","bibtex":"bibtex","makeindex":"makeindex"}
+        self.commands.update(commands or {})
+        self.timeouts = timeouts or {}
+    def step(self,name,arguments):
+        from latexparser.CompilationSteps import CompilationStep
+        return CompilationStep(name,arguments,self.timeouts.get(name))
+    def bibtex_step(self):
         # absolute pathname.
-        commande_e="bibtex "+self.generic_basename
-        self.do_it(commande_e)
+        return self.step("bibtex",[self.commands["bibtex"],self.generic_basename])
+    def makeindex_step(self):
+        return self.step("makeindex",[self.commands["makeindex"],self.generic_basename])
+    def nomenclature_step(self):
+        return self.step("nomenclature",[self.commands["makeindex"],"-s","nomencl.ist","-o",self.generic_basename+".nls",self.generic_basename+".nlo"])
+    def latex_step(self):
+        # The output is captured : on an error, pdflatex must not wait for an answer.
+        return self.step("latex",[self.commands["pdflatex"],"-interaction=nonstopmode","-halt-on-error","-synctex=1","-shell-escape",self.filename])
+    def run(self,steps):
+        """
+        Launch the given steps (see latexparser.CompilationSteps) at the same time.
+        Return the list of their results.
+        """
+        from latexparser.CompilationSteps import RunSteps
+        return RunSteps(steps,self.nocompilation)
+    def bibtex(self):
+        return self.run([self.bibtex_step()])[0]
     def makeindex(self):
-        commande_e="makeindex "+self.generic_basename
-        self.do_it(commande_e)
+        return self.run([self.makeindex_step()])[0]
     def nomenclature(self):
-        commande_e="makeindex -s nomencl.ist -o "+self.generic_basename+".nls "+self.generic_basename+".nlo"        
-        self.do_it(commande_e)
+        return self.run([self.nomenclature_step()])[0]
     def special_stuffs(self):
-        self.bibtex()
-        self.makeindex()
-        self.nomenclature()
-    def latex(self):
-        program=u"pdflatex -synctex=1   -shell-escape"
-        # The following line does not work without the u"...". Even if {0} and {1} are type unicode
-        commande_e=u"""{0} {1} """.format(program,self.filename)
-        self.do_it(commande_e)
+        return self.run([self.bibtex_step(),self.makeindex_step(),self.nomenclature_step()])
+    def latex(self,follow_log=False):
+        """
+        Compile the document with pdflatex.
+
+        If 'follow_log' is True, the log file is read during the compilation :
+        the warnings are printed as they appear and pdflatex is stopped on a fatal
+        error (see latexparser.LogCode.FollowLog). The LogParser is then returned.
+        """
+        if follow_log and not self.nocompilation :
+            return self.follow_log(self.latex_step())
+        return self.run([self.latex_step()])[0]
+    def follow_log(self,step):
+        """
+        Launch the step (see latexparser.CompilationSteps.RunStepFollowing) and read
+        its log file during the compilation. Return the LogParser.
+        """
+        from latexparser.LogCode import LogParser
+        from latexparser.LogCode import FollowLog
+        from latexparser.LabelIndex import LabelIndex
+        from latexparser.CompilationSteps import RunStepFollowing
+        log_filename = self.generic_filename+".log"
+        # The old log would be read before pdflatex replaces it.
+        if os.path.exists(log_filename):
+            os.remove(log_filename)
+        parser = LogParser()
+        index = LabelIndex()
+        def follow(running):
+            for warning in FollowLog(log_filename,running,parser):
+                print(warning.report(index))
+        RunStepFollowing(step,follow)
+        return parser
     def latex_more(self):
         self.special_stuffs()
         self.latex()
         self.special_stuffs()
+    def digests(self,extensions):
+        """
+        Return the dictionary extension -> sha1sum of the file generic_filename+extension
+        (None if the file does not exist).
+        The .aux includes the .aux files of the chapters (see AuxSha1sum).
+        """
+        digests = {}
+        for extension in extensions :
+            if extension == ".aux" :
+                digests[extension] = AuxSha1sum(self.generic_filename+extension)
+                continue
+            try :
+                digests[extension] = FileToSha1sum(self.generic_filename+extension)
+            except IOError :
+                digests[extension] = None
+        return digests
+    def tool_input_digests(self):
+        r"""
+        Return the sha1sums of the inputs of bibtex (.aux), makeindex (.idx) and the nomenclature (.nlo).
+
+        For the .aux, only the lines read by bibtex (\citation, \bibdata, \bibstyle) are
+        taken into account, so that a change in the labels does not launch bibtex. The
+        .aux files of the chapters are read too (see BibtexInputSha1sum).
+        """
+        digests = self.digests([".idx",".nlo"])
+        digests[".aux"] = BibtexInputSha1sum(self.generic_filename+".aux")
+        return digests
+    def log_parser(self):
+        """
+        Return the LogParser of the log file of the last compilation.
+        """
+        from latexparser.LogCode import LogParser
+        from latexparser.FileLoader import LoadText
+        parser = LogParser()
+        try :
+            parser.feed(LoadText(self.generic_filename+".log",fallback="iso8859-1"))
+        except IOError :
+            return parser
+        parser.finish()
+        return parser
+    def compile_until_stable(self,max_passes=5,follow_log=False):
+        """
+        Compile with pdflatex until the auxiliary files do not change anymore.
+
+        After each pass, bibtex, makeindex and the nomenclature are launched (at the same
+        time) only if their input file changed since they were last launched, or if
+        their output does not exist. The compilation stops after a pass that launched
+        none of them if
+        - the files in 'stable_extensions' (.aux, .toc, ...) are the same as before the pass, or
+        - the log does not ask for one more compilation,
+        and in any case after 'max_passes' passes or on an error which stops pdflatex.
+
+        Return the number of passes.
+        """
+        tools = [(self.bibtex_step,".aux",".bbl"),(self.makeindex_step,".idx",".ind"),(self.nomenclature_step,".nlo",".nls")]
+        used_inputs = self.tool_input_digests()
+        before = self.digests(stable_extensions)
+        for passes in range(1,max_passes+1):
+            result = self.latex(follow_log=follow_log)
+            if self.nocompilation :
+                return passes
+            if follow_log :
+                parser = result
+            else :
+                if result.timed_out :
+                    return passes
+                parser = self.log_parser()
+            if parser.fatal is not None :
+                print("Fatal error (%s) : the compilation is stopped."%parser.fatal)
+                return passes
+            new_inputs = self.tool_input_digests()
+            steps = []
+            for step,tool_input,tool_output in tools :
+                if new_inputs[tool_input] is None :
+                    continue
+                if new_inputs[tool_input] != used_inputs[tool_input] or not os.path.exists(self.generic_filename+tool_output):
+                    steps.append(step())
+            if steps :
+                self.run(steps)
+            used_inputs = new_inputs
+            after = self.digests(stable_extensions)
+            if not steps and (after == before or not parser.rerun_requested) :
+                print("The compilation is stable after %s passes."%passes)
+                return passes
+            before = after
+        print("The compilation is not stable after %s passes."%max_passes)
+        return max_passes
 
 def ChangeLabelsAndRef(codeLaTeX,func):
     r"""
@@ -137,6 +271,7 @@ class CodeBox(dict):
         """
         xmlCode_corrected=xmlCode.replace("&","[PytexSpecial amp]")
         c=xmlCode_corrected.encode("utf-8")
+        from xml.dom import minidom
         dom = minidom.parseString(c)
         for box in dom.getElementsByTagName("CodeBox"):
             dict_name = box.getAttribute("dictName")
@@ -144,7 +279,7 @@ class CodeBox(dict):
                 label = box.getAttribute("label")
                 pre_code = getText(box.childNodes)
                 code = "\n".join(pre_code.split("\n")[1:-1])    # Because minidom adds an empty line at first and last position.
-                self[label]=latexparser.LatexCode(code.replace("[PytexSpecial amp]","&"))
+                self[label]=LatexCode(code.replace("[PytexSpecial amp]","&"))
     def put(self,codeLaTeX,tag):
         # This function is added to the plugin list of Request when using the method Request.create_magic_box
         r"""
@@ -157,23 +292,20 @@ class CodeBox(dict):
 
         return a new object latexparser.LatexCode
         """
-        A=codeLaTeX.copy()
-        liste_occurrences = A.search_use_of_macro(self.put_macro,2)
-        for occurrence in liste_occurrences :
+        def substitution(occurrence):
             tags=occurrence.arguments[0].split(",")
             if tags == [""] or tag in tags :    # If we don't mention a tag, they are all good
                 try :
                     label=occurrence.arguments[1]
                     B=self[label]
                     B=self.put(B,tag)           # This function is recursive !
-                    A=A.replace(occurrence.as_written,B.text_brut)
+                    return B.text_brut
                 except IndexError :
                     print("PytexTools error : \Put... needs two arguments. Don't forget the tag")
                     print(occurrence.as_written)
                     raise
-            else :
-                A=A.replace(occurrence.as_written,"")
-        return A
+            return ""
+        return codeLaTeX.substitute_macro_occurrences(self.put_macro,2,substitution)
 
 def FileToCodeBox(filename,boxname):
     """
@@ -192,16 +324,12 @@ def PytexNotIn(name,codeLaTeX):
 
     This acts like some inline CodeBox. This is the symmetric of PytexOnlyIn
     """
-    A = codeLaTeX.copy()
-    occurrences = A.search_use_of_macro("\PytexNotIn",2)
-    for occurrence in occurrences :
+    def substitution(occurrence):
         tags=occurrence.arguments[0].split(",")
         if name not in tags :
-            code=occurrence.arguments[1]
-            A=A.replace(occurrence.as_written,code)
-        else :
-            A=A.replace(occurrence.as_written,"")
-    return A
+            return occurrence.arguments[1]
+        return ""
+    return codeLaTeX.substitute_macro_occurrences("\PytexNotIn",2,substitution)
 
 def PytexOnlyIn(name,codeLaTeX):
     r"""
@@ -211,16 +339,12 @@ def PytexOnlyIn(name,codeLaTeX):
 
     This acts like some inline CodeBox
     """
-    A = codeLaTeX.copy()
-    occurrences = A.search_use_of_macro("\PytexOnlyIn",2)
-    for occurrence in occurrences :
+    def substitution(occurrence):
         tags=occurrence.arguments[0].split(",")
         if name in tags :
-            code=occurrence.arguments[1]
-            A=A.replace(occurrence.as_written,code)
-        else :
-            A=A.replace(occurrence.as_written,"")
-    return A
+            return occurrence.arguments[1]
+        return ""
+    return codeLaTeX.substitute_macro_occurrences("\PytexOnlyIn",2,substitution)
 
 class CodeFactory(object):
     """
@@ -229,7 +353,7 @@ class CodeFactory(object):
     For most of methods, see the docstring of the corresponding method in latexparser.LatexCode
     """
     def __init__(self):
-        self.codeLaTeX=latexparser.LatexCode("")
+        self.codeLaTeX=LatexCode("")
         self.plugin_list = []
         self.code_box_list = []
         self.fileTracking = FileTracking()
@@ -241,21 +365,57 @@ class CodeFactory(object):
         text=self.codeLaTeX.text_brut
         for plugin in self.plugin_list :
             text = plugin(text)
-        self.codeLaTeX = latexparser.LatexCode(text)
+        self.codeLaTeX = LatexCode(text)
     def apply_all_code_box(self,tag):
         A=self.codeLaTeX.copy()
         for box in self.code_box_list:
             A=box.put(self.codeLaTeX,tag)
         self.codeLaTeX=A
-    def apply_all(self,tag):
+    def apply_stages(self,codeLaTeX,tag):
+        r"""
+        Apply the plugins, the code_box, PytexNotIn and PytexOnlyIn to the given code (without \input substitution).
+        Return a new LatexCode.
+        """
+        text=codeLaTeX.text_brut
+        for plugin in self.plugin_list :
+            text = plugin(text)
+        code=LatexCode(text)
+        A=code.copy()
+        for box in self.code_box_list:
+            A=box.put(code,tag)
+        A = PytexNotIn(tag,A)
+        return PytexOnlyIn(tag,A)
+    def is_local(self):
+        """
+        Say if all the plugins are local (see Plugin), so that apply_all can work file by file.
+
+        A plugin without version (see IncrementalBuild.PluginIdentity) is not
+        local : its results cannot be kept from one run to the next.
+        """
+        if not all(getattr(plugin,"local",False) for plugin in self.plugin_list):
+            return False
+        from latexparser.IncrementalBuild import PluginIdentity
+        return all(PluginIdentity(plugin) is not None for plugin in self.plugin_list)
+    def apply_all(self,tag,incremental=False):
         # TODO : this function should be recursive and apply plugin/code_box as long as necessary, so that one can nest them.
         r"""
         1. Substitute all the \input
         2. Apply the plugins
         3. Apply the code_box
         4. Adapt PytexNotIn and PytexOnlyIn
-        5. Write the FileTracking xml file
+        5. Write the FileTracking file
+
+        If 'incremental' is True and all the plugins are local, the steps 2-4 are made file by file
+        and the results are kept on the disk; the next time, only the changed files are
+        read and transformed again (see latexparser.IncrementalBuild).
         """
+        if incremental :
+            if self.is_local():
+                from latexparser.IncrementalBuild import IncrementalBuild
+                self.codeLaTeX = IncrementalBuild(self,tag).build(self.codeLaTeX)
+                FileTracking().save()
+                return
+            print("Incremental build : some plugins are not local or have no version; the document is built as usual.")
         self.codeLaTeX = self.codeLaTeX.substitute_all_inputs()
         self.apply_all_plugins()
         self.apply_all_code_box(tag)
@@ -265,44 +425,204 @@ class CodeFactory(object):
     def save(self,filename):
         self.codeLaTeX.save(filename)
 
+# The files are hashed by pieces of this size.
+hash_chunk_size = 1024*1024
+
 def FileToSha1sum(f):
-    text = str(open(f).read())
-    return hashlib.sha1(text).hexdigest()
+    """
+    Return the sha1sum of the content of the file 'f', read by pieces.
+    """
+    import hashlib
+    digest = hashlib.sha1()
+    with open(f,"rb") as binary :
+        while True :
+            chunk = binary.read(hash_chunk_size)
+            if not chunk :
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def FileStat(f):
+    """
+    Return the tuple (mtime_ns,size) of the file 'f', or None if it does not exist.
+    """
+    try :
+        stat = os.stat(f)
+    except OSError :
+        return None
+    return stat.st_mtime_ns,stat.st_size
+
+# The lines of a .aux file read by bibtex.
+bibtex_aux_lines = (b"\\citation",b"\\bibdata",b"\\bibstyle")
+
+def AuxContents(f,seen=None):
+    r"""
+    Return the list of the contents (bytes) of the .aux file 'f' and of the .aux files
+    it includes (\@input{chapter.aux}, written by \include), recursively, in the order
+    in which they are read. Return None if 'f' does not exist; an included file which
+    does not exist is ignored.
+    """
+    import re
+    if seen is None :
+        seen = set()
+    seen.add(os.path.abspath(f))
+    try :
+        with open(f,"rb") as binary :
+            content = binary.read()
+    except IOError :
+        return None
+    contents = [content]
+    if b"\\@input" in content :
+        for name in re.findall(rb"\\@input\{([^}]*)\}",content):
+            included = os.path.join(os.path.dirname(f),name.decode("utf8","replace"))
+            if os.path.abspath(included) not in seen :
+                contents.extend(AuxContents(included,seen) or [])
+    return contents
+
+def AuxSha1sum(f):
+    """
+    Return the sha1sum of the .aux file 'f' and of the ones it includes, or None
+    if the file does not exist.
+    """
+    import hashlib
+    contents = AuxContents(f)
+    if contents is None :
+        return None
+    digest = hashlib.sha1()
+    for content in contents :
+        digest.update(hashlib.sha1(content).digest())
+    return digest.hexdigest()
+
+def BibtexInputSha1sum(f):
+    r"""
+    Return the sha1sum of the lines read by bibtex in the .aux file 'f' and in the
+    ones it includes (\@input), or None if the file does not exist.
+    """
+    import hashlib
+    contents = AuxContents(f)
+    if contents is None :
+        return None
+    lines = [line for content in contents for line in content.splitlines() if line.startswith(bibtex_aux_lines)]
+    return hashlib.sha1(b"\n".join(lines)).hexdigest()
 
 class FileTracking(object):
+    """
+    Say which files changed since the last time they were followed.
+
+    For each file, the tuple (mtime_ns,size,sha1sum) is recorded in 'json_filename'.
+    A file whose modification time and size did not change is not read again; the
+    other ones are hashed in parallel.
+
+    The state is common to all the instances (class attributes) :
+    - old_sha, old_stat : the sha1sums and the tuples (mtime_ns,size) recorded by the last save,
+    - sha, stat : the same, including the files followed since then.
+    It is read from the current directory when the first instance is created, not at import.
+    The files which were followed in the former 'xml_filename' (pytextools.xml) are
+    read from there if 'json_filename' does not exist; the next save writes 'json_filename'.
+    """
     ELEMENT_FOLLOWED_FILES = "Followed_files"
     TAG_FICHIER="fichier"
     xml_filename = "pytextools.xml"
+    json_filename = "pytextools.json"
+    # A file modified less than this time (in nanoseconds) before its modification time
+    # is recorded could be modified again with the same time and size : it will be hashed.
+    racy_delay = 2*10**9
+    workers = 8
     old_sha={}
-    try :
-        root = minidom.parse(xml_filename)
-        fileNodes = root.getElementsByTagName(ELEMENT_FOLLOWED_FILES)
-        for fileNode in fileNodes: 
-            for fich in fileNode.getElementsByTagName(TAG_FICHIER):
-                old_sha[fich.getAttribute("name")]=fich.getAttribute("sha1sum")
-    except :
-        print("XML file is probably empty.")
+    old_stat={}
     sha={}
-    for k in old_sha.keys():
-        sha[k]=old_sha[k]
-    def _is_file_changed(self,filename):
-        sha_now="XXX"
+    stat={}
+    loaded = False
+    def __init__(self):
+        if not FileTracking.loaded :
+            FileTracking.load()
+    @classmethod
+    def load(cls):
+        import json
+        old_sha = {}
+        old_stat = {}
         try :
-            sha_now = FileToSha1sum(filename)
-        except IOError :
-            pass
-        FileTracking.sha[filename]=sha_now
-        if filename not in FileTracking.old_sha.keys() :
-            return True
-        return not sha_now == FileTracking.old_sha[filename]
+            with open(cls.json_filename,"r") as f :
+                files = json.load(f)["files"]
+            for name,(mtime_ns,size,digest) in files.items():
+                old_sha[name] = digest
+                if mtime_ns is not None :
+                    old_stat[name] = (mtime_ns,size)
+        except (IOError,OSError,ValueError,KeyError) :
+            old_sha = cls.load_xml()
+        cls.old_sha = old_sha
+        cls.old_stat = old_stat
+        cls.sha = dict(old_sha)
+        cls.stat = dict(old_stat)
+        cls.loaded = True
+    @classmethod
+    def load_xml(cls):
+        old_sha = {}
+        if not os.path.exists(cls.xml_filename):
+            return old_sha
+        from xml.dom import minidom
+        try :
+            root = minidom.parse(cls.xml_filename)
+            fileNodes = root.getElementsByTagName(cls.ELEMENT_FOLLOWED_FILES)
+            for fileNode in fileNodes: 
+                for fich in fileNode.getElementsByTagName(cls.TAG_FICHIER):
+                    old_sha[fich.getAttribute("name")]=fich.getAttribute("sha1sum")
+        except Exception :
+            print("XML file is probably empty.")
+        return old_sha
+    @classmethod
+    def record(cls,filename,digest,stat=None):
+        """
+        Record the sha1sum of 'filename' (and its (mtime_ns,size) if it is known).
+        """
+        if not cls.loaded :
+            cls.load()
+        cls.sha[filename] = digest
+        if stat is None or time.time_ns()-stat[0] < cls.racy_delay :
+            cls.stat.pop(filename,None)
+        else :
+            cls.stat[filename] = stat
+    def current_sha(self,filenames):
+        """
+        Return the list of the sha1sums of the files (and record them). The files
+        whose time and size are the recorded ones are not read; the other ones are
+        hashed in parallel.
+        """
+        stats = [FileStat(f) for f in filenames]
+        digests = [None]*len(filenames)
+        to_hash = []
+        for k,(f,stat) in enumerate(zip(filenames,stats)) :
+            if stat is None :
+                digests[k] = "XXX"
+            elif FileTracking.stat.get(f) == stat and f in FileTracking.sha :
+                digests[k] = FileTracking.sha[f]
+            else :
+                to_hash.append(k)
+        if len(to_hash) > 1 :
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=min(self.workers,len(to_hash))) as executor :
+                hashed = list(executor.map(SafeFileToSha1sum,[filenames[k] for k in to_hash]))
+        else :
+            hashed = [SafeFileToSha1sum(filenames[k]) for k in to_hash]
+        for k,digest in zip(to_hash,hashed) :
+            digests[k] = digest
+        for f,stat,digest in zip(filenames,stats,digests):
+            FileTracking.record(f,digest,stat if digest != "XXX" else None)
+        return digests
+    def _is_file_changed(self,filename):
+        return self.is_file_changed(filenames=[filename])
     def is_file_changed(self,filename=None,filenames=None):
         if filename :
-            return self._is_file_changed(filename)
+            filenames = [filename]
         if filenames :
-            boos = [self._is_file_changed(f) for f in filenames]
-            return True in boos
+            changed = False
+            for f,sha_now in zip(filenames,self.current_sha(filenames)) :
+                if f not in FileTracking.old_sha or sha_now != FileTracking.old_sha[f] :
+                    changed = True
+            return changed
     def xml(self):
-        """Return the xml code to be written in pytextools.xml"""
+        """Return the xml code of the former file pytextools.xml"""
+        from xml.dom import minidom
         followed_files_xml = minidom.Document()
         the_sha = followed_files_xml.createElement(FileTracking.ELEMENT_FOLLOWED_FILES)
         for f in FileTracking.sha.keys():
@@ -312,6 +632,14 @@ class FileTracking(object):
             the_sha.appendChild(xml)
         followed_files_xml.appendChild(the_sha)
         return followed_files_xml.toprettyxml()
+    def json(self):
+        """Return the content of the file 'json_filename'"""
+        import json
+        files = {}
+        for f,digest in FileTracking.sha.items():
+            mtime_ns,size = FileTracking.stat.get(f,(None,None))
+            files[f] = [mtime_ns,size,digest]
+        return json.dumps({"files":files},separators=(",",":"))
     def save(self,medicament=None):
         # The medicament optional argument is in order to avoid to save if --no-compilation if passed to pytex. In that case, the changes are not taken into account,
         # and thus the last "used" sha1sum is the one which is still in the file.
@@ -320,12 +648,35 @@ class FileTracking(object):
             if medicament.Sortie.nocompilation :
                 faire = False
         if faire :
-            open(FileTracking.xml_filename,"w").write(self.xml())
+            from latexparser.FileLoader import WriteFileAtomically
+            WriteFileAtomically(FileTracking.json_filename,self.json())
+
+def SafeFileToSha1sum(f):
+    """
+    Same as FileToSha1sum, but return "XXX" if the file cannot be read (as FileTracking records it).
+    """
+    try :
+        return FileToSha1sum(f)
+    except IOError :
+        return "XXX"
 
 class Plugin(object):
-    def __init__(self,fun,hook_name):
+    r"""
+    A function text -> text applied by CodeFactory.apply_all.
+
+    A plugin is 'local' when applying it to a text gives the same as applying it to the
+    pieces of the text between the \input and putting them together. Only in that
+    case CodeFactory.apply_all can work file by file (see latexparser.IncrementalBuild).
+
+    The incremental build cannot see the changes of 'fun' : a local plugin has to be
+    given a 'version', to be changed when the plugin changes. A plugin without version
+    is not local.
+    """
+    def __init__(self,fun,hook_name,local=False,version=None):
         self.fun=fun
         self.hook_name=hook_name
+        self.local=local
+        self.version=version
     def __call__(self,A):
         return self.fun(A)
 
@@ -352,8 +703,8 @@ class Request(object):
         for plug in self.prerequiste_list:
             plug(arg)
         self.fileTracking.save()
-    def add_plugin(self,fun,hook_name):
-        self.plugin_list.append(Plugin(fun,hook_name))
+    def add_plugin(self,fun,hook_name,local=False,version=None):
+        self.plugin_list.append(Plugin(fun,hook_name,local,version))
 
 class Array(object):
     def __init__(self,dic):
@@ -0,0 +1,206 @@
+# -*- coding: utf8 -*-
+
+###########################################################################
+#   This is the package latexparser
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+###########################################################################
+
+# copyright (c) Laurent Claessens, 2017
+# email: laurent@claessens-donadello.eu
+
+"""
+A rope : a text made of pieces of other texts, organized in a binary tree.
+
+The pieces are never copied : a leaf only says "the characters 'start' to 'end'
+of this buffer". Replacing a span is then some splits and concatenations
+of the tree, that is O(log n), and the flat string is only built when
+somebody asks for it.
+
+The ropes are never modified : the edits return new ropes which share
+their subtrees with the old one.
+"""
+
+import math
+
+class RopeLeaf(object):
+    def __init__(self,buffer,start,end):
+        self.buffer = buffer
+        self.start = start
+        self.end = end
+        self.length = end-start
+        self.depth = 0
+        self.leaves = 1
+
+class RopeNode(object):
+    def __init__(self,left,right):
+        self.left = left
+        self.right = right
+        self.length = left.length+right.length
+        self.depth = max(left.depth,right.depth)+1
+        self.leaves = left.leaves+right.leaves
+
+def concat(left,right):
+    if left is None or left.length == 0 :
+        return right
+    if right is None or right.length == 0 :
+        return left
+    return RopeNode(left,right)
+
+def split(node,position):
+    """
+    Return the tuple (left,right) of the trees of the text before and after 'position'.
+    """
+    if node is None :
+        return None,None
+    if position <= 0 :
+        return None,node
+    if position >= node.length :
+        return node,None
+    if isinstance(node,RopeLeaf):
+        cut = node.start+position
+        return RopeLeaf(node.buffer,node.start,cut),RopeLeaf(node.buffer,cut,node.end)
+    if position < node.left.length :
+        left,right = split(node.left,position)
+        return left,concat(right,node.right)
+    left,right = split(node.right,position-node.left.length)
+    return concat(node.left,left),right
+
+def iter_leaves(node):
+    stack = [node] if node is not None else []
+    while stack :
+        node = stack.pop()
+        if isinstance(node,RopeLeaf):
+            yield node
+        else :
+            stack.append(node.right)
+            stack.append(node.left)
+
+def iter_leaves_backward(node):
+    stack = [node] if node is not None else []
+    while stack :
+        node = stack.pop()
+        if isinstance(node,RopeLeaf):
+            yield node
+        else :
+            stack.append(node.left)
+            stack.append(node.right)
+
+def balanced(leaves):
+    """
+    Return a balanced tree whose leaves are the given ones (in that order).
+    """
+    if leaves == [] :
+        return None
+    level = list(leaves)
+    while len(level) > 1 :
+        level = [concat(level[i],level[i+1]) if i+1 < len(level) else level[i] for i in range(0,len(level),2)]
+    return level[0]
+
+class Rope(object):
+    """
+    Contains a text as a tree of pieces of buffers.
+
+    Rope(text) is the rope of a string.
+    str(rope) is the flat string.
+    """
+    def __init__(self,text="",root=None):
+        if root is None and text :
+            root = RopeLeaf(text,0,len(text))
+        if root is not None and root.depth > 2*math.log(root.leaves+1,2)+8 :
+            root = balanced(list(iter_leaves(root)))
+        self.root = root
+    def __len__(self):
+        if self.root is None :
+            return 0
+        return self.root.length
+    def chunks(self):
+        """
+        Iterate over the pieces of text, in order. Nothing is concatenated.
+        """
+        for leaf in iter_leaves(self.root):
+            if leaf.start == 0 and leaf.end == len(leaf.buffer):
+                yield leaf.buffer
+            else :
+                yield leaf.buffer[leaf.start:leaf.end]
+    def __str__(self):
+        return "".join(self.chunks())
+    def slice(self,start,end):
+        """
+        Return the sub-rope from 'start' to 'end'.
+        """
+        left,right = split(self.root,end)
+        left,middle = split(left,start)
+        return Rope(root=middle)
+    def __getitem__(self,key):
+        """
+        Only slices with positive step 1 : rope[a:b] is the string of the characters from a to b.
+        """
+        start,end,step = key.indices(len(self))
+        return str(self.slice(start,end))
+    def __add__(self,other):
+        if not isinstance(other,Rope):
+            other = Rope(other)
+        return Rope(root=concat(self.root,other.root))
+    def apply_edits(self,edits):
+        """
+        Return a new rope in which the spans are replaced.
+
+        'edits' is a sorted list of non overlapping tuples (start,end,replacement),
+        as for LatexCode.apply_edits. The replacement can be a string or a Rope.
+        """
+        pieces = []
+        turtle = 0
+        for start,end,replacement in edits :
+            pieces.append(self.slice(turtle,start).root)
+            if not isinstance(replacement,Rope):
+                replacement = Rope(replacement)
+            pieces.append(replacement.root)
+            turtle = end
+        pieces.append(self.slice(turtle,len(self)).root)
+        return Rope(root=balanced([piece for piece in pieces if piece is not None]))
+    def find(self,sub,start=0):
+        """
+        Same as str.find, walking along the pieces from 'start'.
+        """
+        rest = self.slice(start,len(self))
+        offset = start
+        tail = ""     # the end of the previous chunk, for the matches across two chunks
+        for chunk in rest.chunks():
+            window = tail+chunk
+            found = window.find(sub)
+            if found != -1 :
+                return offset-len(tail)+found
+            offset = offset+len(chunk)
+            tail = window[len(window)-len(sub)+1:] if len(sub) > 1 else ""
+        return -1
+    def rfind(self,sub,start,end):
+        """
+        Same as str.rfind, walking backward along the pieces from 'end'.
+        """
+        offset = end
+        head = ""
+        for leaf in iter_leaves_backward(self.slice(start,end).root):
+            chunk = leaf.buffer[leaf.start:leaf.end]
+            offset = offset-len(chunk)
+            window = chunk+head
+            found = window.rfind(sub)
+            if found != -1 :
+                return offset+found
+            head = window[:len(sub)-1]
+        return -1
+    def __contains__(self,sub):
+        return self.find(sub) != -1
+    def endswith(self,suffix):
+        return self[max(0,len(self)-len(suffix)):len(self)] == suffix
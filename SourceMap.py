@@ -0,0 +1,196 @@
+# -*- coding: utf8 -*-
+
+###########################################################################
+#   This is the package latexparser
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+###########################################################################
+
+# copyright (c) Laurent Claessens, 2017
+# email: laurent@claessens-donadello.eu
+
+"""
+Keep track of the origin (file, line, column) of each position of a LaTeX code.
+
+After the substitution of the \input, the removing of the comments and the
+replacements, a position in LatexCode.text_brut has to be related to a position
+in one of the original files. This is what the SourceMap does.
+"""
+
+from array import array
+from bisect import bisect_right
+
+class SourceFile(object):
+    """
+    A file from which some text comes.
+
+    'text' is the content of the file as read, before any change (comments included).
+    The positions of the beginnings of the lines are computed when needed.
+    """
+    def __init__(self,filename,text):
+        self.filename = filename
+        self.text = text
+        self._line_starts = None
+    def line_and_column(self,position):
+        """
+        Return the tuple (line,column) of the given position. Both are counted from 1.
+        """
+        if self._line_starts is None :
+            starts = array("q",[0])
+            position_nl = self.text.find("\n")
+            while position_nl != -1 :
+                starts.append(position_nl+1)
+                position_nl = self.text.find("\n",position_nl+1)
+            self._line_starts = starts
+        line = bisect_right(self._line_starts,position)
+        return line,position-self._line_starts[line-1]+1
+
+class SourceMap(object):
+    r"""
+    The map from the positions of a text to their origins.
+
+    The text is cut into intervals. The i-th interval begins at self.flat_offsets[i]
+    and ends where the next one begins (the last one ends at self.length).
+    Its origin is the file self.files[self.file_ids[i]] from position
+    self.original_offsets[i].
+
+    If self.exact[i] is 1, the position p of the interval comes from the position
+    self.original_offsets[i]+(p-self.flat_offsets[i]) of the file.
+    If it is 0, the interval was created by a replacement (a \Put... of a CodeBox
+    for example); all its positions are related to the position self.original_offsets[i]
+    of the file, which is the place of the replaced text.
+
+    A file_id -1 means that the origin is not known.
+    """
+    def __init__(self,length=0,source_file=None):
+        self.length = length
+        self.files = []
+        self._file_ids = {}
+        self.flat_offsets = array("q")
+        self.file_ids = array("l")
+        self.original_offsets = array("q")
+        self.exact = bytearray()
+        if length > 0 :
+            self.append(0,self.file_id(source_file),0,1)
+    def file_id(self,source_file):
+        if source_file is None :
+            return -1
+        key = id(source_file)
+        if key not in self._file_ids :
+            self._file_ids[key] = len(self.files)
+            self.files.append(source_file)
+        return self._file_ids[key]
+    def append(self,flat,file_id,original,exact):
+        """
+        Add an interval beginning at 'flat'. Merge it with the previous one when it
+        is its continuation.
+        """
+        n = len(self.flat_offsets)
+        if n > 0 :
+            if self.flat_offsets[n-1] == flat :
+                # The previous interval is empty.
+                self.file_ids[n-1] = file_id
+                self.original_offsets[n-1] = original
+                self.exact[n-1] = exact
+                return
+            if exact and self.exact[n-1] and self.file_ids[n-1] == file_id :
+                if self.original_offsets[n-1]+(flat-self.flat_offsets[n-1]) == original :
+                    return
+        self.flat_offsets.append(flat)
+        self.file_ids.append(file_id)
+        self.original_offsets.append(original)
+        self.exact.append(exact)
+    def interval(self,position):
+        return bisect_right(self.flat_offsets,position)-1
+    def origin(self,position):
+        """
+        Return the tuple (source_file,original_position) of the given position.
+        source_file is None if the origin is not known.
+        """
+        k = self.interval(position)
+        if k < 0 or self.file_ids[k] == -1 :
+            return None,None
+        original = self.original_offsets[k]
+        if self.exact[k] :
+            original = original+position-self.flat_offsets[k]
+        return self.files[self.file_ids[k]],original
+    def locate(self,position):
+        """
+        Return the tuple (filename,line,column) from which the given position comes.
+        Line and column are counted from 1. Return (None,None,None) if the origin is not known.
+        """
+        source_file,original = self.origin(position)
+        if source_file is None :
+            return None,None,None
+        line,column = source_file.line_and_column(original)
+        return source_file.filename,line,column
+    def copy_range(self,other,start,end,destination):
+        """
+        Add to self the intervals of 'other' between the positions 'start' and 'end',
+        moved to begin at 'destination'.
+        """
+        if start >= end :
+            return
+        k = max(other.interval(start),0)
+        n = len(other.flat_offsets)
+        while k < n and other.flat_offsets[k] < end :
+            begin = max(other.flat_offsets[k],start)
+            original = other.original_offsets[k]
+            if other.exact[k] :
+                original = original+begin-other.flat_offsets[k]
+            file_id = other.file_ids[k]
+            if file_id != -1 :
+                file_id = self.file_id(other.files[file_id])
+            self.append(destination+begin-start,file_id,original,other.exact[k])
+            k = k+1
+    def apply_edits(self,edits,new_length):
+        """
+        Return the map of the text obtained by applying the edits.
+
+        'edits' is the sorted list of LatexCode.apply_edits. When an edit has a
+        fourth element, this is the SourceMap of its replacement. Otherwise the replacement
+        is related to the place of the replaced text.
+        """
+        new = SourceMap(new_length)
+        turtle = 0
+        position = 0
+        for edit in edits :
+            start,end,replacement = edit[0],edit[1],edit[2]
+            new.copy_range(self,turtle,start,position)
+            position = position+start-turtle
+            if len(replacement) > 0 :
+                if len(edit) > 3 and edit[3] is not None :
+                    new.copy_range(edit[3],0,len(replacement),position)
+                else :
+                    source_file,original = self.origin(min(start,self.length-1))
+                    new.append(position,new.file_id(source_file),original if original is not None else 0,0)
+            position = position+len(replacement)
+            turtle = end
+        new.copy_range(self,turtle,self.length,position)
+        return new
+    def compose(self,segments,new_length):
+        """
+        Return the map of a text made of the given pieces of the text of self.
+
+        'segments' is the list of tuples (start,end) of the pieces, in order
+        (as given by RemoveComments).
+        """
+        new = SourceMap(new_length)
+        position = 0
+        for start,end in segments :
+            new.copy_range(self,start,end,position)
+            position = position+end-start
+        return new
+    def __len__(self):
+        return len(self.flat_offsets)
@@ -0,0 +1,124 @@
+# -*- coding: utf8 -*-
+
+###########################################################################
+#   This is the package latexparser
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+###########################################################################
+
+# copyright (c) Laurent Claessens, 2017
+# email: laurent@claessens-donadello.eu
+
+"""
+Cut a LaTeX code into a stream of tokens.
+
+Only the tokens that are interesting for the parser are recorded :
+control sequences, braces, brackets, the comment sign and the whitespaces.
+The text between them is not recorded; it is still available through
+the positions.
+"""
+
+import re
+from array import array
+from bisect import bisect_left
+
+MACRO = "\\"
+OPEN_BRACE = "{"
+CLOSE_BRACE = "}"
+OPEN_BRACKET = "["
+CLOSE_BRACKET = "]"
+COMMENT = "%"
+SPACE = " "
+
+# A control sequence is a backslash followed by letters (and @) or by
+# exactly one other character. Notice that \% and \{ are control sequences,
+# so that the comment and brace tokens are never escaped.
+token_pattern = re.compile(r"\\(?:[A-Za-z@]+|.)|[{}\[\]%]|\s+",re.DOTALL)
+
+class TokenStream(object):
+    """
+    The tokens of a text, in the order of appearance.
+
+    The i-th token has kind 'self.kinds[i]' (one of the constants of this module)
+    and is the substring 'self.text[self.starts[i]:self.ends[i]]'.
+
+    The kinds are stored in a string and the positions in arrays, so that a stream
+    of some millions of tokens remains reasonable in memory.
+    """
+    def __init__(self,text):
+        self.text = text
+        kinds = []
+        starts = array("l")
+        ends = array("l")
+        macro_tokens = array("l")
+        comments = array("l")
+        for num,match in enumerate(token_pattern.finditer(text)):
+            start,end = match.span()
+            kind = text[start]
+            if kind.isspace() :
+                kind = SPACE
+            elif kind == MACRO :
+                macro_tokens.append(num)
+            elif kind == COMMENT :
+                comments.append(start)
+            kinds.append(kind)
+            starts.append(start)
+            ends.append(end)
+        self.kinds = "".join(kinds)
+        self.starts = starts
+        self.ends = ends
+        self.macro_tokens = macro_tokens    # indices (in the stream) of the control sequences
+        self.comments = comments            # positions (in the text) of the comment signs
+    def __len__(self):
+        return len(self.kinds)
+    def token(self,num):
+        """
+        Return the tuple (kind,start,end) of the token number 'num'.
+        """
+        return self.kinds[num],self.starts[num],self.ends[num]
+    def token_text(self,num):
+        return self.text[self.starts[num]:self.ends[num]]
+    def macro_names(self):
+        """
+        Iterate over the tuples (name,position) of the control sequences.
+        """
+        text = self.text
+        starts = self.starts
+        ends = self.ends
+        for num in self.macro_tokens :
+            yield text[starts[num]:ends[num]],starts[num]
+    def macro_positions(self,macro_name):
+        """
+        Return the list of the positions at which the control sequence 'macro_name' appears.
+
+        'macro_name' has to contain the initial backslash.
+        """
+        return [position for name,position in self.macro_names() if name == macro_name]
+    def is_in_comment(self,position):
+        """
+        Say if the given position is after a comment sign on the same line.
+        """
+        return IsInComment(self.text,self.comments,position)
+
+def IsInComment(text,comments,position):
+    """
+    Say if the given position of 'text' is after a comment sign on the same line.
+
+    'comments' is the sorted list of the positions of the comment signs (see TokenStream.comments).
+    """
+    k = bisect_left(comments,position)
+    if k == 0 :
+        return False
+    percent = comments[k-1]
+    return text.find("\n",percent,position) == -1
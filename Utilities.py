@@ -34,37 +34,95 @@ def testtype(s):
 def dprint(*s):
     print(s)
 
-def RemoveComments(text):
+# The number of times RemoveComments was called. Useful to know how much
+# a pipeline of pre-compilation scripts costs.
+strip_passes = 0
+
+def number_of_strip_passes():
+    """
+    Return the number of comment stripping passes made since the beginning (or since the last reset_strip_passes).
+    """
+    return strip_passes
+
+def reset_strip_passes():
+    global strip_passes
+    strip_passes = 0
+
+# A comment sign which is followed by something on its line.
+comment_content = re.compile(r"(?:^|[^\\])%[^\n]",re.MULTILINE)
+
+def IsWithoutComments(text):
+    r"""
+    Say if 'text' is already as RemoveComments would return it : no character
+    after a comment sign on the same line, and nothing after \end{document}.
+    """
+    if comment_content.search(text):
+        return False
+    end_document = text.find("\\end{document}")
+    if end_document != -1 and end_document+len("\\end{document}") != len(text):
+        return False
+    return True
+
+end_document = "\\end{document}"
+
+def NextComment(text,start=0,end=None):
+    r"""
+    Return the position of the first comment sign in text[start:end], that is
+    the first % which is not preceded by \. Return -1 if there are none.
+    """
+    if end is None :
+        end = len(text)
+    position = text.find("%",start,end)
+    while position > 0 and text[position-1] == "\\" :
+        position = text.find("%",position+1,end)
+    return position
+
+def FindEndDocument(text,start=0):
+    r"""
+    Return the position just after the first \end{document} of 'text' (searching from 'start')
+    which is not in a comment. Return -1 if there are none.
+    """
+    position = text.find(end_document,start)
+    while position != -1 :
+        line_start = text.rfind("\n",0,position)+1
+        if NextComment(text,line_start,position) == -1 :
+            return position+len(end_document)
+        position = text.find(end_document,position+1)
+    return -1
+
+def RemoveComments(text,segments=None):
     """
     Takes text as a tex source file and remove the comments including what stands after \end{document}
     Input : string
     Output : string
+
+    If 'segments' is a list, the tuples (start,end) of the pieces of 'text' which are kept
+    are appended to it (this is what the SourceMap needs).
     """
-    line_withoutPC = []
-    # we remove the end of lines with % if not preceded by \
-    pattern = "[^\\\]%"
-    search=re.compile(pattern).search
-    # This search only matches the % that are preceded by something else than \.
-    # This does not match the % at the beginning of the line. This is why a second test is performed.
-    for lineC in text.split("\n"):
-        s=search(lineC)
-
-        if s :
-            ligne=s.string[:s.start()+2]    # We keep the "%" itself.
-        else :             
-            ligne=lineC
-
-        # % at the beginning of a line is not matched by the regex.
-        if ligne.startswith("%"):
-            ligne="%"
-
-        line_withoutPC.append(ligne)
-    code_withoutPC = "\n".join(line_withoutPC)
-
-    # Now we remove what is after \end{document}
-
-    final_code=code_withoutPC
-    if "\end{document}" in code_withoutPC :
-        final_code = code_withoutPC.split("\end{document}")[0]+"\end{document}"
-    return final_code
+    global strip_passes
+    strip_passes = strip_passes+1
+
+    # First we cut what is after \end{document}, so that we do not
+    # work on it.
+    end = FindEndDocument(text)
+    if end != -1 :
+        text = text[:end]
 
+    # Then we jump from comment sign to comment sign in the whole text.
+    # We keep the "%" itself and remove the rest of its line.
+    pieces = []
+    turtle = 0
+    position = NextComment(text)
+    while position != -1 :
+        pieces.append(text[turtle:position+1])
+        if segments is not None :
+            segments.append((turtle,position+1))
+        turtle = text.find("\n",position)
+        if turtle == -1 :
+            turtle = len(text)
+            break
+        position = NextComment(text,turtle)
+    pieces.append(text[turtle:])
+    if segments is not None :
+        segments.append((turtle,len(text)))
+    return "".join(pieces)
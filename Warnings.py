@@ -22,33 +22,43 @@
 
 
 class LaTeXWarning(object):
+    """
+    A warning about a label. The lines where the label is used are shown with it.
+
+    'report' takes a LabelIndex (see latexparser.LabelIndex), which can be shared by all
+    the warnings of a log file; without it, the files are read for this warning only.
+    """
+    # The kinds of locations (see LabelIndex) shown with the warning.
+    located_kinds = ["ref","label"]
     def __init__(self,label,page):
         self.label = label
         self.page = page
-    def grep_result(self):
-        import subprocess
-        a=[]
-        command_e="grep --color=always -n \\\\ref{"+self.label+"} *.tex"
-        a.append(subprocess.getoutput(command_e))
-        command_e="grep --color=always -n \\label{"+self.label+"} *.tex"
-        a.append(subprocess.getoutput(command_e))
-        return "\n".join(a)
+    def grep_result(self,index=None):
+        if index is None :
+            from latexparser.LabelIndex import LabelIndex
+            index = LabelIndex()
+        return "\n".join(index.grep(kind,self.label) for kind in self.located_kinds)
+    def report(self,index=None):
+        return self.title()+"\n"+self.grep_result(index)
+    def __str__(self):
+        return self.report()
 
 class ReferenceWarning(LaTeXWarning):
     def __init__(self,label,page):
         LaTeXWarning.__init__(self,label,page)
-    def __str__(self):
-        return "\033[35;33m------ Undefined reference \033[35;37m {0} \033[35;33m à la page\033[35;33m {1} \033[35;33m------".format(self.label,self.page)+"\n"+self.grep_result()#+"\n"
+    def title(self):
+        return "\033[35;33m------ Undefined reference \033[35;37m {0} \033[35;33m à la page\033[35;33m {1} \033[35;33m------".format(self.label,self.page)
 class CitationWarning(LaTeXWarning):
+    located_kinds = ["cite"]
     def __init__(self,label,page):
         LaTeXWarning.__init__(self,label,page)
-    def __str__(self):
-        return "\033[35;33m------ Undefined citation \033[35;37m %s \033[35;33m à la page\033[35;33m %s \033[35;33m------"%(self.label,str(self.page))+"\n"+self.grep_result()#+"\n"
+    def title(self):
+        return "\033[35;33m------ Undefined citation \033[35;37m %s \033[35;33m à la page\033[35;33m %s \033[35;33m------"%(self.label,str(self.page))
 class MultiplyLabelWarning(LaTeXWarning):
     def __init__(self,label,page):
         LaTeXWarning.__init__(self,label,page)
-    def __str__(self):
-        return "\033[35;33m------ \033[35;33m Multiply defined label \033[35;33m %s --------- "%self.label+"\n"+self.grep_result()#+"\n"
+    def title(self):
+        return "\033[35;33m------ \033[35;33m Multiply defined label \033[35;33m %s --------- "%self.label
 class TeXCapacityExceededWarning(object):
     def __init__(self,text):
         self.text=text
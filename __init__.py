@@ -28,10 +28,11 @@ import os
 import re
 import codecs
 
-definition_commands = [ "\\newcommand","\\renewcommand" ]   # In the method dict_of_definition_macros, I hard-code the fact that 
-                                # these definition commands have 3 arguments.
+definition_commands = [ "\\newcommand","\\renewcommand" ]   # In Occurrence_newcommand, I hard-code the fact that 
+                                # these definition commands have the form \newcommand{\Foo}[n]{definition}
 def FileToCodeBibtex(name):
     """ return a codeBibtex from a file """
+    from latexparser.all import FileToText
     content = FileToText(name)
     return CodeBibtex(content,filename=name)
 
@@ -63,9 +64,10 @@ class StatisticsOfTheMacro(object):
         self.occurrences = SearchUseOfMacro(code,name)
         self.number_of_use = len(self.occurrences)
 
-class newlabelNotFound(object):
+class newlabelNotFound(Exception):
     """Exception class for LatexCode.get_newlabel_value"""
     def __init__(self,label_name):
+        Exception.__init__(self,label_name)
         self.label_name = label_name
 
 def CreateBibtexFile(big_bibtex_file,small_bibtex_file,list_of_files):
@@ -78,10 +80,15 @@ def CreateBibtexFile(big_bibtex_file,small_bibtex_file,list_of_files):
 
     A warning is written if 
     - an entry in small_bibtex_file is not used in the list_of_files.
+
+    Only the positions of the entries of big_bibtex_file are read (see latexparser.BibtexIndex);
+    the cited entries are the only ones to be decoded.
     """
+    from latexparser.LogCode import ListOfCitation
+    from latexparser.BibtexIndex import FileToBibtexIndex
     list_of_citations=ListOfCitation(list_of_files)
-    big_bibtex=FileToCodeBibtex(big_bibtex_file)
-    extracted_big=big_bibtex.extract_list(list_of_citations)
+    with FileToBibtexIndex(big_bibtex_file) as big_bibtex :
+        extracted_big=big_bibtex.extract_list(list_of_citations)
     small_bibtex=FileToCodeBibtex(small_bibtex_file)
     for label in small_bibtex.entry_dict.keys() :
         if label not in list_of_citations:
@@ -126,9 +133,12 @@ class CodeBibtex(object):
     def __init__(self,given_text,filename=None):
         self.filename=filename
         self.given_text="\n"+given_text         # Border effect because I search for entries by matching the string "\n@"
-        self.text_brut = ConvertToUTF8(RemoveComments(self.given_text))
+        from latexparser.Utilities import RemoveComments
+        from latexparser.Utilities import ensure_unicode
+        self.text_brut = ensure_unicode(RemoveComments(self.given_text))
         split_entry_list=self.text_brut.split("\n@")
-        self.entry_list=[ BibtexEntry("@"+text) for text in split_entry_list[1:] ]
+        # As in BibtexIndex, the ends of lines after an entry are not part of it.
+        self.entry_list=[ BibtexEntry("@"+text.rstrip("\r\n")) for text in split_entry_list[1:] ]
         dico={}
         for entry in self.entry_list :
             dico[entry.label]=entry
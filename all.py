@@ -21,42 +21,79 @@
 # email: laurent@claessens-donadello.eu
 
 import os.path
-import codecs
 
 from latexparser.LatexCode import LatexCode
+from latexparser.ParseCache import ContentToLatexCode
+from latexparser.Utilities import FindEndDocument
+from latexparser.Utilities import end_document
+from latexparser.FileLoader import LoadText
+from latexparser.FileLoader import LoadTextChunks
 
 def FileToLatexCode(name,fast=False,keep_comments=False):
-    """ return a codeLaTeX from a file """
-    content = FileToText(name)
-    A = LatexCode(content,filename=name,keep_comments=keep_comments)
+    """ return a codeLaTeX from a file 
+    
+    Unless the comments are kept, the file is read only up to \end{document}.
+    """
+    content = FileToText(name,stop_at_end_document=not keep_comments)
+    if keep_comments :
+        A = LatexCode(content,filename=name,keep_comments=keep_comments)
+    else :
+        A = ContentToLatexCode(content,filename=name)
     A.included_file_list=[name]
     return A
 
-def FileToText(name):
+def FileToText(name,stop_at_end_document=False):
     """ return the content of a file as string
     
     If the file do not exist, return empty string.
+
+    If 'stop_at_end_document' is True, the file is read by chunks and the reading stops
+    at the first \end{document} which is not in a comment. What follows is not returned.
     """
-    l=[]
     if not os.path.isfile(name):
         return ""
-    import codecs
-    for line in codecs.open(name,"r",encoding="utf8"):
-        l.append(line)
-    return "".join(l)
+    if stop_at_end_document :
+        return FileToTextUpToEndDocument(name)
+    return LoadText(name)
+
+def FileToTextUpToEndDocument(name,chunk_size=65536):
+    r"""
+    Return the content of the file up to the first \end{document} (included)
+    which is not in a comment. See FileToText.
+    """
+    chunks=[]
+    tail=""     # The end of the previous chunk, for an \end{document} across two chunks.
+    reader=LoadTextChunks(name,chunk_size)
+    try :
+        for chunk in reader :
+            chunks.append(chunk)
+            if end_document in tail+chunk :
+                text="".join(chunks)
+                end=FindEndDocument(text,max(0,len(text)-len(chunk)-len(tail)))
+                if end != -1 :
+                    return text[:end]
+                chunks=[text]
+            tail=(tail+chunk)[-len(end_document)+1:]
+    finally :
+        reader.close()
+    return "".join(chunks)
 
 def string_to_latex_code(s):
     from latexparser.LatexCode import LatexCode
     return LatexCode(s)
 
 def FileToLogCode(name,stop_on_first=False):
-    """ return a codeLog from a file """
-    try:
-        list_content = list(codecs.open(name,"r",encoding="utf8"))
-    # I've noticed that the log file was ISO-8859 English text
-    except UnicodeDecodeError : 
-        print("Problem with",name)
-        list_content = list(codecs.open(name,"r",encoding="iso8859-1"))
-    a="".join(list_content)
+    """ return a codeLog from a file 
+
+    The log file is decoded as ISO-8859 if it is not valid UTF-8.
+    """
+    content = LoadText(name,fallback="iso8859-1")
     from latexparser.LogCode import LogCode
-    return LogCode("".join(list_content),filename=name,stop_on_first=stop_on_first)
+    return LogCode(content,filename=name,stop_on_first=stop_on_first)
+
+def FileToAuxFile(name):
+    r"""
+    Return the AuxFile of a .aux file (see latexparser.AuxFile) : its \newlabel,
+    \bibcite and \@writefile, read once.
+    """
+    return FileToLatexCode(name).aux_file()
@@ -0,0 +1,127 @@
+#! /usr/bin/python3
+# -*- coding: utf8 -*-
+
+###########################################################################
+#   This is the package latexparser
+#
+#   This program is free software: you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation, either version 3 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License
+#   along with this program.  If not, see <http://www.gnu.org/licenses/>.
+###########################################################################
+
+# copyright (c) Laurent Claessens, 2017
+# email: laurent@claessens-donadello.eu
+
+"""
+Measure the time taken by 'import latexparser.PytexTools' (with python -X importtime).
+
+    python3 import_time.py [--budget MILLISECONDS] [--runs N] [--module NAME]
+
+The import is made in an empty temporary directory, several times; the best time is kept.
+The exit status is 1 if
+- the import takes more than the budget,
+- a module of 'deferred_modules' is imported,
+- FileTracking has read its file (it has to wait for its first use).
+"""
+
+import os
+import sys
+import ast
+import tempfile
+import argparse
+import subprocess
+
+# The modules that the import of latexparser.PytexTools must not import.
+deferred_modules = ["xml.dom.minidom","hashlib","json","subprocess","asyncio","concurrent.futures"]
+
+default_budget = 30     # milliseconds
+
+# What the imported module says after its import.
+report_code = """
+import sys
+import {module} as module
+tracking = getattr(module,"FileTracking",None)
+print("modules",[name for name in {deferred!r} if name in sys.modules])
+print("loaded",getattr(tracking,"loaded",False))
+"""
+
+def ImportTime(module,directory,environment):
+    """
+    Return the tuple (microseconds,imported_deferred_modules,loaded) of one import of 'module'.
+    """
+    code = report_code.format(module=module,deferred=deferred_modules)
+    process = subprocess.run([sys.executable,"-X","importtime","-c",code],cwd=directory,env=environment,
+                                stdout=subprocess.PIPE,stderr=subprocess.PIPE,universal_newlines=True,check=True)
+    microseconds = None
+    for line in process.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() == module :
+            microseconds = int(parts[1])
+    imported = []
+    loaded = False
+    for line in process.stdout.splitlines():
+        if line.startswith("modules "):
+            imported = ast.literal_eval(line[len("modules "):])
+        if line.startswith("loaded "):
+            loaded = line == "loaded True"
+    return microseconds,imported,loaded
+
+def MeasureImport(module,runs=5):
+    """
+    Return the tuple (milliseconds,imported_deferred_modules,loaded) of the
+    import of 'module' : the best time of 'runs' imports.
+
+    The package is imported through a link named 'latexparser' to the directory of
+    this file, so that the name of this directory does not matter.
+    """
+    package_directory = os.path.dirname(os.path.abspath(__file__))
+    environment = dict(os.environ)
+    # The bytecode is written by the first import, which is not measured.
+    environment.pop("PYTHONDONTWRITEBYTECODE",None)
+    with tempfile.TemporaryDirectory() as directory :
+        path = os.path.join(directory,"path")
+        os.mkdir(path)
+        os.symlink(package_directory,os.path.join(path,"latexparser"))
+        environment["PYTHONPATH"] = os.pathsep.join([path]+[p for p in [os.environ.get("PYTHONPATH")] if p])
+        work = os.path.join(directory,"work")
+        os.mkdir(work)
+        # A state file that FileTracking would read.
+        with open(os.path.join(work,"pytextools.json"),"w") as f :
+            f.write('{"files":{}}')
+        ImportTime(module,work,environment)
+        results = [ImportTime(module,work,environment) for run in range(runs)]
+    best = min(result[0] for result in results)/1000
+    return best,results[0][1],results[0][2]
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the import time of latexparser.")
+    parser.add_argument("--budget",type=float,default=default_budget,help="maximal import time in milliseconds")
+    parser.add_argument("--runs",type=int,default=5)
+    parser.add_argument("--module",default="latexparser.PytexTools")
+    arguments = parser.parse_args()
+
+    best,imported,loaded = MeasureImport(arguments.module,arguments.runs)
+    print("import %s : %.1f ms (budget %.1f ms)"%(arguments.module,best,arguments.budget))
+    ok = True
+    if best > arguments.budget :
+        print("The import takes more than the budget.")
+        ok = False
+    if imported :
+        print("These modules should not be imported : %s"%", ".join(imported))
+        ok = False
+    if loaded :
+        print("FileTracking read its file at import.")
+        ok = False
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__" :
+    main()
@@ -1,29 +1,1402 @@
-#! /usr/bin/python
+#! /usr/bin/python3
 # -*- coding: utf8 -*-
 
+"""
+The tests of latexparser.
+
+    python3 tests.py [test_name ...]
+
+The package has to be importable as 'latexparser' (for example with PYTHONPATH).
+The tests are the functions test_* of this file, run in their order; they read
+the files ess.tex, fichier.tex, ... of this directory.
+
+When a function has been rewritten, its results are compared with the ones
+of the former code on these files (written here as the expected values).
+"""
+
+import os
+import sys
+import time
+import traceback
+
 import latexparser
 import latexparser.PytexTools
-from xml.dom import minidom
+from latexparser.LatexCode import LatexCode
+from latexparser.all import FileToText
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+def fixture(name):
+    return os.path.join(here,name)
+
+def FixtureCode(name):
+    return LatexCode(FileToText(fixture(name)))
+
+def Summary(occurrences):
+    return [(o.position,o.arguments,o.as_written) for o in occurrences]
 
 def getText(nodelist):
-	rc = ""
-	for node in nodelist:
-		if node.nodeType == node.TEXT_NODE:
-			rc = rc + node.data
-	return rc
+    rc = ""
+    for node in nodelist:
+        if node.nodeType == node.TEXT_NODE:
+            rc = rc + node.data
+    return rc
 
 def xml_read():
-	dom = minidom.parse("magical_box.tex")
-	for box in dom.getElementsByTagName("CodeBox"):
-		print box.getAttribute("label")
-		text = getText(box.childNodes)
-		print "\n".join(text.split("\n")[1:-1])	# Because minidom adds an empty line at first and last position.
+    from xml.dom import minidom
+    dom = minidom.parse(fixture("magical_box.tex"))
+    for box in dom.getElementsByTagName("CodeBox"):
+        print(box.getAttribute("label"))
+        text = getText(box.childNodes)
+        print("\n".join(text.split("\n")[1:-1]))   # Because minidom adds an empty line at first and last position.
 
 def follow_the_file():
-	myRequest = latexparser.PytexTools.Request()
-	myRequest.follow_file("ess.py")
-	myRequest.follow_file("ess.aux")
-	myRequest.run_prerequistes("XXX")
+    myRequest = latexparser.PytexTools.Request()
+    myRequest.follow_file("ess.py")
+    myRequest.follow_file("ess.aux")
+    myRequest.run_prerequistes("XXX")
+
+#####################################
+# Search of the macros
+#####################################
+
+# The occurrences found in ess.tex by the former SearchUseOfMacro.
+ess_occurrences = {
+    ("\\MyMacro",2) : [(484,['foo','bar'],'\\MyMacro{foo}{bar}'),
+                       (524,['refoo, using a macro \n\t\\SecondMacro{klmk} and some text'],'\\MyMacro {refoo, using a macro \n\t\\SecondMacro{klmk} and some text}')],
+    ("\\label",1) : [(651,['SecUne'],'\\label{SecUne}'),(690,['Eqan'],'\\label{Eqan}'),
+                     (741,['Eqop'],'\\label{Eqop}'),(1008,['SecDeux'],'\\label{SecDeux}')],
+    ("\\ref",1) : [(1045,['SecDeux'],'\\ref{SecDeux}')],
+    ("\\eqref",1) : [(1098,['Eqan'],'\\eqref{Eqan}')],
+    ("\\input",1) : [(828,['fichier'],'\\input{fichier}'),(880,['autre_fichier'],'\\input{autre_fichier}'),
+                     (934,['fichier1'],'\\input{fichier1}')],
+    ("\\PutStatements",2) : [(1183,['article','calculs existence TN 3 : table'],'\\PutStatements{article}{calculs existence TN 3 : table}')],
+    ("\\section",1) : [(606,['This is the title of a section'],'\\section{This is the title of a section}'),
+                       (956,['This is the title of an other section'],'\\section{This is the title of an other section}')],
+    }
+
+def test_search_use_of_macro_ess():
+    code = FixtureCode("ess.tex")
+    for (name,number),expected in ess_occurrences.items():
+        found = Summary(code.search_use_of_macro(name,number))
+        assert found == expected,(name,found)
+    found = Summary(code.search_use_of_macro("\\usepackage",1))
+    assert len(found) == 12
+    assert found[5] == (136,['inputenc'],'\\usepackage[utf8]{inputenc}'),found[5]
+
+# The positions, the arguments and the text of the \ref found in this text.
+edge_text = "a\\ref{x} b \\ref {y}\n\n{z} \\ref\n%{c}\n{d} \\ref{a{b}c}% \\ref{hidden}\n\\ref{q}[w]{e}\\refoo{k} \\\\ref{r}\n\\newcommand{\\ref}[1]{X}\\ref{end}"
+
+def test_search_use_of_macro_edge_cases():
+    code = LatexCode(edge_text)
+    found = Summary(code.search_use_of_macro("\\ref",1))
+    # The \ref in the comment, \refoo and the \ref after an escaped backslash (the
+    # former code was seeing the latter one) are not occurrences.
+    assert found == [(1,['x'],'\\ref{x}'),(11,['y'],'\\ref {y}\n'),(25,['d'],'\\ref\n%\n{d}'),
+                     (36,['a{b}c'],'\\ref{a{b}c}'),(49,['q'],'\\ref{q}'),(104,['end'],'\\ref{end}')],found
+    found = Summary(code.search_use_of_macro("\\ref",2))
+    assert found[1] == (11,['y','z'],'\\ref {y}\n\n{z}'),found
+    # A definition of the macro is not a use.
+    assert Summary(code.search_use_of_macro("\\newcommand",1))[0][1] == ['\\ref']
+
+def test_iter_use_of_macro():
+    code = FixtureCode("ess.tex")
+    assert Summary(code.iter_use_of_macro("\\label",1)) == ess_occurrences[("\\label",1)]
+    assert code.has_macro("\\eqref",1)
+    assert not code.has_macro("\\cite",1)
+
+def test_macro_index():
+    code = FixtureCode("ess.tex")
+    index = code.macro_index()
+    for name in ["\\label","\\input","\\section"] :
+        assert index[name] == [o[0] for o in ess_occurrences[(name,1)]],name
+    # The comments are stripped; '\\' is a control sequence, not followed by \ref.
+    code = LatexCode("\\ref{a} % \\ref{b}\n \\\\ref{c} \\refoo \\ref{d}")
+    assert code.text_brut.find("\\ref{d}") == 27
+    assert code.macro_index()["\\ref"] == [0,27]
+    assert "\\refoo" in code.macro_index() and "\\\\" in code.macro_index()
+    # The index follows the changes of the text.
+    code.text_brut = "x \\ref{a}"
+    assert code.macro_index()["\\ref"] == [2]
+    assert code.replace("x","xyz").macro_index()["\\ref"] == [4]
+    assert code.macro_index()["\\ref"] == [2]
+
+def test_occurrence_attributes():
+    from latexparser.Occurrence import Occurrence_input
+    code = FixtureCode("ess.tex")
+    occurrence = code.search_use_of_macro("\\label",1)[0]
+    # As with the former attribute, as_written can be given.
+    occurrence.as_written = "\\label{SecUn}"
+    assert occurrence.as_written == "\\label{SecUn}"
+    assert occurrence.end == occurrence.position+len("\\label{SecUn}")
+    occurrence.number_of_arguments = 2
+    assert occurrence.number_of_arguments == 2
+    # The occurrences have no dictionary.
+    assert not hasattr(occurrence,"__dict__")
+    try :
+        occurrence.note = "mine"
+    except AttributeError :
+        pass
+    else :
+        raise AssertionError("An occurrence accepts any attribute")
+    # The subclasses keep the attributes.
+    occurrence = code.search_use_of_macro("\\input",1)[0]
+    occurrence.as_written = "\\input{fichier} "
+    analysed = Occurrence_input(occurrence)
+    assert (analysed.filename,analysed.as_written,analysed.number_of_arguments) == ("fichier","\\input{fichier} ",1)
+    assert not hasattr(analysed,"__dict__")
+
+#####################################
+# Arguments and braces
+#####################################
+
+def FormerSearchFitBrace(text,position,opening):
+    """
+    SearchFitBrace as it was before the positions.
+    """
+    close = {"{":"}","[":"]"}[opening]
+    level = 0
+    startPosition = position+text[position:].find(opening)
+    for i in range(startPosition,len(text)):
+        if text[i] == opening :
+            level = level+1
+        if text[i] == close :
+            level = level-1
+        if level == 0:
+            return text[startPosition+1:i],startPosition,i
+
+def FormerContinueSearch(s,opening):
+    turtle = 0
+    while turtle < len(s):
+        if s[turtle]=="%":
+            pos = s[turtle:].find("\n")
+            if pos == -1:
+                return False,-1
+            turtle = turtle+pos
+        if s[turtle] == opening :
+            return True,turtle
+        if s[turtle] not in ["%","\n"," ","    "] :
+            return False,-1
+        turtle=turtle+1
+    return False,-1
+
+def FormerSearchArguments(s,number_of_arguments):
+    """
+    SearchArguments as it was before the positions (it returns None when
+    the last argument is directly followed by an other brace).
+    """
+    turtle = 0
+    arguments = []
+    while len(arguments) < number_of_arguments :
+        arg,start,end = FormerSearchFitBrace(s,turtle,"{")
+        arguments.append(arg)
+        turtle=end+1
+        if turtle >= len(s):
+            return arguments,s
+        if s[turtle] != "{":
+            boo,offset = FormerContinueSearch(s[turtle:],"{")
+            if boo:
+                turtle=turtle+offset-1
+            if (not boo) or (len(arguments)==number_of_arguments):
+                return arguments,s[0:turtle]
+
+def BracePositions(text):
+    return [i for i,c in enumerate(text) if c == "{"]
+
+def test_fit_brace():
+    from latexparser.MacroUse import SearchFitBrace
+    from latexparser.MacroUse import FitBracePosition
+    from latexparser.BraceTable import BraceTable
+    for name in ["ess.tex","fichier.tex"] :
+        text = FileToText(fixture(name))
+        table = BraceTable(text)
+        for position in BracePositions(text) :
+            expected = FormerSearchFitBrace(text,position,"{")
+            assert SearchFitBrace(text,position,"{") == expected,(name,position)
+            assert FitBracePosition(text,position,"{",table=table) == expected[1:],(name,position)
+            # A piece of the text : the braces closed after 'end' are not fitted.
+            assert FitBracePosition(text,position,"{",end=expected[2]) is None
+    assert SearchFitBrace("Hello [Louis] how are you ?",4,"[") == ("Louis",6,12)
+    assert SearchFitBrace("no brace",0,"{") is None
+    assert FitBracePosition("{a}",1,"{") is None
+
+def test_search_arguments():
+    from latexparser.MacroUse import SearchArguments
+    from latexparser.MacroUse import SearchArgumentsPosition
+    for name in ["ess.tex","fichier.tex"] :
+        text = FileToText(fixture(name))
+        for position in BracePositions(text) :
+            for number in [1,2,3] :
+                try :
+                    expected = FormerSearchArguments(text[position:],number)
+                except TypeError :      # A brace which is not closed.
+                    continue
+                if expected is None :
+                    continue
+                assert SearchArguments(text[position:],number) == expected,(name,position,number)
+                spans,stop = SearchArgumentsPosition(text,position,number)
+                assert [text[op+1:cl] for op,cl in spans] == expected[0]
+                assert text[position:stop] == expected[1]
+    s = "{A} %comment\n {B}\n\n{C} x {D}"
+    assert SearchArguments(s,4) == (["A","B","C"],"{A} %comment\n {B}\n\n{C}")
+    assert SearchArguments(s,4) == FormerSearchArguments(s,4)
+    # The former code was returning None here.
+    assert FormerSearchArguments("{A}{B}{C}",2) is None
+    assert SearchArguments("{A}{B}{C}",2) == (["A","B"],"{A}{B}")
+    assert SearchArguments("{A}{B}",3) == (["A","B"],"{A}{B}")
+
+def test_fast_search():
+    code = LatexCode(edge_text)
+    # The name of the macro is not a regular expression ("\r" is not a carriage return).
+    assert [o.position for o in code.search_use_of_macro("\\ref",1,fast=True)] == [1,36,49,73,104]
+    assert code.search_use_of_macro("\\ref",1,fast=True)[1].arguments == ["{a{b"]
+
+#####################################
+# Replacements
+#####################################
+
+def FormerRemoveMacro(code,macro_name,number_of_arguments,keep_argument):
+    """
+    remove_macro_content (or remove_macro_name) as it was : each occurrence
+    is replaced with str.replace.
+    """
+    A = code.copy()
+    for occurrence in A.search_use_of_macro(macro_name,number_of_arguments):
+        if keep_argument :
+            A = A.replace(occurrence.as_written,occurrence.arguments[0])
+        else :
+            A = A.replace(occurrence.as_written,"")
+    return A
+
+def FormerChangeMacroArgument(code,macro_name,n,func,n_args):
+    occurrences,configuration = code.search_use_of_macro(macro_name,n_args,give_configuration=True)
+    a = ""
+    for i in range(len(occurrences)):
+        a = a+configuration[i]+occurrences[i].change_argument(n,func).as_written
+    return a+configuration[-1]
+
+def test_apply_edits():
+    code = LatexCode("0123456789")
+    A = code.apply_edits([(5,7,"five"),(0,1,""),(9,9,"|")])
+    assert A.text_brut == "1234five78|9"
+    assert code.text_brut == "0123456789"
+    try :
+        code.apply_edits([(0,5,"a"),(4,6,"b")])
+    except ValueError :
+        pass
+    else :
+        raise AssertionError("Overlapping edits are accepted")
+    # An edit which creates a comment : it is stripped.
+    assert code.apply_edits([(2,3,"%")]).text_brut == "01%"
+    assert code.apply_edits([]).text_brut == code.text_brut
+
+def test_remove_macro():
+    code = FixtureCode("ess.tex")
+    for name,number in [("\\MyMacro",2),("\\label",1),("\\section",1),("\\ref",1),("\\PutStatements",2),("\\usepackage",1)] :
+        assert code.remove_macro_content(name,number).text_brut == FormerRemoveMacro(code,name,number,False).text_brut,name
+        assert code.remove_macro_name(name,number).text_brut == FormerRemoveMacro(code,name,number,True).text_brut,name
+    # The occurrences nested in an other one are removed by a next pass.
+    nested = LatexCode("a \\emph{b \\emph{c} d} e \\emph{f}")
+    assert nested.remove_macro_name("\\emph",1).text_brut == "a b c d e f"
+    assert nested.remove_macro_content("\\emph",1).text_brut == "a  e "
+    # Only the occurrences are changed, not the same text elsewhere (str.replace was changing it).
+    escaped = LatexCode("\\ref{a} b \\\\ref{a}")
+    assert escaped.remove_macro_content("\\ref",1).text_brut == " b \\\\ref{a}"
+    assert FormerRemoveMacro(escaped,"\\ref",1,False).text_brut == " b \\"
+
+def test_change_macro_argument():
+    code = FixtureCode("ess.tex")
+    func = lambda x:"pre:"+x
+    for name in ["\\ref","\\eqref","\\label"] :
+        assert code.change_macro_argument(name,1,func,1).text_brut == FormerChangeMacroArgument(code,name,1,func,1)
+    expected = FormerChangeMacroArgument(LatexCode(FormerChangeMacroArgument(LatexCode(FormerChangeMacroArgument(code,"\\ref",1,func,1)),"\\eqref",1,func,1)),"\\label",1,func,1)
+    code.change_labels_refs(func)
+    assert code.text_brut == expected
+    assert "\\label{pre:SecUne}" in code.text_brut
+
+def test_copy():
+    code = FixtureCode("ess.tex")
+    code.included_file_list.append("ess.tex")
+    definitions = code.dict_of_definition_macros()
+    A = code.copy()
+    assert A.text_brut == code.text_brut
+    assert A.included_file_list == ["ess.tex"]
+    A.included_file_list.append("fichier.tex")
+    assert code.included_file_list == ["ess.tex"]
+    # The comments are not stripped again, and the definitions are shared.
+    assert A.dict_of_definition_macros() is definitions
+
+def test_rope():
+    from latexparser.Rope import Rope
+    rope = Rope("hello world")
+    edited = rope.apply_edits([(0,5,"HELLO"),(6,6,Rope("big ")),(11,11,"!")])
+    assert str(edited) == "HELLO big world!"
+    assert str(rope) == "hello world"
+    for text,sub in [(edited,"o w"),(edited,"big"),(edited,"x")] :
+        assert text.find(sub) == str(text).find(sub)
+        assert text.find(sub,3) == str(text).find(sub,3)
+        assert text.rfind(sub,0,len(text)) == str(text).rfind(sub)
+    assert edited[4:9] == "O big" and edited.endswith("world!") and len(edited) == 16
+    assert "O b" in edited and "big w" in edited and "x" not in edited
+
+def test_rope_replacement_keeps_definitions():
+    from latexparser.Rope import Rope
+    for use_rope in [False,True] :
+        code = LatexCode("\\newcommand{\\Foo}{bar}\nhello world\n",use_rope=use_rope)
+        definitions = code.dict_of_definition_macros()
+        A = code.apply_edits([(29,34,Rope("XYZ"))])
+        assert str(A.text_brut) == "\\newcommand{\\Foo}{bar}\nhello XYZ\n"
+        assert A.dict_of_definition_macros() is definitions
+        # A replacement which defines a macro.
+        B = code.apply_edits([(29,34,Rope("\\newcommand{\\Bar}{x}"))])
+        assert sorted(B.dict_of_definition_macros().keys()) == ["\\Bar","\\Foo"]
+
+def RopeOperations(code):
+    """
+    Return the texts given by the operations of LatexCode which splice the text.
+    """
+    return [code.replace("Eqan","EQAN"),
+            code.remove_macro_name("\\section",1),
+            code.remove_macro_content("\\label",1),
+            code.change_macro_argument("\\label",1,lambda x:"pre:"+x,1),
+            # A % which comments the end of the line.
+            code.replace("\\label{SecUne}","%"),
+            code.remove_macro_name("\\MyMacro",2).replace("and","and %")]
+
+def test_rope_code():
+    import tempfile
+    code = FixtureCode("ess.tex")
+    rope_code = LatexCode(FileToText(fixture("ess.tex")),use_rope=True)
+    assert rope_code.text_brut == code.text_brut
+    for A,B in zip(RopeOperations(code),RopeOperations(rope_code)) :
+        assert B.use_rope
+        assert A.text_brut == B.text_brut
+    with tempfile.TemporaryDirectory() as directory,InDirectory(directory) :
+        WriteTree(directory)
+        from latexparser.all import FileToLatexCode
+        A = Silently(FileToLatexCode("ess.tex").substitute_all_inputs)[0]
+        B = Silently(LatexCode(FileToText("ess.tex"),filename="ess.tex",use_rope=True).substitute_all_inputs)[0]
+        assert B.use_rope and A.text_brut == B.text_brut
+        # The rope is written by pieces.
+        A.remove_macro_name("\\section",1).save("flat.tex")
+        B.remove_macro_name("\\section",1).save("rope.tex")
+        assert FileToText("rope.tex") == FileToText("flat.tex")
+
+#####################################
+# Comments
+#####################################
+
+def FormerRemoveComments(text):
+    """
+    RemoveComments as it was : line by line.
+    """
+    import re
+    search = re.compile("[^\\\\]%").search
+    lines = []
+    for line in text.split("\n"):
+        s = search(line)
+        if s :
+            line = line[:s.start()+2]
+        if line.startswith("%"):
+            line = "%"
+        lines.append(line)
+    code = "\n".join(lines)
+    if "\\end{document}" in code :
+        code = code.split("\\end{document}")[0]+"\\end{document}"
+    return code
+
+comment_cases = ["","%","a%b","\\%a%b\n%c","x\\end{document}y","%\\end{document}\na\\end{document}b",
+                 "a\\\\%b","no comment\n","\n%\n%%\n","a%b\\end{document}\nc\\end{document}d"]
+
+def test_remove_comments():
+    import random
+    from latexparser.Utilities import RemoveComments
+    for name in ["ess.tex","fichier.tex","ess_big.tex","magical_box.tex"] :
+        text = FileToText(fixture(name))
+        assert RemoveComments(text) == FormerRemoveComments(text),name
+    for text in comment_cases :
+        assert RemoveComments(text) == FormerRemoveComments(text),text
+    generator = random.Random(8)
+    for i in range(2000):
+        text = "".join(generator.choice(["%","\\","\n","a"," ","\\end{document}"]) for j in range(generator.randrange(30)))
+        assert RemoveComments(text) == FormerRemoveComments(text),text
+
+def test_file_to_text_up_to_end_document():
+    import tempfile
+    from latexparser.Utilities import RemoveComments
+    from latexparser.all import FileToTextUpToEndDocument
+    for name in ["ess.tex","ess_big.tex"] :
+        text = FileToText(fixture(name))
+        for chunk_size in [7,64,65536] :
+            read = FileToTextUpToEndDocument(fixture(name),chunk_size)
+            assert RemoveComments(read) == RemoveComments(text),(name,chunk_size)
+    with tempfile.TemporaryDirectory() as directory :
+        name = os.path.join(directory,"a.tex")
+        with open(name,"w") as f :
+            f.write("a\n%\\end{document}\nb\\end{document}after\\end{document}")
+        # Not at the \end{document} of the comment, and an \end{document} cut between two chunks.
+        for chunk_size in [1,3,5,16] :
+            assert FileToTextUpToEndDocument(name,chunk_size) == "a\n%\\end{document}\nb\\end{document}"
+
+def test_brace_table():
+    from latexparser.BraceTable import BraceTable
+    from latexparser.BraceTable import NumpyBracePairing
+    from latexparser.BraceTable import StackBracePairing
+    texts = [FileToText(fixture(name)) for name in ["ess.tex","fichier.tex","ess_big.tex"]]
+    texts = texts+["","{","}","no brace","\\{a}\\}{b\\\\}c}","é{ü{}}€{"]
+    for text in texts :
+        assert NumpyBracePairing(text) == StackBracePairing(text),text[:30]
+    table = BraceTable("a{b{c}d}e{")
+    assert table.close_of(1) == 7
+    assert table.close_of(3) == 5
+    assert table.close_of(9) == -1
+    assert table.next_open(4) == 9
+    assert table.next_open(4,9) == -1
+
+#####################################
+# Inclusion of the files and positions
+#####################################
+
+def WriteTree(directory):
+    r"""
+    Write in 'directory' the files included by ess.tex (copies of fichier.tex),
+    one of them including an other file. Return the filename of the main file.
+    """
+    main = os.path.join(directory,"ess.tex")
+    with open(main,"w") as f :
+        f.write(FileToText(fixture("ess.tex")))
+    for name in ["fichier.tex","autre_fichier.tex"] :
+        with open(os.path.join(directory,name),"w") as f :
+            f.write(FileToText(fixture("fichier.tex")))
+    with open(os.path.join(directory,"fichier1.tex"),"w") as f :
+        f.write("Included % comment\n\\input{fichier2}\nend of fichier1")
+    with open(os.path.join(directory,"fichier2.tex"),"w") as f :
+        f.write("   deeper\\ref{SecUne} % comment\n")
+    return main
+
+def FormerSubstituteAllInputs(code,input_paths):
+    """
+    substitute_all_inputs as it was : the text of each \input is replaced with str.replace.
+    """
+    new_code = code
+    for occurrence in code.analyse_use_of_macro("\\input",1):
+        content = FormerSubstituteAllInputs(LatexCode(occurrence.file_content(input_paths)),input_paths)
+        new_code = new_code.replace(occurrence.as_written,content.text_brut)
+    return new_code
+
+def CheckLocations(code):
+    """
+    Check that each character of code.text_brut is located at the same character in its file.
+    """
+    texts = {}
+    for position,character in enumerate(code.text_brut):
+        filename,line,column = code.locate(position)
+        assert filename is not None,position
+        if filename not in texts :
+            texts[filename] = FileToText(filename).split("\n")
+        assert (texts[filename][line-1]+"\n")[column-1] == character,(position,filename,line,column)
+
+def test_substitute_all_inputs():
+    import tempfile
+    from latexparser.all import FileToLatexCode
+    from latexparser.InputPaths import InputPaths
+    with tempfile.TemporaryDirectory() as directory :
+        main = WriteTree(directory)
+        cwd = os.getcwd()
+        os.chdir(directory)
+        try :
+            code = FileToLatexCode("ess.tex")
+            A = code.substitute_all_inputs()
+            assert A.text_brut == FormerSubstituteAllInputs(FileToLatexCode("ess.tex"),InputPaths()).text_brut
+            assert "deeper\\ref{SecUne} %\n" in A.text_brut
+            # As before, the files included by the included files are not in the list.
+            assert A.included_file_list == ["fichier","autre_fichier","fichier1"]
+            CheckLocations(A)
+            for workers in [1,4] :
+                assert code.substitute_all_inputs(workers=workers).text_brut == A.text_brut
+        finally :
+            os.chdir(cwd)
+
+def Locate(code,position):
+    filename,line,column = code.locate(position)
+    return os.path.normpath(filename),line,column
+
+def test_source_map():
+    import tempfile
+    from latexparser.all import FileToLatexCode
+    with tempfile.TemporaryDirectory() as directory :
+        WriteTree(directory)
+        cwd = os.getcwd()
+        os.chdir(directory)
+        try :
+            A = FileToLatexCode("ess.tex").substitute_all_inputs()
+            position = A.text_brut.find("deeper")
+            assert Locate(A,position) == ("fichier2.tex",1,4)
+            assert Locate(A,A.text_brut.find("\\section")) == ("ess.tex",35,1)
+            # A replacement is located at the place of the text it replaced.
+            B = A.remove_macro_name("\\section",1)
+            position = B.text_brut.find("This is the title of a section")
+            assert Locate(B,position) == ("ess.tex",35,1)
+            C = B.replace("deeper","DEEPER")
+            assert Locate(C,C.text_brut.find("DEEPER")) == ("fichier2.tex",1,4)
+            D = A.change_macro_argument("\\label",1,lambda x:"pre:"+x,1)
+            CheckLocations(D.remove_macro_content("\\label",1))
+        finally :
+            os.chdir(cwd)
+
+sample_aux = r"""\relax
+\providecommand\hyper@newdestlabel[2]{}
+\@writefile{toc}{\contentsline {section}{\numberline {1}This is the title of a section}{1}{section.1}}
+\newlabel{SecUne}{{1}{1}{This is the title of a section\relax }{section.1}{}}
+\newlabel{Eqan}{{1}{1}{This is the title of a section\relax }{equation.1.1}{}}
+\bibcite{Foo2010}{1}
+\newlabel{Eqop}{{2}{1}{}{equation.1.2}{}}
+\@writefile{toc}{\contentsline {section}{\numberline {2}This is the title of an other section}{1}{section.2}}
+\newlabel{SecDeux}{{2}{1}{This is the title of an other section\relax }{section.2}{}}
+\newlabel{Eqan}{{3}{2}{}{equation.2.3}{}}
+\newlabel{Short}{{4}{2}}
+"""
+
+def test_aux_file():
+    import io
+    import contextlib
+    from latexparser import newlabelNotFound
+    code = LatexCode(sample_aux)
+    aux = code.aux_file()
+    # The same values as the ones of the \newlabel found by search_use_of_macro (the last one of a label).
+    former = {}
+    for occurrence in code.search_use_of_macro("\\newlabel",2):
+        former[occurrence.arguments[0]] = occurrence.analyse().value
+    assert sorted(aux.labels()) == sorted(former.keys())
+    with contextlib.redirect_stdout(io.StringIO()) as output :
+        for label,value in former.items() :
+            assert code.get_newlabel_value(label) == value,label
+    assert output.getvalue() == "Warning : label Eqan has 2 different values\n"
+    assert former["Eqan"] == "3" and aux.duplicates == {"Eqan":2}
+    assert aux.newlabel("SecUne").section_name == "This is the title of a section "
+    assert aux.newlabel("Short").page == "2" and aux.newlabel("Short").listoche[3] == ""
+    assert aux.bibcite("Foo2010") == "1"
+    assert [entry.split("}{")[0] for entry in aux.writefile("toc")] == ["\\contentsline {section","\\contentsline {section"]
+    assert aux.writefile("lof") == []
+    try :
+        code.get_newlabel_value("Missing")
+        assert False,"the label is not defined"
+    except newlabelNotFound as error :
+        assert error.label_name == "Missing"
+    # The AuxFile follows the changes of the text.
+    assert code.aux_file() is aux
+    code.text_brut = code.text_brut.replace("{{2}{1}{}{equation","{{5}{1}{}{equation")
+    assert code.get_newlabel_value("Eqop") == "5"
+    # With the comments.
+    code = LatexCode("%\\newlabel{Hidden}{{1}{1}}\n"+sample_aux,keep_comments=True)
+    assert sorted(code.aux_file().labels()) == sorted(former.keys())
+
+def FormerFileToText(name):
+    import codecs
+    return "".join(line for line in codecs.open(name,"r",encoding="utf8"))
+
+def test_file_loader():
+    import io
+    import tempfile
+    import contextlib
+    from latexparser import FileLoader
+    from latexparser.FileLoader import LoadText
+    from latexparser.FileLoader import LoadTextChunks
+    for name in ["ess.tex","fichier.tex","magical_box.tex"] :
+        assert FileToText(fixture(name)) == FormerFileToText(fixture(name)),name
+    with tempfile.TemporaryDirectory() as directory :
+        name = os.path.join(directory,"a.tex")
+        text = "é\r\nà\rù\n∀x"
+        with open(name,"wb") as f :
+            f.write(text.encode("utf8"))
+        # The end of lines are kept.
+        assert FileToText(name) == FormerFileToText(name) == text
+        assert FileToText(os.path.join(directory,"missing.tex")) == ""
+        former_threshold = FileLoader.mmap_threshold
+        FileLoader.mmap_threshold = 0
+        try :
+            FileLoader.reset_bytes_read()
+            assert LoadText(name) == text
+            assert FileLoader.number_of_bytes_read() == len(text.encode("utf8"))
+        finally :
+            FileLoader.mmap_threshold = former_threshold
+        # A character is never cut between two chunks.
+        assert "".join(LoadTextChunks(name,chunk_size=1)) == text
+        with open(name,"wb") as f :
+            f.write("Warning: déjà".encode("iso8859-1"))
+        with contextlib.redirect_stdout(io.StringIO()):
+            assert LoadText(name,fallback="iso8859-1") == "Warning: déjà"
+        try :
+            LoadText(name)
+            assert False,"not utf8"
+        except UnicodeDecodeError :
+            pass
+
+def test_input_graph():
+    import tempfile
+    from latexparser.all import FileToLatexCode
+    with tempfile.TemporaryDirectory() as directory,InDirectory(directory) :
+        WriteTree(directory)
+        code = FileToLatexCode("ess.tex")
+        graph = code.input_graph()
+        # The same files as substitute_all_inputs, without building the document.
+        assert graph.nodes == ["ess.tex","fichier.tex","autre_fichier.tex","fichier1.tex","fichier2.tex"]
+        assert graph.children("ess.tex") == ["fichier.tex","autre_fichier.tex","fichier1.tex"]
+        edge = graph.parents("fichier2.tex")[0]
+        assert (edge.parent,edge.line) == ("fichier1.tex",2)
+        assert [edge.line for edge in graph.edges["ess.tex"]] == [51,54,57]
+        assert graph.dependents("fichier2.tex") == {"fichier1.tex","ess.tex"}
+        assert graph.descendants("fichier1.tex") == {"fichier2.tex"}
+        order = graph.topological_order()
+        assert order.index("fichier2.tex") < order.index("fichier1.tex") < order.index("ess.tex")
+        assert graph.cycles == [] and graph.duplicates == {} and graph.missing == []
+        # A cycle, a file included twice and a missing file.
+        # (As before, the last character of an included file, its last "\n", is dropped.)
+        WriteFile("a.tex","\\input{b}\\input{c}\\input{c} % \\input{hidden}\n\\input{nothere}\n")
+        WriteFile("b.tex","\\input{a}\n")
+        WriteFile("c.tex","C\n")
+        # The directory was read : the new files are seen after DirectoryListing.miss_lifetime.
+        time.sleep(0.15)
+        graph = FileToLatexCode("a.tex").input_graph()
+        assert graph.nodes == ["a.tex","b.tex","c.tex"]
+        assert graph.cycles == [["a.tex","b.tex","a.tex"]]
+        assert [edge.parent for edge in graph.duplicates["c.tex"]] == ["a.tex","a.tex"]
+        assert graph.missing == [("a.tex","nothere")]
+        assert graph.topological_order()[-1] == "a.tex"
+
+def test_input_paths():
+    import tempfile
+    from latexparser.InputPaths import InputPaths
+    from latexparser.InputPaths import DirectoryListing
+    with tempfile.TemporaryDirectory() as first,tempfile.TemporaryDirectory() as second :
+        WriteFile(os.path.join(first,"a.tex"),"a")
+        WriteFile(os.path.join(second,"b.tex"),"b")
+        cwd = os.getcwd()
+        paths = InputPaths()
+        try :
+            os.chdir(first)
+            assert paths.get_file("a.tex") == "./a.tex"
+            # The same relative directory in an other current directory.
+            os.chdir(second)
+            assert paths.get_file("b.tex") == "./b.tex"
+            try :
+                paths.get_file("a.tex")
+                assert False,"a.tex is not in the current directory"
+            except NameError :
+                pass
+            # A file created after the directory was read is found once the listing
+            # of the misses is not trusted anymore.
+            WriteFile("c.tex","c")
+            time.sleep(DirectoryListing.miss_lifetime*1.5)
+            assert paths.get_file("c.tex") == "./c.tex"
+            os.mkdir("sub")
+            WriteFile(os.path.join("sub","d.tex"),"d")
+            assert paths.get_file("sub/d.tex") == "./sub/d.tex"
+        finally :
+            os.chdir(cwd)
+
+class CountingCalls(object):
+    """
+    Count the calls of the functions 'names' of the module os during a 'with' block.
+    """
+    def __init__(self,*names):
+        self.names = names
+    def __enter__(self):
+        self.calls = {name:0 for name in self.names}
+        self.former = {name:getattr(os,name) for name in self.names}
+        for name in self.names :
+            def Counting(*args,name=name,**kwargs):
+                self.calls[name] += 1
+                return self.former[name](*args,**kwargs)
+            setattr(os,name,Counting)
+        return self.calls
+    def __exit__(self,*args):
+        for name in self.names :
+            setattr(os,name,self.former[name])
+
+def test_input_paths_system_calls():
+    import tempfile
+    from latexparser.InputPaths import InputPaths
+    from latexparser.InputPaths import DirectoryListing
+    with tempfile.TemporaryDirectory() as directory,InDirectory(directory) :
+        paths = InputPaths()
+        filenames = []
+        for k in range(30) :
+            os.mkdir("d%s"%k)
+            paths.append("d%s"%k)
+            for j in range(30) :
+                WriteFile(os.path.join("d%s"%k,"f%s_%s.tex"%(k,j)),"")
+                filenames.append("f%s_%s.tex"%(k,j))
+        for filename in filenames :
+            paths.get_file(filename)
+        former_lifetime = DirectoryListing.miss_lifetime
+        DirectoryListing.miss_lifetime = 60
+        try :
+            # The listings are read : the lookups are searches in dictionaries.
+            with CountingCalls("stat","scandir","getcwd") as calls :
+                start = time.monotonic()
+                for filename in filenames :
+                    paths.get_file(filename)
+            assert calls["stat"] == calls["scandir"] == 0,calls
+            assert calls["getcwd"] == len(filenames)
+            assert time.monotonic()-start < 0.2
+        finally :
+            DirectoryListing.miss_lifetime = former_lifetime
+        # When the listing of a miss is not trusted anymore, the directory is looked
+        # at once (and read again only if it changed).
+        DirectoryListing.miss_lifetime = 0
+        try :
+            with CountingCalls("stat","scandir") as calls :
+                paths.get_file("f29_0.tex")
+            assert calls == {"stat":30,"scandir":0},calls
+        finally :
+            DirectoryListing.miss_lifetime = former_lifetime
+
+def test_parse_cache():
+    import tempfile
+    from latexparser.ParseCache import ParseCache
+    text = FileToText(fixture("ess.tex"))
+    with tempfile.TemporaryDirectory() as directory :
+        cache = ParseCache(directory)
+        stripped = cache.scan(text)["text"]
+        size = cache._size
+        # Writing again the same entry does not make the cache larger.
+        entry = cache.get(stripped)
+        for i in range(3):
+            cache.put(stripped,entry)
+        assert cache._size == size == sum(entry[1] for entry in cache.entries())
+        code = cache.latex_code(text,filename="ess.tex")
+        assert cache.hits == 2
+        expected = LatexCode(text)
+        assert code.text_brut == expected.text_brut
+        assert Summary(code.search_use_of_macro("\\label",1)) == Summary(expected.search_use_of_macro("\\label",1))
+        # The definitions are read in the entry.
+        definitions = code._dict_of_definition_macros
+        assert sorted(definitions) == ["\\MyMacro","\\SecondMacro"]
+        for name,newcommand in expected.dict_of_definition_macros().items():
+            assert definitions[name].number_of_arguments == newcommand.number_of_arguments
+            assert definitions[name].definition == newcommand.definition
+            assert definitions[name].occurrence.as_written == newcommand.occurrence.as_written
+        assert [name for name in os.listdir(directory) if not name.endswith(".json")] == []
+        # A change in the comments only : the entry is the same.
+        commented = cache.latex_code(text.replace("\n","% a comment\n",1),filename="ess.tex")
+        assert cache.hits == 3 and commented.text_brut == code.text_brut
+        # The code is scanned silently, and "no definitions" is kept as the others.
+        code,output = Silently(cache.latex_code,"No definition here\n")
+        assert output == "" and cache.misses == 2
+        assert Silently(code.dict_of_definition_macros) == ({},"")
+
+def test_write_file_atomically():
+    import tempfile
+    from latexparser.FileLoader import WriteFileAtomically
+    from latexparser.FileLoader import DefaultFileMode
+    with tempfile.TemporaryDirectory() as directory :
+        name = os.path.join(directory,"a.json")
+        WriteFileAtomically(name,"first")
+        assert os.stat(name).st_mode & 0o777 == DefaultFileMode()
+        os.chmod(name,0o640)
+        WriteFileAtomically(name,"second")
+        assert os.stat(name).st_mode & 0o777 == 0o640
+        with open(name) as f :
+            assert f.read() == "second"
+        # A failing write leaves the file and no temporary file.
+        try :
+            WriteFileAtomically(name,"\udcff")
+        except UnicodeEncodeError :
+            pass
+        with open(name) as f :
+            assert f.read() == "second"
+        assert os.listdir(directory) == ["a.json"]
+
+#####################################
+# Followed files
+#####################################
+
+class CountingHashes(object):
+    """
+    Count the files hashed by FileTracking during a 'with' block.
+    """
+    def __enter__(self):
+        self.hashed = []
+        self.former = latexparser.PytexTools.SafeFileToSha1sum
+        def Hash(f):
+            self.hashed.append(f)
+            return self.former(f)
+        latexparser.PytexTools.SafeFileToSha1sum = Hash
+        return self.hashed
+    def __exit__(self,*args):
+        latexparser.PytexTools.SafeFileToSha1sum = self.former
+
+def WriteOldFile(name,text):
+    # Older than FileTracking.racy_delay.
+    WriteFile(name,text)
+    past = time.time()-10
+    os.utime(name,(past,past))
+
+def test_file_tracking():
+    import tempfile
+    from latexparser.PytexTools import FileTracking
+    from latexparser.FileLoader import DefaultFileMode
+    with tempfile.TemporaryDirectory() as directory,InDirectory(directory) :
+        WriteOldFile("a.tex","first")
+        WriteOldFile("b.tex","second")
+        tracking = FileTracking()
+        assert tracking.is_file_changed(filenames=["a.tex","b.tex"])
+        tracking.save()
+        assert os.stat("pytextools.json").st_mode & 0o777 == DefaultFileMode()
+        FileTracking.load()
+        # The files whose time and size did not change are not read.
+        with CountingHashes() as hashed :
+            assert not tracking.is_file_changed(filenames=["a.tex","b.tex"])
+        assert hashed == []
+        WriteOldFile("a.tex","FIRST")
+        os.utime("a.tex",(time.time()-5,time.time()-5))
+        with CountingHashes() as hashed :
+            assert tracking.is_file_changed("a.tex")
+        assert hashed == ["a.tex"]
+        # A file modified just before it is recorded is hashed the next time.
+        WriteFile("c.tex","third")
+        tracking.is_file_changed("c.tex")
+        with CountingHashes() as hashed :
+            tracking.is_file_changed("c.tex")
+        assert hashed == ["c.tex"]
+        assert tracking.is_file_changed("missing.tex")
+        # The saved file keeps its permissions; no temporary file is left.
+        os.chmod("pytextools.json",0o640)
+        tracking.save()
+        assert os.stat("pytextools.json").st_mode & 0o777 == 0o640
+        assert sorted(os.listdir(".")) == ["a.tex","b.tex","c.tex","pytextools.json"]
+
+def test_file_tracking_xml():
+    import hashlib
+    import tempfile
+    from latexparser.PytexTools import FileTracking
+    with tempfile.TemporaryDirectory() as directory,InDirectory(directory) :
+        WriteOldFile("a.tex","first")
+        WriteFile("pytextools.xml",'<?xml version="1.0" ?>\n<Followed_files>\n\t<fichier name="a.tex" sha1sum="%s"/>\n</Followed_files>\n'%hashlib.sha1(b"first").hexdigest())
+        FileTracking.load()
+        # The files followed in pytextools.xml are still followed.
+        tracking = FileTracking()
+        assert not tracking.is_file_changed("a.tex")
+        tracking.save()
+        os.remove("pytextools.xml")
+        FileTracking.load()
+        assert not tracking.is_file_changed("a.tex")
+
+def test_import_time():
+    from latexparser.import_time import MeasureImport
+    from latexparser.import_time import default_budget
+    milliseconds,imported,loaded = MeasureImport("latexparser.PytexTools",runs=3)
+    # A large margin : the machine running the tests can be slow.
+    assert milliseconds < 10*default_budget,milliseconds
+    assert imported == [],imported
+    assert not loaded
+
+#####################################
+# Incremental build
+#####################################
+
+class InDirectory(object):
+    """
+    Work in 'directory' (the FileTracking state is read there) during a 'with' block.
+    """
+    def __init__(self,directory):
+        self.directory = directory
+    def __enter__(self):
+        self.cwd = os.getcwd()
+        os.chdir(self.directory)
+        latexparser.PytexTools.FileTracking.load()
+    def __exit__(self,*args):
+        os.chdir(self.cwd)
+        latexparser.PytexTools.FileTracking.loaded = False
+
+def WriteFile(name,text):
+    with open(name,"w") as f :
+        f.write(text)
+
+def Quietly(function,*args):
+    """
+    Return function(*args) and the lines printed by the incremental build.
+    """
+    import io
+    import contextlib
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        result = function(*args)
+    return result,[line for line in output.getvalue().splitlines() if line.startswith("Incremental")]
+
+def BuildDocument(incremental,plugins,boxes):
+    from latexparser.all import FileToLatexCode
+    factory = latexparser.PytexTools.CodeFactory()
+    factory.codeLaTeX = FileToLatexCode("main.tex")
+    factory.plugin_list = plugins
+    factory.code_box_list = boxes
+    messages = Quietly(factory.apply_all,"tag",incremental)[1]
+    return factory.codeLaTeX.text_brut,messages
+
+def test_incremental_build():
+    import tempfile
+    from latexparser.PytexTools import Plugin
+    from latexparser.PytexTools import CodeBox
+    words = {"plug":"PLUGGED"}
+    def replace_words(text):
+        for word,replacement in words.items():
+            text = text.replace(word,replacement)
+        return text
+    box = CodeBox("Box")
+    box["hello"] = LatexCode("Hello from the box")
+    plugins = [Plugin(replace_words,"words",local=True,version="1")]
+    with tempfile.TemporaryDirectory() as directory, InDirectory(directory) :
+        WriteFile("main.tex","\\begin{document}\nplug\n\\input{a}\n\\input{b}\n\\PutBox{}{hello}\n\\end{document}\n")
+        WriteFile("a.tex","In a : plug \\PytexOnlyIn{tag}{only} \\PytexNotIn{tag}{not}\\input{c}\n")
+        WriteFile("b.tex","In b : \\PutBox{}{hello} % comment\n")
+        WriteFile("c.tex","In c\n")
+        def check(expected_message):
+            full = BuildDocument(False,plugins,[box])[0]
+            text,messages = BuildDocument(True,plugins,[box])
+            assert text == full,(text,full)
+            assert messages[-1] == expected_message,messages
+            return text
+        text = check("Incremental build : 3 of 3 files transformed again.")
+        assert "In a : PLUGGED only In c" in text and "In b : Hello from the box %" in text,text
+        check("Incremental build : 0 of 3 files transformed again.")
+        WriteFile("c.tex","In c, changed\n")
+        assert "In c, changed" in check("Incremental build : 1 of 3 files transformed again.")
+        # A change of the contents of a box, or of the version of a plugin.
+        box["hello"] = LatexCode("Hello again")
+        assert "Hello again" in check("Incremental build : 3 of 3 files transformed again.")
+        words["In"] = "Dans"
+        plugins[0] = Plugin(replace_words,"words",local=True,version="2")
+        assert "Dans b" in check("Incremental build : 3 of 3 files transformed again.")
+        check("Incremental build : 0 of 3 files transformed again.")
+        # Without a version, the document is built as usual.
+        plugins.append(Plugin(lambda text:text.upper(),"upper",local=True))
+        text,messages = BuildDocument(True,plugins,[box])
+        assert "built as usual" in messages[0] and "DANS B" in text,messages
+        plugins.pop()
+        # A definition in a changed file : everything is transformed again.
+        WriteFile("c.tex","\\newcommand{\\Foo}{foo}In c\n")
+        messages = BuildDocument(True,plugins,[box])[1]
+        assert "everything is transformed again" in messages[0],messages
+        # An \input in braces : the document is built as usual.
+        WriteFile("b.tex","\\PytexOnlyIn{tag}{\\input{c}}\n")
+        text,messages = BuildDocument(True,plugins,[box])
+        assert "built as usual" in messages[0] and text == BuildDocument(False,plugins,[box])[0]
+
+def test_plugin_identity():
+    from latexparser.PytexTools import Plugin
+    from latexparser.PytexTools import CodeFactory
+    from latexparser.IncrementalBuild import PluginIdentity
+    def first(text):
+        return text.replace("a","b")
+    assert PluginIdentity(Plugin(first,"p",version="3")) == "p:3"
+    assert PluginIdentity(Plugin(first,"p",version="3")) != PluginIdentity(Plugin(first,"p",version="4"))
+    # A plugin without version cannot be followed : it is not local.
+    assert PluginIdentity(Plugin(first,"p",local=True)) is None
+    factory = CodeFactory()
+    factory.plugin_list = [Plugin(first,"p",local=True,version="1")]
+    assert factory.is_local()
+    factory.plugin_list.append(Plugin(first,"q",local=True))
+    assert not factory.is_local()
+    factory.plugin_list = [Plugin(first,"p",version="1")]
+    assert not factory.is_local()
+
+#####################################
+# Log files
+#####################################
+
+sample_log = r"""This is pdfTeX, Version 3.14159265-2.6-1.40.18 (TeX Live 2017) (preloaded format=pdflatex)
+(./main.tex
+LaTeX2e <2017-04-15>
+(./main.aux)
+Package hyperref Warning: Token not allowed in a PDF string (PDFDocEncoding):
+(hyperref)                removing `math shift' on input line 12.
+
+LaTeX Warning: Reference `SecUne' on page 1 undefined on input line 14.
+
+LaTeX Warning: Citation `Foo2010' on page 2 undefined on input line 20.
+
+LaTeX Warning: Reference `SecUne' on page 3 undefined on input line 31.
+
+LaTeX Warning: Label `Eqan' multiply defined.
+
+LaTeX Warning: Reference `Eqop' on page 3 undefined on input line 33.
+
+Overfull \hbox (4.2pt too wide) in paragraph at lines 40--41
+[1] [2] [3]
+
+LaTeX Warning: Citation `Bar2012' on page 4 undefined on input line 52.
+
+LaTeX Warning: Citation `Foo2010' on page 4 undefined on input line 53.
+
+LaTeX Warning: There were undefined references.
+
+LaTeX Warning: Label(s) may have changed. Rerun to get cross-references right.
+
+ )
+Output written on main.pdf (4 pages, 51234 bytes).
+"""
+
+def FormerLogWarnings(text):
+    """
+    The undefined references and citations, as the former LogCode was finding them.
+    """
+    references,citations = [],[]
+    for warn in text.split("Warning: ")[1:] :
+        text = warn[0:warn.find(".")]
+        mots = text.split(" ")
+        genre,label = mots[0],mots[1][1:-1]
+        try :
+            page = mots[mots.index("page")+1]
+        except ValueError :
+            page = -1
+        found = {"Reference":references,"Citation":citations}.get(genre)
+        if found is not None and label not in [w[0] for w in found] :
+            found.append((label,page))
+    return references,citations
+
+def Warned(warnings):
+    return [(w.label,w.page) for w in warnings]
+
+def test_log_parser():
+    from latexparser.LogCode import LogParser
+    parser = LogParser()
+    parser.feed(sample_log)
+    parser.finish()
+    assert (Warned(parser.undefined_references),Warned(parser.undefined_citations)) == FormerLogWarnings(sample_log)
+    assert Warned(parser.undefined_references) == [("SecUne","1"),("Eqop","3")]
+    # The multiply defined labels are given once (the former code was giving each of them).
+    assert Warned(parser.multiply_labels) == [("Eqan",-1)]
+    assert parser.rerun and parser.rerun_requested
+    assert parser.fatal is None and not parser.tex_capacity_exceeded
+    expected = Warned(parser.undefined_references+parser.undefined_citations+parser.multiply_labels)
+    # Any cut of the log gives the same warnings.
+    for size in [1,3,7,10,64] :
+        parser = LogParser()
+        new = []
+        for k in range(0,len(sample_log),size) :
+            new.extend(parser.feed(sample_log[k:k+size]))
+        new.extend(parser.finish())
+        assert sorted(Warned(new)) == sorted(expected),size
+        assert Warned(parser.undefined_references+parser.undefined_citations+parser.multiply_labels) == expected
+        assert parser.rerun
+    # The fatal messages, even cut between two pieces.
+    parser = LogParser()
+    parser.feed("! TeX capac")
+    assert parser.fatal is None
+    parser.feed("ity exceeded, sorry [main memory size=5000000].")
+    assert parser.fatal == "TeX capacity exceeded" and parser.tex_capacity_exceeded
+    parser = LogParser()
+    parser.feed("Package rerunfilecheck Warning: File `main.out' has changed.\n(rerunfilecheck)                Rerun to get outlines right")
+    assert parser.rerun_requested and not parser.rerun
+
+def test_log_code():
+    import io
+    import contextlib
+    from latexparser.LogCode import LogCode
+    with contextlib.redirect_stdout(io.StringIO()):
+        log = LogCode(sample_log+"! TeX capacity exceeded, sorry.\n")
+        assert log.rerun_to_get_cross_references()
+    assert log.tex_capacity_exeeded()
+    assert [type(w).__name__ for w in log.warnings] == ["ReferenceWarning"]*2+["CitationWarning"]*2+["MultiplyLabelWarning","LabelWarning","TeXCapacityExceededWarning"]
+    assert log.probs_number == 7
+
+def FormerGrepResult(label):
+    import subprocess
+    a = []
+    a.append(subprocess.getoutput("grep --color=always -n \\\\ref{"+label+"} *.tex"))
+    a.append(subprocess.getoutput("grep --color=always -n \\label{"+label+"} *.tex"))
+    return "\n".join(a)
+
+def test_label_index():
+    import shutil
+    import tempfile
+    from latexparser.LabelIndex import LabelIndex
+    from latexparser.Warnings import ReferenceWarning
+    from latexparser.Warnings import CitationWarning
+    with tempfile.TemporaryDirectory() as directory,InDirectory(directory) :
+        WriteTree(directory)
+        WriteFile("other.tex","See \\ref{SecUne}, \\eqref{Eqan} and \\pageref{SecUne} \\cite{Foo2010, Bar}\n\\citep[p. 3]{Bar}\n")
+        index = LabelIndex()
+        assert index.locate("label","SecUne") == [("ess.tex",38)]
+        assert index.locate("ref","SecUne") == [("fichier2.tex",1),("other.tex",1),("other.tex",1)]
+        assert index.locate("cite","Bar") == [("other.tex",1),("other.tex",2)]
+        assert "\033[01;31m\033[KBar\033[m\033[K" in CitationWarning("Bar",1).report(index)
+        # The same lines as the former grep.
+        if shutil.which("grep") and "GREP_COLORS" not in os.environ and "GREP_COLOR" not in os.environ :
+            for label in ["SecUne","SecDeux","Eqan","Missing"] :
+                assert ReferenceWarning(label,1).grep_result(index) == FormerGrepResult(label),label
+
+def test_follow_log():
+    import tempfile
+    from latexparser.LogCode import FollowLog
+    from latexparser.LogCode import LogParser
+    with tempfile.TemporaryDirectory() as directory :
+        name = os.path.join(directory,"main.log")
+        with open(name,"wb") as f :
+            f.write(sample_log.encode("utf8"))
+        parser = LogParser()
+        followed = list(FollowLog(name,parser=parser))
+        # In the order of the log.
+        assert Warned(followed) == [("SecUne","1"),("Foo2010","2"),("Eqan",-1),("Eqop","3"),("Bar2012","4")]
+        assert parser.rerun
+
+#####################################
+# Bibtex
+#####################################
+
+sample_bibtex = """% The bibliography
+@Article{Foo2010,
+  author = {Foo, A. and {\\"O}ther, B.},
+  title = "A {Title}, with a comma",
+  year = 2010,
+  journal = jams # { Special},
+}
+
+@Book{ Bar2012,
+  title = {Braces {in} {braces} \\{ and \\}}, % not a field = x
+  publisher = {Pub} % the last field
+  ,
+}
+@misc{Baz,
+  note = {d\\'ej\\`a vu}}
+"""
+
+def test_bibtex_index():
+    import tempfile
+    from latexparser import CodeBibtex
+    from latexparser.BibtexIndex import FileToBibtexIndex
+    former = CodeBibtex(sample_bibtex)
+    with tempfile.TemporaryDirectory() as directory :
+        name = os.path.join(directory,"big.bib")
+        with open(name,"w") as f :
+            f.write(sample_bibtex)
+        for use_mmap in [False,True] :
+            with FileToBibtexIndex(name,use_mmap=use_mmap) as index :
+                assert sorted(index.labels()) == sorted(former.entry_dict.keys())
+                labels = ["Baz","Foo2010","Bar2012"]
+                assert index.extract_list(labels).text_brut == former.extract_list(labels).text_brut
+                for label in labels :
+                    assert index[label].type == former[label].type
+                assert index["Foo2010"].fields == {"author":'Foo, A. and {\\"O}ther, B.',"title":"A {Title}, with a comma",
+                                                   "year":"2010","journal":"jams Special"}
+                assert index["Bar2012"]["TITLE"] == "Braces {in} {braces} \\{ and \\}"
+                assert index["Bar2012"]["publisher"] == "Pub"
+                data = index.data
+            # The memory mapped file is released at the end of the block.
+            if use_mmap :
+                assert data.closed
+
+def test_create_bibtex_file():
+    import tempfile
+    from latexparser import CreateBibtexFile
+    from latexparser.BibtexIndex import FileToBibtexIndex
+    from latexparser import FileToCodeBibtex
+    with tempfile.TemporaryDirectory() as directory,InDirectory(directory) :
+        WriteFile("big.bib",sample_bibtex)
+        WriteFile("small.bib","@misc{Baz,\n  note = {d\\'ej\\`a vu}}\n")
+        WriteFile("chapter.tex","See \\cite{Foo2010} and \\cite{Baz}.")
+        Silently(CreateBibtexFile,"big.bib","small.bib",["chapter"])
+        assert sorted(FileToCodeBibtex("small.bib").entry_dict.keys()) == ["Baz","Foo2010"]
+        # A big file written on Windows, followed by empty lines.
+        with open("big.bib","wb") as f :
+            f.write(b"@misc{Baz, note = {x}}\r\n\r\n@misc{Qux, note = {y}}\r\n\r\n")
+        WriteFile("small.bib","@misc{Baz, note = {x}}\n")
+        WriteFile("chapter.tex","See \\cite{Baz}.")
+        with FileToBibtexIndex("big.bib") as index :
+            assert [index[label].given_text for label in ["Baz","Qux"]] == ["@misc{Baz, note = {x}}","@misc{Qux, note = {y}}"]
+        Silently(CreateBibtexFile,"big.bib","small.bib",["chapter"])
+        assert sorted(FileToCodeBibtex("small.bib").entry_dict.keys()) == ["Baz"]
+
+#####################################
+# Compilation
+#####################################
+
+# The fake pdflatex, bibtex and makeindex (see fake_tools/faketex).
+fake_tools = {name:fixture(os.path.join("fake_tools",name)) for name in ["pdflatex","bibtex","makeindex"]}
+
+class FakeTools(InDirectory):
+    """
+    Work in 'directory' with the fake tools sleeping as given by 'sleep' (see
+    FAKE_TOOLS_SLEEP in fake_tools/faketex) during a 'with' block.
+    """
+    def __init__(self,directory,sleep=""):
+        InDirectory.__init__(self,directory)
+        self.sleep = sleep
+    def __enter__(self):
+        InDirectory.__enter__(self)
+        self.former_sleep = os.environ.get("FAKE_TOOLS_SLEEP")
+        os.environ["FAKE_TOOLS_SLEEP"] = self.sleep
+    def __exit__(self,*args):
+        if self.former_sleep is None :
+            del os.environ["FAKE_TOOLS_SLEEP"]
+        else :
+            os.environ["FAKE_TOOLS_SLEEP"] = self.former_sleep
+        InDirectory.__exit__(self,*args)
+
+def ToolCalls():
+    """
+    Return the list of the calls (program,start,end) of the fake tools and the pids of their children.
+    """
+    calls,children = [],[]
+    if not os.path.exists("fake_tools.log") :
+        return calls,children
+    with open("fake_tools.log") as f :
+        for line in f :
+            words = line.split()
+            if words[0] == "child" :
+                children.append(int(words[1]))
+            else :
+                calls.append((words[0],float(words[1]),float(words[2])))
+    return calls,children
+
+def Alive(pid):
+    try :
+        os.kill(pid,0)
+    except ProcessLookupError :
+        return False
+    # A process which is killed, but not yet waited for by its parent.
+    try :
+        with open("/proc/%s/stat"%pid) as f :
+            return f.read().split(")")[-1].split()[0] != "Z"
+    except IOError :
+        return True
+
+def Silently(function,*args):
+    import io
+    import contextlib
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        result = function(*args)
+    return result,output.getvalue()
+
+def test_compilation_steps_at_the_same_time():
+    import tempfile
+    from latexparser.PytexTools import Compilation
+    with tempfile.TemporaryDirectory() as directory,FakeTools(directory,"bibtex=1,makeindex=1") :
+        for extension in [".aux",".idx",".nlo"] :
+            WriteFile("main"+extension,"")
+        start = time.time()
+        results = Silently(Compilation("main.tex",commands=fake_tools).special_stuffs)[0]
+        duration = time.time()-start
+        assert [result.returncode for result in results] == [0,0,0]
+        calls = ToolCalls()[0]
+        assert sorted(call[0] for call in calls) == ["bibtex","makeindex","makeindex"]
+        # bibtex, makeindex and the nomenclature ran at the same time.
+        assert max(call[1] for call in calls) < min(call[2] for call in calls),calls
+        assert duration < 2.5,duration
+
+def test_compilation_timeout():
+    import tempfile
+    from latexparser.PytexTools import Compilation
+    with tempfile.TemporaryDirectory() as directory,FakeTools(directory,"makeindex=30") :
+        WriteFile("main.idx","")
+        compilation = Compilation("main.tex",commands=fake_tools,timeouts={"makeindex":0.5})
+        start = time.time()
+        result,output = Silently(compilation.makeindex)
+        assert result.timed_out and not result.success()
+        assert time.time()-start < 10
+        assert "makeindex was stopped after 0.5 seconds." in output
+        calls,children = ToolCalls()
+        # The program and the one it launched are killed.
+        assert calls == [] and len(children) == 1
+        for k in range(50) :
+            if not Alive(children[0]) :
+                break
+            time.sleep(0.1)
+        assert not Alive(children[0])
+
+def test_latex_does_not_wait_for_an_answer():
+    import tempfile
+    from latexparser.PytexTools import Compilation
+    from latexparser.CompilationSteps import CompilationStep
+    from latexparser.CompilationSteps import RunSteps
+    with tempfile.TemporaryDirectory() as directory,FakeTools(directory) :
+        WriteFile("main.tex","\\label{a} \\ref{a}")
+        result = Silently(Compilation("main.tex",commands=fake_tools).latex)[0]
+        assert result.success(),result.output
+        assert "\\newlabel{a}{{1}{1}}" in FileToText("main.aux")
+        # Without -interaction=nonstopmode, the fake pdflatex asks a question : nobody answers.
+        step = CompilationStep("latex",[fake_tools["pdflatex"],"main.tex"],timeout=20)
+        result = Silently(RunSteps,[step])[0][0]
+        assert result.returncode == 1 and not result.timed_out
+        assert result.output.endswith("?\n")
+
+def test_compilation_follow_log():
+    import tempfile
+    from latexparser.PytexTools import Compilation
+    with tempfile.TemporaryDirectory() as directory,FakeTools(directory) :
+        WriteFile("main.tex","See \\ref{x}.\n")
+        parser,output = Silently(Compilation("main.tex",commands=fake_tools).latex,True)
+        assert [warning.label for warning in parser.warnings()] == ["x"],output
+        assert Calls("pdflatex") == 1
+    # The timeout of the step is followed.
+    with tempfile.TemporaryDirectory() as directory,FakeTools(directory,"pdflatex=30") :
+        WriteFile("main.tex","See \\ref{x}.\n")
+        compilation = Compilation("main.tex",commands=fake_tools,timeouts={"latex":0.5})
+        start = time.time()
+        output = Silently(compilation.latex,True)[1]
+        assert time.time()-start < 10
+        assert "latex was stopped after 0.5 seconds." in output
+        assert Calls("pdflatex") == 0
+
+def Calls(program):
+    return len([call for call in ToolCalls()[0] if call[0] == program])
+
+def test_compile_until_stable():
+    import tempfile
+    from latexparser.PytexTools import Compilation
+    from latexparser.PytexTools import BibtexInputSha1sum
+    with tempfile.TemporaryDirectory() as directory,FakeTools(directory) :
+        WriteFile("main.tex","See \\ref{x}.\n\\include{chap}\n\\bibliography{b}\n")
+        WriteFile("chap.tex","\\label{x} \\cite{Foo}\n")
+        compilation = Compilation("main.tex",commands=fake_tools)
+        # pdflatex, bibtex (for \cite{Foo} in chap.aux), pdflatex.
+        assert Silently(compilation.compile_until_stable)[0] == 2
+        assert (Calls("pdflatex"),Calls("bibtex")) == (2,1)
+        assert compilation.log_parser().warnings() == []
+        # A citation added in the chapter : only chap.aux changes, bibtex is launched.
+        before = BibtexInputSha1sum("main.aux")
+        WriteFile("chap.tex","\\label{x} \\cite{Foo} \\cite{Bar}\n")
+        assert Silently(compilation.compile_until_stable)[0] == 2
+        assert BibtexInputSha1sum("main.aux") != before
+        assert (Calls("pdflatex"),Calls("bibtex")) == (4,2)
+        assert "\\bibitem{Bar}" in FileToText("main.bbl")
+        assert compilation.log_parser().warnings() == []
+        # A label added in the chapter : the .aux changes, but not the input of bibtex.
+        before = compilation.digests([".aux"])
+        WriteFile("chap.tex","\\label{y} \\label{x} \\cite{Foo} \\cite{Bar}\n")
+        Silently(compilation.compile_until_stable)
+        assert compilation.digests([".aux"]) != before
+        assert Calls("bibtex") == 2
+        assert compilation.log_parser().warnings() == []
+        # An \@input of itself does not loop.
+        WriteFile("loop.aux","\\citation{A}\n\\@input{loop.aux}\n")
+        assert BibtexInputSha1sum("loop.aux") is not None
+
+#####################################
+# Running the tests
+#####################################
+
+def run_tests(names=None):
+    """
+    Run the functions test_* (or the ones of 'names') and print the failures.
+    Return True if they all pass.
+    """
+    tests = [(name,function) for name,function in globals().items() if name.startswith("test_") and callable(function)]
+    if names :
+        tests = [(name,function) for name,function in tests if name in names]
+    failures = []
+    for name,test in tests :
+        try :
+            test()
+        except Exception :
+            failures.append(name)
+            print("FAIL",name)
+            traceback.print_exc()
+    print("%s tests, %s failures"%(len(tests),len(failures)))
+    return failures == []
 
-#follow_the_file()
-xml_read()
+if __name__ == "__main__" :
+    os.chdir(here)
+    sys.exit(0 if run_tests(sys.argv[1:]) else 1)